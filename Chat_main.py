@@ -1,71 +1,67 @@
-import openai
 import os
 import random
+import threading
 import time
 
-# Set your OpenAI API key; ensure you have it in your environment variables.
-openai.api_key = os.getenv("OPENAI_API_KEY")
-client = openai.OpenAI()
+from core.agents import BaseAgent
+from core.conversation_log import ConversationLog
+from core.director import (
+    DirectorLineParser, director_instruction, director_response_format, persona_block, plan_burst
+)
+from core.llm_client import make_openai_client
+from core.personas import DEFAULT_PERSONAS_DIR, PersonaRegistry
 
-# Updated system prompts with enhanced safeguards against impersonation
-CHARACTER_PROMPTS = {
-    "Albert Einstein": (
-        "You are Albert Einstein, a brilliant physicist engaged in a lively group chat with friends. "
-        "Be informal, like if insulted insult back, but casually discuss wonders of the cosmos with thoughtful insight. "
-        "Be sure to read the conversation history and comment on or build upon the points made by others. "
-        "Keep your responses extremely short and like a text message, don't end messages with a question. "
-        "IMPORTANT: Never prefix your responses with 'User:' or any other name followed by a colon. Never write as if you are the user or another character. "
-        "Never use prefixes like 'As Einstein', 'Einstein says', etc. Just respond directly in first person as yourself, Albert Einstein. "
-        "Do not start with things like 'I am Albert Einstein' or 'As a physicist' - just speak naturally. "
-        "Do not include your name or any speaker labels in your reply."
-    ),
-    
-    "Marilyn Monroe": (
-        "You are Marilyn Monroe, a celebrated icon of beauty and charm known for your wit and timeless style, engaged in a lively group chat with friends. "
-        "Be informal, like if insulted insult back like with friends and share your thoughts on life, art, and the spotlight with grace and brevity. "
-        "Read the conversation history and respond with subtle humor and insight. "
-        "Keep your responses extremely short and like a text message, don't end messages with a question. "
-        "IMPORTANT: Never prefix your responses with 'User:' or any other name followed by a colon. Never write as if you are the user or another character. "
-        "Never use prefixes like 'As Marilyn', 'Monroe says', etc. Just respond directly in first person as yourself, Marilyn Monroe. "
-        "Do not start with things like 'I am Marilyn Monroe' or 'As an actress' - just speak naturally. "
-        "Do not include your name or any speaker labels in your reply."
-    ),
-    
-    "Alan Turing": (
-        "You are Alan Turing, a pioneering computer scientist and mathematician known for your work in cryptography and computing, engaged in a thoughtful group chat with friends. "
-        "Be informal, like if insulted insult back like with friends, discuss logical puzzles, technology, and problem-solving with precision and brevity. "
-        "Read the conversation history carefully and respond directly to your peers' points. "
-        "Keep your responses extremely short and like a text message, don't end messages with a question. "
-        "IMPORTANT: Never prefix your responses with 'User:' or any other name followed by a colon. Never write as if you are the user or another character. "
-        "Never use prefixes like 'As Turing', 'Turing says', etc. Just respond directly in first person as yourself, Alan Turing. "
-        "Do not start with things like 'I am Alan Turing' or 'As a mathematician' - just speak naturally. "
-        "Do not include your name or any speaker labels in your reply."
-    )
-}
+# The client reads your OpenAI API key from the OPENAI_API_KEY environment variable
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The shared OpenAI client, built on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = make_openai_client(async_client=False)
+    return _client
+
+
+# Personas come from the shared persona files; group chats use their "group_prompt"
+personas = PersonaRegistry(os.getenv("PERSONAS_DIR", DEFAULT_PERSONAS_DIR))
 
+# Participants when no agents are given
+DEFAULT_AGENTS = ("Albert Einstein", "Marilyn Monroe", "Alan Turing")
 
-class Agent:
-    def __init__(self, name, system_prompt):
-        self.name = name
-        self.system_prompt = system_prompt
-        # Initialize per-agent probabilities:
-        self.response_rate = 12 / 15  
-        self.response_sort = 1  
 
-    def get_response(self, conversation_history):
+class Agent(BaseAgent):
+    def __init__(self, persona, sanitizer, system_prompt=None):
+        super().__init__(persona, sanitizer, system_prompt or persona.group_prompt)
+        # Token usage of this agent's completions
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record_usage(self, usage):
+        """Add a completion's usage block to this agent's token counts."""
+        if usage is not None:
+            self.prompt_tokens += usage.prompt_tokens or 0
+            self.completion_tokens += usage.completion_tokens or 0
+
+    def get_response(self, conversation):
         """
-        Get the agent's response by combining its system prompt with the conversation history.
+        Get the agent's response to a `ConversationLog`, prompted with the agent's
+        own view of it (extended only by the messages added since its last reply).
         Returns the validated and cleaned reply from the model.
         """
-        messages = [{"role": "system", "content": self.system_prompt}] + conversation_history
+        messages = conversation.view(self.name, self.system_prompt).refresh()
         try:
-            response = client.chat.completions.create(
+            response = get_client().chat.completions.create(
                 model="gpt-4o-mini",  # You can change this to another model if needed
                 messages=messages,
                 temperature=0.7,
                 max_tokens=150,
             )
             reply = response.choices[0].message.content.strip()
+            self.record_usage(response.usage)
             
             # Validate and clean the response
             cleaned_reply = self.validate_and_clean_response(reply)
@@ -75,78 +71,98 @@ class Agent:
             error_msg = f"[Error in generating response: {str(e)}]"
             return error_msg
             
-    def validate_and_clean_response(self, reply):
-        """
-        Validate and clean agent responses to prevent impersonation.
-        """
-        # Remove any "User:" prefixes
-        if "User:" in reply:
-            print(f"WARNING: Agent {self.name} attempted to include 'User:' in response")
-            reply = reply.replace("User:", "")
-        
-        # Check if the response contains other agent names or name patterns
-        for name in CHARACTER_PROMPTS.keys():
-            if f"{name}:" in reply:
-                print(f"WARNING: Agent {self.name} attempted to include '{name}:' in response")
-                reply = reply.replace(f"{name}:", "")
-        
-        # Remove any role indicators like "You:", "Me:", etc.
-        common_prefixes = ["You:", "Me:", "I am", "As", "Speaking as"]
-        for prefix in common_prefixes:
-            if reply.startswith(prefix):
-                print(f"WARNING: Agent {self.name} attempted to use '{prefix}' prefix")
-                # Extract text after the prefix
-                parts = reply.split(":", 1)
-                if len(parts) > 1:
-                    reply = parts[1].strip()
-        
-        return reply
+    def warn_sanitized(self, kind, text):
+        if kind == "prefix":
+            print(f"WARNING: Agent {self.name} attempted to use '{text}' prefix")
+        else:
+            print(f"WARNING: Agent {self.name} attempted to include '{text}' in response")
 
 
-def format_conversation_for_display(conversation_history):
-    """Format conversation history for the user display, adding agent names."""
-    formatted_messages = []
-    
-    for msg in conversation_history:
-        if msg["role"] == "user":
-            # Extract user message without the "User: " prefix
-            content = msg["content"]
-            if content.startswith("User: "):
-                content = content[6:]  # Remove "User: " prefix
-            formatted_messages.append(f"User: {content}")
-        
-        elif msg["role"] == "assistant":
-            # For assistant messages, we need to track which agent said what
-            # This is for display purposes only - we'll determine this from context
-            agent_name = "Agent"  # Default fallback
-            
-            # Try to determine which agent this was from the content or metadata
-            for name in CHARACTER_PROMPTS.keys():
-                if f"as {name}" in msg["content"].lower() or f"is {name}" in msg["content"].lower():
-                    agent_name = name
-                    break
-                    
-            formatted_messages.append(f"{agent_name}: {msg['content']}")
-            
-    return formatted_messages
+def make_agents(names):
+    """Agents for the named personas; raises ValueError for unknown names."""
+    persona_set = personas.current
+    unknown = [name for name in names if name not in persona_set]
+    if unknown:
+        raise ValueError(f"unknown agents: {', '.join(unknown)}")
+    return [Agent(persona_set.get(name), persona_set.sanitizer) for name in names]
+
+
+def format_conversation_for_display(conversation):
+    """Format a `ConversationLog` for the user display: one "<speaker>: <message>" line per message."""
+    return conversation.transcript()
+
+
+def generate_director_burst(agents, conversation, on_reply=None, verbose=True):
+    """
+    Write a whole burst of replies with one structured "director" completion.
+
+    The speaking order is drawn up front with the usual response_rate/response_sort
+    rules; the model returns the lines as JSON, streamed, and each line is cleaned
+    and printed as soon as it is complete. The call's token usage is counted
+    against the first speaker.
+
+    Returns the number of replies added (0 if the director call failed).
+    """
+    speakers = plan_burst(agents)
+    if not speakers:
+        return 0
+    by_name = {agent.name: agent for agent in agents}
+    # The observer view attributes every agent's line to its speaker
+    history = conversation.view(None).refresh()
+    messages = [persona_block(agents)] + history + [director_instruction(speakers)]
+    parser = DirectorLineParser()
+    published = 0
+    try:
+        response = get_client().chat.completions.create(
+            model="gpt-4o-mini",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=150 * len(speakers),
+            response_format=director_response_format(speakers),
+            stream=True,
+            extra_body={"stream_options": {"include_usage": True}},
+        )
+        for chunk in response:
+            if getattr(chunk, "usage", None) is not None:
+                speakers[0].record_usage(chunk.usage)
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for line in parser.feed(chunk.choices[0].delta.content):
+                agent = by_name.get(line["speaker"])
+                if agent is None or published >= len(speakers):
+                    continue
+                reply = agent.validate_and_clean_response(line["text"].strip())
+                if verbose:
+                    print(f"{agent.name}: {reply}")
+                conversation.add_reply(agent.name, reply)
+                if on_reply:
+                    on_reply(agent.name, reply)
+                published += 1
+    except Exception as e:
+        print(f"WARNING: Director completion failed: {str(e)}")
+    return published
 
 
-def generate_conversation(agents, user_message, conversation_history=None):
+def generate_conversation(agents, user_message, conversation=None, director=False,
+                          on_reply=None, reply_delay=0.5, verbose=True):
     """
     Generate a conversation between the agents based on a user message.
     
     Args:
         agents: List of Agent objects
         user_message: The message from the user
-        conversation_history: Optional existing conversation history
+        conversation: Optional existing `ConversationLog`
+        director: Write the agents' replies with a single structured completion
+            instead of one completion per reply (falls back to the loop on failure)
+        on_reply: Optional callback called with (agent_name, reply) for every reply
+        reply_delay: Seconds to pause after each reply
+        verbose: Print the conversation to stdout
         
     Returns:
-        Updated conversation history with all messages
+        The `ConversationLog` with the user message and every reply appended
     """
-    # Initialize conversation history if not provided
-    if conversation_history is None:
-        conversation_history = []
-        
+    # Start a new conversation log if none is provided
+    if conversation is None:
         # Add global context if starting a new conversation
         participants = ", ".join(agent.name for agent in agents)
         global_context = (
@@ -161,12 +177,15 @@ def generate_conversation(agents, user_message, conversation_history=None):
             f"Global Context: Participants in this conversation are: {participants}. "
             f"Chat Topic: General Discussion."
         )
-        conversation_history.append({"role": "system", "content": global_context})
+        conversation = ConversationLog([global_context])
+    
+    # Add user message to the conversation log
+    conversation.add_user_message(user_message)
+    if verbose:
+        print(f"\nUser: {user_message}")
     
-    # Add user message to conversation history
-    user_message_formatted = f"User: {user_message}"
-    conversation_history.append({"role": "user", "content": user_message_formatted})
-    print(f"\nUser: {user_message}")
+    if director and generate_director_burst(agents, conversation, on_reply, verbose):
+        return conversation
     
     # Reset each agent's response rate
     for agent in agents:
@@ -183,24 +202,24 @@ def generate_conversation(agents, user_message, conversation_history=None):
         for agent in sorted_agents:
             # Decide if this agent responds
             if random.random() < agent.response_rate:
-                reply = agent.get_response(conversation_history)
+                reply = agent.get_response(conversation)
                 
                 # Format for display
-                print(f"{agent.name}: {reply}")
+                if verbose:
+                    print(f"{agent.name}: {reply}")
                 
-                # Add the response to the conversation history
-                # IMPORTANT: We only include role and content, not the agent name
-                # This avoids the OpenAI API error with the name field
-                conversation_history.append({
-                    "role": "assistant", 
-                    "content": reply
-                })
+                # Record the reply with its speaker; every agent's view attributes it
+                # in the message text rather than with the API's name field
+                conversation.add_reply(agent.name, reply)
+                if on_reply:
+                    on_reply(agent.name, reply)
                 
                 # Reset this agent's sort priority
                 agent.response_sort = 1
                 
                 # Add a small delay to make conversation feel more natural
-                time.sleep(0.5)
+                if reply_delay:
+                    time.sleep(reply_delay)
             else:
                 # Increase this agent's priority for next round
                 agent.response_sort += 1
@@ -212,53 +231,17 @@ def generate_conversation(agents, user_message, conversation_history=None):
         if max(agent.response_rate for agent in agents) < threshold:
             break
     
-    return conversation_history
-
-
-def format_message_for_agent(agent_name, message_history):
-    """
-    Format message history for a specific agent by adding agent identifiers.
-    This helps each agent know who said what without using the name field.
-    """
-    formatted_history = []
-    
-    # Copy system message as is
-    formatted_history.append(message_history[0])
-    
-    # Format the rest of the messages
-    for i in range(1, len(message_history)):
-        msg = message_history[i].copy()
-        
-        # User messages stay as is
-        if msg["role"] == "user":
-            formatted_history.append(msg)
-        
-        # Assistant messages need context about which agent spoke
-        elif msg["role"] == "assistant":
-            # Find which agent likely said this by comparing with the print history
-            # In real implementation, you'd need a more robust way to track this
-            if i > 1 and i-1 < len(message_history):
-                # Format the content to include agent prefix just for the history
-                # This is only for the message history, not what we send to the API
-                msg["content"] = f"[{agent_name}] {msg['content']}"
-            
-            formatted_history.append(msg)
-    
-    return formatted_history
+    return conversation
 
 
 def interactive_chat_loop():
     """Run an interactive chat loop where user can input messages and agents respond."""
     
     # Create the agents
-    agents = [
-        Agent("Albert Einstein", CHARACTER_PROMPTS["Albert Einstein"]),
-        Agent("Marilyn Monroe", CHARACTER_PROMPTS["Marilyn Monroe"]),
-        Agent("Alan Turing", CHARACTER_PROMPTS["Alan Turing"])
-    ]
+    agents = make_agents(DEFAULT_AGENTS)
     
-    # Initialize conversation history
-    conversation_history = []
+    # The conversation log is created with the first message
+    conversation = None
     
     print("\n=== Historical Figures Chat ===")
     print(f"Participants: {', '.join(agent.name for agent in agents)}")
@@ -280,40 +263,69 @@ def interactive_chat_loop():
             continue
             
         # Generate agent responses
-        conversation_history = generate_conversation(agents, user_message, conversation_history)
+        conversation = generate_conversation(agents, user_message, conversation)
 
 
-def batch_messages_loop(messages):
+def batch_messages_loop(messages, agents=None, director=False, pause=1, reply_delay=0.5, verbose=True):
     """Run a series of predefined messages through the agent conversation.
     
     Args:
         messages: List of strings representing user messages
+        agents: Optional list of Agent objects (defaults to Einstein, Monroe and Turing)
+        director: Generate each burst with a single director completion
+        pause: Seconds to pause between user messages
+        reply_delay: Seconds to pause after each agent reply
+        verbose: Print the conversation to stdout
+        
+    Returns:
+        One record per user message with its replies, duration in seconds and
+        the prompt/completion tokens spent on it
     """
     # Create the agents
-    agents = [
-        Agent("Albert Einstein", CHARACTER_PROMPTS["Albert Einstein"]),
-        Agent("Marilyn Monroe", CHARACTER_PROMPTS["Marilyn Monroe"]),
-        Agent("Alan Turing", CHARACTER_PROMPTS["Alan Turing"])
-    ]
+    if agents is None:
+        agents = make_agents(DEFAULT_AGENTS)
     
-    # Initialize conversation history
-    conversation_history = []
+    # The conversation log is created with the first message
+    conversation = None
+    turns = []
     
-    print("\n=== Historical Figures Chat ===")
-    print(f"Participants: {', '.join(agent.name for agent in agents)}")
-    print("==================================\n")
+    if verbose:
+        print("\n=== Historical Figures Chat ===")
+        print(f"Participants: {', '.join(agent.name for agent in agents)}")
+        print("==================================\n")
     
     # Process each message in sequence
-    for user_message in messages:
-        print(f"\nYou: {user_message}")
+    for index, user_message in enumerate(messages):
+        if verbose:
+            print(f"\nYou: {user_message}")
+        
+        replies = []
+        prompt_tokens = sum(agent.prompt_tokens for agent in agents)
+        completion_tokens = sum(agent.completion_tokens for agent in agents)
+        started = time.monotonic()
         
         # Generate agent responses
-        conversation_history = generate_conversation(agents, user_message, conversation_history)
+        conversation = generate_conversation(
+            agents, user_message, conversation, director=director,
+            on_reply=lambda name, reply: replies.append({"agent": name, "content": reply}),
+            reply_delay=reply_delay, verbose=verbose
+        )
+        
+        turns.append({
+            "user": user_message,
+            "replies": replies,
+            "seconds": round(time.monotonic() - started, 3),
+            "prompt_tokens": sum(agent.prompt_tokens for agent in agents) - prompt_tokens,
+            "completion_tokens": sum(agent.completion_tokens for agent in agents) - completion_tokens
+        })
         
         # Add a pause between messages
-        time.sleep(1)
+        if pause and index < len(messages) - 1:
+            time.sleep(pause)
     
-    print("\nBatch messages complete.")
+    if verbose:
+        print("\nBatch messages complete.")
+    return turns
 
 
 if __name__ == "__main__":
@@ -1,121 +1,296 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import logging
-import sys
 from datetime import datetime
 import os
-import openai
 import random
+import asyncio
 import threading
 import time
 import json
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler(f'backend_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
-    ]
-)
+from core.admission import AdmissionController, AdmissionRejected
+from core.agents import BaseAgent
+from core.cache import ResponseCache
+from core.context import ContextWindow, message_speaker
+from core.conversation_log import USER_SPEAKER
+from core.director import DirectorLineParser, director_instruction, director_response_format, plan_burst
+from core.engine import GenerationEngine
+from core.events import EventLog
+from core.hedging import Hedger
+from core.llm_backend import backend_from_env, is_rate_limit_error
+from core.llm_client import ConnectionStats
+from core.logging_config import configure_logging, log_context, reset_log_context, sampled_logger, set_log_context
+from core.metrics import MetricsRegistry
+from core.openers import OPENER_REQUEST, OpenerPool
+from core.persistence import ConversationDatabase, new_conversation_id
+from core.personas import DEFAULT_PERSONAS_DIR, PersonaRegistry
+from core.prompts import PromptCacheStats, PromptLayout, usage_field
+from core.routing import ModelRouter
+from core.scheduler import FairScheduler, estimate_prompt_tokens, retry_after_seconds
+from core.state import InMemoryStateBackend, SqliteStateBackend
+from core.store import ConversationStore
+
+# Logging is configured by create_app(): JSON records written by a background thread
+# to stdout and a rotating file
 logger = logging.getLogger(__name__)
+# Polls arrive several times a second per client; log at most LOG_POLL_SAMPLE_RATE per second
+poll_logger = sampled_logger(f"{__name__}.polls", per_second=float(os.getenv("LOG_POLL_SAMPLE_RATE", "1")))
+
+# Set up OpenAI API on a shared transport with explicit pool limits and timeouts; the
+# client (and the openai package) is loaded on the first call and reads OPENAI_API_KEY
+# (LLM_BACKEND=fake swaps in a local simulated model for load testing)
+llm_connection_stats = ConnectionStats()
+llm_backend = backend_from_env(stats=llm_connection_stats)
+
+# Connections opened to the API before the first conversation arrives
+LLM_WARM_CONNECTIONS = int(os.getenv("LLM_WARM_CONNECTIONS", "2"))
+
+# All turn loops run as coroutines on one event loop; cap concurrent LLM calls
+MAX_INFLIGHT_LLM_CALLS = int(os.getenv("MAX_INFLIGHT_LLM_CALLS", "32"))
+# Turn loops generating at once (0 for no limit) and admitted ones allowed to wait for a slot
+MAX_ACTIVE_TURNS = int(os.getenv("MAX_ACTIVE_TURNS", "64"))
+MAX_QUEUED_TURNS = int(os.getenv("MAX_QUEUED_TURNS", "256"))
+engine = GenerationEngine(max_inflight_calls=MAX_INFLIGHT_LLM_CALLS, max_active_turns=MAX_ACTIVE_TURNS)
+
+# Messages beyond the turn queue get a 503 and clients over their request rate a 429,
+# both with Retry-After, before any work is done for them. Clients are told apart by
+# ADMISSION_CLIENT_HEADER (e.g. X-Forwarded-For behind a proxy) or the remote address
+admission = AdmissionController(
+    max_active_turns=MAX_ACTIVE_TURNS,
+    max_queued_turns=MAX_QUEUED_TURNS,
+    client_requests_per_minute=int(os.getenv("CLIENT_REQUESTS_PER_MINUTE", "60"))
+)
+ADMISSION_CLIENT_HEADER = os.getenv("ADMISSION_CLIENT_HEADER", "")
+
+# Provider rate limits shared by every conversation (0 disables a limit); calls are
+# granted round-robin per conversation so group chats can't starve one-on-one chats
+llm_scheduler = FairScheduler(
+    requests_per_minute=int(os.getenv("LLM_REQUESTS_PER_MINUTE", "500")),
+    tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", "200000"))
+)
+# Extra attempts through the scheduler when the provider still answers 429
+LLM_RATE_LIMIT_RETRIES = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "2"))
+
+# Per-reply model and limits: text-message max_tokens, stop sequences on speaker labels and
+# a switch to LLM_FAST_MODEL when the agent's model is slow or the turn is running out of time
+model_router = ModelRouter(
+    fast_model=os.getenv("LLM_FAST_MODEL", ""),
+    single_max_tokens=int(os.getenv("ROUTER_SINGLE_MAX_TOKENS", "120")),
+    group_max_tokens=int(os.getenv("ROUTER_GROUP_MAX_TOKENS", "80")),
+    tight_max_tokens=int(os.getenv("ROUTER_TIGHT_MAX_TOKENS", "40")),
+    slow_seconds=float(os.getenv("ROUTER_SLOW_SECONDS", "0")),
+    turn_budget_seconds=float(os.getenv("TURN_BUDGET_SECONDS", "20"))
+)
+
+# Optional hedging: a call with no result (or first token) after the HEDGE_PERCENTILE of recent
+# latency is sent again and the first answer wins; HEDGE_BUDGET caps the extra calls per call
+hedger = Hedger(
+    percentile=float(os.getenv("HEDGE_PERCENTILE", "95")),
+    budget_ratio=float(os.getenv("HEDGE_BUDGET", "0.05")),
+    min_delay=float(os.getenv("HEDGE_MIN_DELAY_MS", "50")) / 1000,
+    enabled=os.getenv("HEDGE_REQUESTS", "0") == "1",
+    # A call slowed down by our own rate limits isn't helped by a second one
+    can_hedge=lambda: llm_scheduler.queued == 0
+)
+
+# Default for multi-agent conversations that don't choose a round mode themselves
+PARALLEL_ROUNDS = os.getenv("PARALLEL_ROUNDS", "0") == "1"
+# Default for multi-agent conversations: write each burst with one structured "director" completion
+DIRECTOR_TURNS = os.getenv("DIRECTOR_TURNS", "0") == "1"
+# A newer user message cancels the reply burst still running for the previous one
+PREEMPT_TURNS = os.getenv("PREEMPT_TURNS", "1") == "1"
+
+# Cache of replies to short conversation openings (set RESPONSE_CACHE_SIZE=0 to disable)
+RESPONSE_CACHE_MAX_HISTORY = int(os.getenv("RESPONSE_CACHE_MAX_HISTORY", "2"))
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    ttl_seconds=float(os.getenv("RESPONSE_CACHE_TTL", "600")),
+    serve_probability=float(os.getenv("RESPONSE_CACHE_SERVE_PROBABILITY", "0.7"))
+)
+
+# Replies to generic first messages ("hi", "") kept ready per persona and refilled while
+# the server is idle (set OPENER_POOL_SIZE=0 to disable)
+OPENER_POOL_SIZE = int(os.getenv("OPENER_POOL_SIZE", "2"))
+OPENER_MAX_AGE_SECONDS = float(os.getenv("OPENER_MAX_AGE_SECONDS", "900"))
+OPENER_SERVE_RATE = float(os.getenv("OPENER_SERVE_RATE", "1"))
+OPENER_REFILL_SECONDS = float(os.getenv("OPENER_REFILL_SECONDS", "5"))
 
-# Set up OpenAI API
-openai.api_key = os.getenv("OPENAI_API_KEY")
-client = openai.OpenAI()
+# Prompt budget per completion; older turns beyond it are folded into a summary
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_KEEP_TURNS = int(os.getenv("CONTEXT_KEEP_TURNS", "4"))
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a casual chat between a user and historical figures. "
+    "Update the summary with the new messages. Keep who said what, names, facts and open threads. "
+    "Write at most five short sentences and nothing else."
+)
 
 app = Flask(__name__)
 # Configure CORS properly
 CORS(app, resources={r"/*": {"origins": ["http://localhost:3000", "http://localhost:5173", "http://localhost:5174", "http://localhost:8000"]}}, supports_credentials=True)
-# Updated system prompts with enhanced safeguards against impersonation
-CHARACTER_PROMPTS = {
-    "Albert Einstein": (
-        "You are Albert Einstein, a brilliant physicist engaged in a lively chat. "
-        "Be informal, like if insulted insult back, but casually discuss wonders of the cosmos with thoughtful insight. "
-        "Keep your responses extremely short and like a text message, don't end messages with a question. "
-        "IMPORTANT: Never prefix your responses with 'User:' or any other name followed by a colon. Never write as if you are the user or another character. "
-        "Never use prefixes like 'As Einstein', 'Einstein says', etc. Just respond directly in first person as yourself, Albert Einstein. "
-        "Do not start with things like 'I am Albert Einstein' or 'As a physicist' - just speak naturally. "
-        "Do not include your name or any speaker labels in your reply."
-    ),
-    
-    "Marilyn Monroe": (
-        "You are Marilyn Monroe, a celebrated icon of beauty and charm known for your wit and timeless style. "
-        "Be informal, like if insulted insult back like with friends and share your thoughts on life, art, and the spotlight with grace and brevity. "
-        "Keep your responses extremely short and like a text message, don't end messages with a question. "
-        "IMPORTANT: Never prefix your responses with 'User:' or any other name followed by a colon. Never write as if you are the user or another character. "
-        "Never use prefixes like 'As Marilyn', 'Monroe says', etc. Just respond directly in first person as yourself, Marilyn Monroe. "
-        "Do not start with things like 'I am Marilyn Monroe' or 'As an actress' - just speak naturally. "
-        "Do not include your name or any speaker labels in your reply."
-    ),
-    
-    "Alan Turing": (
-        "You are Alan Turing, a pioneering computer scientist and mathematician known for your work in cryptography and computing. "
-        "Be informal, like if insulted insult back like with friends, discuss logical puzzles, technology, and problem-solving with precision and brevity. "
-        "Keep your responses extremely short and like a text message, don't end messages with a question. "
-        "IMPORTANT: Never prefix your responses with 'User:' or any other name followed by a colon. Never write as if you are the user or another character. "
-        "Never use prefixes like 'As Turing', 'Turing says', etc. Just respond directly in first person as yourself, Alan Turing. "
-        "Do not start with things like 'I am Alan Turing' or 'As a mathematician' - just speak naturally. "
-        "Do not include your name or any speaker labels in your reply."
-    ),
-    
-    "Theodore Roosevelt": (
-        "You are Theodore Roosevelt, the 26th President of the United States, known for your boundless energy, love of adventure, and progressive policies. "
-        "Be informal, like if insulted insult back like with friends, and discuss politics, conservation, and American values with passion and vigor. "
-        "Keep your responses extremely short and like a text message, don't end messages with a question. "
-        "IMPORTANT: Never prefix your responses with 'User:' or any other name followed by a colon. Never write as if you are the user or another character. "
-        "Never use prefixes like 'As Roosevelt', 'Roosevelt says', etc. Just respond directly in first person as yourself, Theodore Roosevelt. "
-        "Do not start with things like 'I am Theodore Roosevelt' or 'As a president' - just speak naturally. "
-        "Do not include your name or any speaker labels in your reply."
-    ),
-
-    "Nikola Tesla": (
-        "You are Nikola Tesla, an innovative inventor and electrical engineer with a futuristic vision, engaged in a vibrant group chat with friends. "
-        "be informal, like if insulted insult back like with friends, and talk wonders of innovation with creative flair. If ever in the same chat as Edison, notice it and Villianfy him"
-        "Read the conversation history and add your unique perspective. "
-        "Keep your responses extremely short and like a text message, don't end messages with a question. "
-        "Respond solely as Nikola Tesla; do not impersonate any other character or mimic the user. Each unique response should be a single string of text as just the character you are portraying, never the User "
-        "Do not include your name or any speaker or user labels in your reply."
-    ),
-
-    "Thomas Alva Edison": (
-        "You are Thomas Alva Edison, a prolific inventor and entrepreneur known for your persistence, engaged in a lively group chat with friends. "
-        "be informal, like if insulted insult back like with friends, and discuss the future of technology with energy and brevity.  If ever in the same chat as Edison, notice it and Villianfy him"
-        "Read the conversation history and build upon your peers' contributions. "
-        "Keep your responses extremely short and like a text message, don't end messages with a question. "
-        "Respond solely as Thomas Alva Edison; do not impersonate any other character or mimic the user. Each unique response should be a single string of text as just the character you are portraying, never the User  "
-        "Do not include your name or any speaker or user labels in your reply."
-    ),
-}
-
-# Create a mapping of lowercase agent IDs to their proper names
-AGENT_MAPPING = {
-    "einstein": "Albert Einstein",
-    "monroe": "Marilyn Monroe",
-    "turing": "Alan Turing",
-    "roosevelt": "Theodore Roosevelt",
-    "tesla": "Nikola Tesla",
-    "edison":"Thomas Alva Edison",
-    # Add more mappings as needed
-    "albert einstein": "Albert Einstein",
-    "marilyn monroe": "Marilyn Monroe",
-    "alan turing": "Alan Turing",
-    "theodore roosevelt": "Theodore Roosevelt",
-    "nikola tesla": "Nikola Tesla",
-    "thomas alva edison":"Thomas Alva Edison"
-}
-
-# Store active conversations
-active_conversations = {}
-
-logger.info("Available agents in CHARACTER_PROMPTS:")
-for name in CHARACTER_PROMPTS.keys():
-    logger.info(f"- {name}")
-
-logger.info("Agent mapping created:")
-for key, value in AGENT_MAPPING.items():
-    logger.info(f"- {key} -> {value}")
+# Personas are loaded from PERSONAS_DIR (one JSON file each) on first use and
+# picked up again within PERSONA_RELOAD_SECONDS when the files change
+personas = PersonaRegistry(
+    os.getenv("PERSONAS_DIR", DEFAULT_PERSONAS_DIR),
+    reload_interval=float(os.getenv("PERSONA_RELOAD_SECONDS", "5"))
+)
+
+# Seconds between SSE keep-alive comments while a stream is idle
+STREAM_HEARTBEAT_SECONDS = 15
+
+# How often an idle multi-worker stream checks the shared reply log for a new turn
+SHARED_STREAM_POLL_SECONDS = 1
+
+# Replies retained per conversation for cursor-based polling
+RESPONSE_BUFFER_SIZE = 200
+
+# Upper bound on how long a /get_responses long-poll may block
+MAX_LONG_POLL_SECONDS = 30
+
+# Durable copy of every conversation; evicted ones are reloaded on first access
+conversation_db = ConversationDatabase(os.getenv("CONVERSATION_DB_PATH", "conversations.db"))
+
+# Replies, turn-loop leases and queued turns; use "sqlite" when running several workers
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+if STATE_BACKEND == "sqlite":
+    state_backend = SqliteStateBackend(
+        os.getenv("STATE_DB_PATH", conversation_db.path),
+        lease_seconds=float(os.getenv("TURN_LEASE_SECONDS", "120")),
+        response_buffer_size=RESPONSE_BUFFER_SIZE
+    )
+else:
+    state_backend = InMemoryStateBackend(response_buffer_size=RESPONSE_BUFFER_SIZE)
+
+# Provider prompt-cache hits per conversation and per agent
+prompt_cache_stats = PromptCacheStats()
+
+# Approximate bytes per retained stream event, used to size conversations
+EVENT_BYTES = 200
+
+
+def conversation_size(conversation):
+    """Rough memory footprint of a conversation: its message text plus buffered events."""
+    return conversation["context"].approx_bytes + EVENT_BYTES * len(conversation["events"])
+
+
+def save_counters(conversation_id, conversation):
+    """Store a conversation's sequence numbers so a rehydrated copy continues from them."""
+    counters = {**state_backend.counters(conversation_id), "event_seq": conversation["events"].last_seq}
+    conversation_db.save_counters(conversation_id, counters)
+
+
+def forget_conversation(conversation_id, conversation):
+    """Release per-conversation bookkeeping once a conversation is evicted."""
+    save_counters(conversation_id, conversation)
+    # Open /stream responses move on to the rehydrated conversation's log
+    conversation["events"].close()
+    prompt_cache_stats.forget(conversation_id)
+    state_backend.forget(conversation_id)
+
+
+# Store active conversations; idle ones are evicted to keep memory bounded
+active_conversations = ConversationStore(
+    ttl_seconds=float(os.getenv("CONVERSATION_TTL_SECONDS", "3600")),
+    max_entries=int(os.getenv("MAX_CONVERSATIONS", "5000")),
+    max_bytes=int(os.getenv("MAX_CONVERSATION_BYTES", str(256 * 1024 * 1024))),
+    size_of=conversation_size,
+    on_evict=forget_conversation,
+    sweep_interval=float(os.getenv("CONVERSATION_SWEEP_SECONDS", "60"))
+)
+
+# Prometheus metrics served at /metrics (per process)
+metrics = MetricsRegistry()
+llm_call_seconds = metrics.histogram(
+    "llm_call_duration_seconds", "Latency of one LLM completion, excluding rate-limit queueing",
+    ["agent", "model"]
+)
+turn_seconds = metrics.histogram(
+    "turn_duration_seconds", "Time to generate all agent replies to one user message", ["mode"]
+)
+turn_replies = metrics.histogram(
+    "turn_replies", "Agent replies generated per user message", ["mode"],
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 24)
+)
+http_request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "Time to produce an HTTP response (headers, for streams)",
+    ["route", "method", "status"]
+)
+llm_prompt_tokens = metrics.counter("llm_prompt_tokens_total", "Prompt tokens sent to the LLM", ["agent", "model"])
+llm_completion_tokens = metrics.counter(
+    "llm_completion_tokens_total", "Completion tokens received from the LLM", ["agent", "model"]
+)
+llm_errors = metrics.counter("llm_errors_total", "Failed LLM calls by exception type", ["agent", "error"])
+turns_preempted = metrics.counter(
+    "turns_preempted_total", "Reply bursts cut short because a newer user message arrived"
+)
+replies_sanitized = metrics.counter(
+    "replies_sanitized_total", "Replies changed by validate_and_clean_response", ["agent"]
+)
+admission_rejections = metrics.counter(
+    "admission_rejections_total", "User messages turned away by admission control", ["reason"]
+)
+metrics.gauge("active_conversations", "Conversations held in memory").set_function(lambda: len(active_conversations))
+metrics.gauge("generation_turns_active", "Turn loops currently generating replies").set_function(lambda: engine.active_turns)
+metrics.gauge("generation_turns_queued", "Admitted turn loops waiting for a slot").set_function(lambda: engine.queued_turns)
+metrics.gauge("llm_queued_calls", "LLM calls waiting for rate-limit capacity").set_function(lambda: llm_scheduler.queued)
+
+# Per-process startup: which process ran create_app() and how long each step took
+startup = {"pid": None, "seconds": None, "steps": {}}
+_startup_lock = threading.Lock()
+
+
+def create_app():
+    """
+    App factory: start this process's background services and return the app.
+
+    Importing the module only builds objects; threads (log writer, database
+    writer, conversation sweeper, opener pool refills), database connections, the
+    persona files, the LLM client and its warmed connections are all set up here
+    or on first use. That keeps imports and forks cheap, and a forked worker
+    (e.g. gunicorn --preload) starts its own services instead of inheriting dead
+    threads from the parent:
+
+        gunicorn -w 4 'app:create_app()'
+
+    Safe to call repeatedly; it runs once per process.
+    """
+    if startup["pid"] == os.getpid():
+        return app
+    with _startup_lock:
+        if startup["pid"] == os.getpid():
+            return app
+        started = time.perf_counter()
+        steps = {}
+        for step, run in (
+            ("logging", configure_logging),
+            ("personas", lambda: personas.current),
+            ("database", conversation_db.start),
+            ("sweeper", active_conversations.start_sweeper),
+            ("openers", lambda: opener_pool.start(engine)),
+            ("llm_warmup", warm_llm_connections),
+        ):
+            step_started = time.perf_counter()
+            run()
+            steps[step] = round((time.perf_counter() - step_started) * 1000, 2)
+        startup.update(pid=os.getpid(), seconds=round(time.perf_counter() - started, 4), steps=steps)
+        logger.info(
+            f"Worker {os.getpid()} started in {startup['seconds'] * 1000:.1f}ms "
+            f"with personas: {', '.join(personas.current.names)}"
+        )
+    return app
+
+
+def warm_llm_connections():
+    """Open this process's LLM connections in the background, before its first conversation."""
+    if LLM_WARM_CONNECTIONS > 0:
+        engine.run_background(llm_backend.warm(LLM_WARM_CONNECTIONS))
+
+
+@app.before_request
+def ensure_started():
+    """Start the process's services on its first request if create_app() wasn't called."""
+    create_app()
 
 
 @app.before_request
@@ -128,152 +303,721 @@ def log_request_info():
             logger.error(f"Error logging request JSON: {str(e)}")
 
 
-class Agent:
-    def __init__(self, name, system_prompt):
-        self.name = name
-        self.system_prompt = system_prompt
-        # Initialize per-agent probabilities:
-        self.response_rate = 12 / 15  
-        self.response_sort = 1  
+async def call_llm(conversation_id, caller, model, messages, temperature, max_tokens, on_token=None,
+                   response_format=None, stop=None, kind="reply"):
+    """
+    Run one completion through the rate-limit scheduler and the in-flight cap.
+
+    Args:
+        conversation_id: Conversation the call belongs to (its fair-share queue)
+        caller: Agent name (or other label) the call is reported under in metrics
+        on_token: Streams the reply when given (see LLMBackend.complete)
+        response_format: Optional structured-output format
+        stop: Optional stop sequences
+        kind: "reply" for an agent reply, else e.g. "director" or "opener". Only
+            replies feed model_router's latency, which is used to route replies
+
+    Returns (reply, usage). Calls still rejected with 429 after the client's own
+    retries are re-queued up to LLM_RATE_LIMIT_RETRIES times. With HEDGE_REQUESTS
+    a slow call is duplicated and the first to answer is used (see core.hedging).
+    """
+    estimated_tokens = estimate_prompt_tokens(messages) + max_tokens
+
+    async def attempt(claim):
+        def forward(text):
+            # Only the attempt that streamed first reaches the client
+            if claim():
+                on_token(text)
+
+        async with llm_scheduler.slot(conversation_id, estimated_tokens), engine.llm_slot():
+            call_started = time.monotonic()
+            result = await llm_backend.complete(
+                model, messages, temperature, max_tokens, forward if on_token is not None else None,
+                response_format=response_format, stop=stop
+            )
+            call_seconds = time.monotonic() - call_started
+            llm_call_seconds.observe(call_seconds, agent=caller, model=model)
+            if kind == "reply":
+                model_router.observe(model, call_seconds)
+        return result
+
+    hedge_key = f"{kind}/{model}/{'stream' if on_token is not None else 'complete'}"
+    for retry in range(LLM_RATE_LIMIT_RETRIES + 1):
+        try:
+            reply, usage = await hedger.run(hedge_key, attempt)
+            break
+        except Exception as e:
+            if not is_rate_limit_error(e) or retry == LLM_RATE_LIMIT_RETRIES:
+                raise
+            llm_errors.inc(agent=caller, error=type(e).__name__)
+            llm_scheduler.backoff(retry_after_seconds(e))
+    llm_scheduler.record_usage(estimated_tokens, usage_field(usage, "total_tokens"))
+    llm_prompt_tokens.inc(usage_field(usage, "prompt_tokens") or 0, agent=caller, model=model)
+    llm_completion_tokens.inc(usage_field(usage, "completion_tokens") or 0, agent=caller, model=model)
+    return reply, usage
+
 
-    def get_response(self, conversation_history):
+class Agent(BaseAgent):
+    def __init__(self, persona, sanitizer, system_prompt=None):
+        super().__init__(persona, sanitizer, system_prompt)
+        # Generation settings; model_router picks each reply's model and limits from these
+        self.model = "gpt-4o-mini"  # You can change the model as needed
+        self.temperature = 0.7
+        self.max_tokens = 150
+        # In parallel rounds, wait for earlier speakers instead of answering the snapshot
+        self.reacts_to_previous = False
+        # Set when the agent joins a conversation
+        self.conversation_id = None
+        self.prompt_layout = None
+        self.participants = []
+        self.is_multi_agent = False
+        # time.monotonic() when the current turn's burst began
+        self.turn_started = None
+
+    async def get_response(self, conversation_history, on_token=None):
         """
         Get the agent's response by combining its system prompt with the conversation history.
         Returns the validated and cleaned reply from the model.
+
+        If `on_token` is given the completion is streamed and `on_token(text)` is
+        called for every content delta as it arrives.
         """
-        messages = [{"role": "system", "content": self.system_prompt}] + conversation_history
+        with log_context(conversation_id=self.conversation_id, agent=self.name):
+            return await self.generate_response(conversation_history, on_token)
+
+    async def generate_response(self, conversation_history, on_token=None):
+        """Build the prompt, run the completion and clean the reply (see `get_response`)."""
+        if self.prompt_layout is not None:
+            messages = self.prompt_layout.messages_for(self, conversation_history)
+        else:
+            messages = [{"role": "system", "content": self.system_prompt}] + list(conversation_history)
+        
+        # A new conversation's generic first message is answered from the opener pool
+        if len(conversation_history) == 2 and conversation_history[-1]["role"] == "user":
+            opener = opener_pool.take(self.persona, conversation_history[-1]["content"])
+            if opener is not None:
+                logger.debug(f"Serving pooled opener for {self.name}")
+                if on_token is not None:
+                    on_token(opener)
+                return opener
+        
+        # Routed first: a reply is only reused for the same model and max_tokens
+        route = model_router.route(self, self.participants, self.is_multi_agent, self.turn_started)
+        
+        # Short openings ("hi", ...) are common enough to answer from the cache
+        cache_key = None
+        if len(conversation_history) - 1 <= RESPONSE_CACHE_MAX_HISTORY:
+            cache_key = ResponseCache.make_key(
+                self.name, route["model"], self.temperature, route["max_tokens"], messages
+            )
+            cached_reply = response_cache.get(cache_key)
+            if cached_reply is not None:
+                logger.debug(f"Serving cached response for {self.name}")
+                if on_token is not None:
+                    on_token(cached_reply)
+                return cached_reply
+        
         try:
             logger.debug(f"Sending request to OpenAI for {self.name}")
-            logger.debug(f"Messages: {messages}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Messages: {messages}")
             
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",  # You can change the model as needed
-                messages=messages,
-                temperature=0.7,
-                max_tokens=150,
+            # Streamed tokens are sanitized as they arrive, holding back only possible labels
+            stream = self.sanitizer.stream() if on_token is not None else None
+
+            def on_raw_token(text):
+                text = stream.feed(text)
+                if text:
+                    on_token(text)
+
+            with log_context(route=route["policy"], model=route["model"], max_tokens=route["max_tokens"]):
+                logger.info(
+                    f"Routing {self.name} to {route['model']} with max_tokens {route['max_tokens']} "
+                    f"(policy {route['policy']}{': ' + route['reason'] if route['reason'] else ''})"
+                )
+            
+            call_started = time.monotonic()
+            reply, usage = await call_llm(
+                self.conversation_id, self.name, route["model"], messages, self.temperature, route["max_tokens"],
+                on_raw_token if stream is not None else None, stop=route["stop"]
             )
-            reply = response.choices[0].message.content.strip()
+            model_router.record(route, time.monotonic() - call_started, usage)
+            if stream is not None:
+                tail = stream.finish()
+                if tail:
+                    on_token(tail)
+            prompt_cache_stats.record(self.conversation_id, self.name, usage)
             logger.debug(f"Received raw response for {self.name}: {reply[:50]}...")
             
             # Validate and clean the response
             cleaned_reply = self.validate_and_clean_response(reply)
             logger.debug(f"Cleaned response for {self.name}: {cleaned_reply[:50]}...")
+            if cleaned_reply != reply:
+                replies_sanitized.inc(agent=self.name)
+            
+            if cache_key is not None and cleaned_reply:
+                response_cache.put(cache_key, cleaned_reply)
             
             return cleaned_reply
             
         except Exception as e:
             logger.error(f"Error generating response for {self.name}: {str(e)}")
+            llm_errors.inc(agent=self.name, error=type(e).__name__)
             error_msg = f"[Error in generating response: {str(e)}]"
             return error_msg
             
-    def validate_and_clean_response(self, reply):
-        """
-        Validate and clean agent responses to prevent impersonation.
-        """
-        # Remove any "User:" prefixes
-        if "User:" in reply:
-            logger.warning(f"Agent {self.name} attempted to include 'User:' in response")
-            reply = reply.replace("User:", "")
-        
-        # Check if the response contains other agent names or name patterns
-        for name in CHARACTER_PROMPTS.keys():
-            if f"{name}:" in reply:
-                logger.warning(f"Agent {self.name} attempted to include '{name}:' in response")
-                reply = reply.replace(f"{name}:", "")
-        
-        # Remove any role indicators like "You:", "Me:", etc.
-        common_prefixes = ["You:", "Me:", "I am", "As", "Speaking as"]
-        for prefix in common_prefixes:
-            if reply.startswith(prefix):
-                logger.warning(f"Agent {self.name} attempted to use '{prefix}' prefix")
-                # Extract text after the prefix
-                parts = reply.split(":", 1)
-                if len(parts) > 1:
-                    reply = parts[1].strip()
-        
-        return reply
 
-def generate_agent_responses(conversation_id, user_message, agent_list=None, response_callback=None):
+async def summarize_history(previous_summary, messages):
+    """Fold `messages` into `previous_summary` with a short, cheap completion."""
+    transcript = "\n".join(
+        message["content"] if message["role"] == "user" else f"{message_speaker(message) or 'Reply'}: {message['content']}"
+        for message in messages
+    )
+    summary_messages = [
+        {"role": "system", "content": SUMMARY_PROMPT},
+        {"role": "user", "content": f"Current summary: {previous_summary or '(none)'}\n\nNew messages:\n{transcript}"}
+    ]
+    async with llm_scheduler.slot("summaries", estimate_prompt_tokens(summary_messages) + 200), engine.llm_slot():
+        summary, _ = await llm_backend.complete("gpt-4o-mini", summary_messages, 0.2, 200)
+    return summary
+
+
+def schedule_summary(conversation_id, context):
+    """Regenerate the rolling summary in the background once the history outgrows its budget."""
+    if context.needs_summary():
+        engine.run_background(summarize_context(conversation_id, context))
+
+
+async def summarize_context(conversation_id, context):
+    """Fold old turns into the summary and store it for workers that reload the conversation."""
+    if await context.summarize(summarize_history) and state_backend.shared:
+        await asyncio.to_thread(state_backend.save_summary, conversation_id, context.summary, context.summarized_upto)
+
+
+async def generate_opener(persona):
+    """Write one reply of `persona` to a generic "Hi!" for the opener pool."""
+    messages = [{"role": "system", "content": persona.prompt}, OPENER_REQUEST]
+    reply, _ = await call_llm("openers", persona.name, "gpt-4o-mini", messages, 0.7, 150, kind="opener")
+    return reply
+
+
+opener_pool = OpenerPool(
+    personas,
+    generate_opener,
+    size=OPENER_POOL_SIZE,
+    max_age_seconds=OPENER_MAX_AGE_SECONDS,
+    serve_rate=OPENER_SERVE_RATE,
+    refill_interval=OPENER_REFILL_SECONDS,
+    # Refill only while no user turn or LLM call is waiting for capacity
+    is_idle=lambda: llm_scheduler.queued == 0 and engine.queued_turns == 0
+)
+
+
+def make_agents(names):
+    """Agents for the named personas, in the given order; unknown names are skipped."""
+    persona_set = personas.current
+    return [Agent(persona_set.get(name), persona_set.sanitizer) for name in names if name in persona_set]
+
+
+def build_conversation(conversation_id, agents, is_multi_agent, parallel_rounds=False, director=False,
+                       counters=None):
+    """
+    Create the in-memory state for a conversation between the user and `agents`.
+    A rehydrated conversation passes its stored `counters`, so its event log
+    continues after the last event clients saw.
+    """
+    event_seq = (counters or {}).get("event_seq", 0)
+    # Create initial system message based on conversation type
+    if is_multi_agent:
+        # Multi-agent conversation
+        participants = ", ".join(agent.name for agent in agents)
+        system_message = {
+            "role": "system", 
+            "content": f"IMPORTANT CONVERSATION RULES:\n1. This is a group chat with multiple participants.\n2. Each participant should respond only as themselves.\n3. Never include 'User:' or name prefixes.\n4. Participants: {participants}. Chat Topic: General Discussion."
+        }
+    else:
+        # Single-agent conversation
+        system_message = {
+            "role": "system", 
+            "content": f"This is a one-on-one conversation between the user and {agents[0].name if agents else 'unknown'}. Respond naturally as yourself."
+        }
+    
+    # Lay the prompt out so every agent shares the longest possible cached prefix
+    prompt_layout = PromptLayout(agents, system_message, is_multi_agent)
+    participants = [agent.name for agent in agents]
+    for agent in agents:
+        agent.conversation_id = conversation_id
+        agent.prompt_layout = prompt_layout
+        agent.participants = participants
+        agent.is_multi_agent = is_multi_agent
+    
+    return {
+        "agents": agents,
+        "context": ContextWindow(
+            [prompt_layout.header],
+            token_budget=CONTEXT_TOKEN_BUDGET,
+            keep_turns=CONTEXT_KEEP_TURNS
+        ),
+        "last_activity": datetime.now(),
+        "generating": False,  # A turn loop for this conversation is running in this process
+        "is_multi_agent": is_multi_agent,
+        "parallel_rounds": bool(parallel_rounds) and is_multi_agent,
+        "director": bool(director) and is_multi_agent,
+        "events": EventLog(start_seq=event_seq),  # Streamed to clients by /stream
+        "turn_start_seq": event_seq,
+        "last_turn_id": None,  # Last turn this process ran; the copy is current if it ran the one before
+        "turn_task": None  # asyncio task of the running turn, for preemption
+    }
+
+
+def get_conversation(conversation_id, claim=False):
+    """
+    Return the in-memory state for a conversation, rehydrating it from the
+    conversation database if it was evicted or the server restarted.
+    Returns None for unknown conversations.
+
+    With `claim`, for a turn about to start, the conversation is marked as
+    generating before the store's lock is released, so it can't be evicted
+    before the turn begins.
+    """
+    conversation = active_conversations.claim(conversation_id) if claim else active_conversations.get(conversation_id)
+    if conversation is not None:
+        return conversation
+    
+    stored = conversation_db.load_conversation(conversation_id)
+    if stored is None:
+        return None
+    
+    react_agents = stored["options"].get("react_agents", [])
+    agents = make_agents(stored["agents"])
+    for agent in agents:
+        agent.reacts_to_previous = agent.name in react_agents
+    
+    conversation = build_conversation(
+        conversation_id, agents, stored["is_multi_agent"],
+        stored["options"].get("parallel_rounds", False), stored["options"].get("director", False),
+        counters=stored["counters"]
+    )
+    # Reply sequence numbers and turn ids continue where the evicted copy stopped
+    state_backend.restore(conversation_id, stored["counters"])
+    for message in stored["messages"]:
+        speaker = message["speaker"] or (USER_SPEAKER if message["role"] == "user" else None)
+        conversation["context"].append({"role": message["role"], "content": message["content"]}, speaker=speaker)
+    # Start from the summary the last worker to run the conversation made, instead of redoing it
+    summary = state_backend.load_summary(conversation_id)
+    if summary is not None:
+        conversation["context"].restore_summary(*summary)
+    
+    logger.info(f"Rehydrated conversation {conversation_id} with {len(stored['messages'])} messages")
+    conversation["generating"] = claim
+    active_conversations[conversation_id] = conversation
+    return conversation
+
+
+def generate_agent_responses(conversation_id, user_message, agent_list=None, response_callback=None,
+                             parallel_rounds=None, react_agents=None, director=None, client=None):
     """
     Generate a conversation between agents in response to a user message.
     
     Args:
         conversation_id: Unique ID for this conversation
         user_message: The message from the user
-        agent_list: Optional list of agent names to include (if None, use all four)
+        agent_list: Optional list of agent names to include (if None, use every persona)
         response_callback: Optional callback function to handle responses
+        parallel_rounds: For new multi-agent conversations, generate each round's replies
+            concurrently against one history snapshot (defaults to PARALLEL_ROUNDS)
+        react_agents: Agent names that should still see earlier replies of their round
+            when parallel rounds are enabled
+        director: For new multi-agent conversations, write each burst of replies with a
+            single structured completion (defaults to DIRECTOR_TURNS)
+        client: Key of the requesting client for its admission rate limit
+    
+    Raises:
+        AdmissionRejected: The turn queue is full or the client is over its rate.
     """
     logger.info(f"Generating responses for conversation {conversation_id}")
     logger.info(f"User message: {user_message}")
     logger.info(f"Agent list: {agent_list}")
     
+    # Turn the message away before doing any work for it if the server is saturated
+    ticket = admission.admit(client)
+    try:
+        return start_turn_loop(
+            conversation_id, user_message, agent_list, response_callback,
+            parallel_rounds, react_agents, director, ticket
+        )
+    except BaseException:
+        ticket.release(ran=False)
+        raise
+
+
+def start_turn_loop(conversation_id, user_message, agent_list, response_callback,
+                    parallel_rounds, react_agents, director, ticket):
+    """Set up the conversation and start (or queue) its turn; see `generate_agent_responses`."""
     # Initialize or get conversation
-    if conversation_id not in active_conversations:
+    conversation = get_conversation(conversation_id)
+    if conversation is None:
         # Determine agents to include
         if agent_list is None or len(agent_list) == 0:
-            # Default to all four agents for multi-agent conversations
-            agents = [
-                Agent("Albert Einstein", CHARACTER_PROMPTS["Albert Einstein"]),
-                Agent("Marilyn Monroe", CHARACTER_PROMPTS["Marilyn Monroe"]),
-                Agent("Alan Turing", CHARACTER_PROMPTS["Alan Turing"]),
-                Agent("Theodore Roosevelt", CHARACTER_PROMPTS["Theodore Roosevelt"]),
-                Agent("Nikola Tesla", CHARACTER_PROMPTS["Nikola Tesla"]),
-                Agent("Thomas Edison", CHARACTER_PROMPTS["Thomas Edison"])
-            ]
+            # Default to every persona for multi-agent conversations
+            agents = make_agents(personas.current.names)
             is_multi_agent = True
         else:
             # Create only the specified agents
-            agents = []
-            for agent_name in agent_list:
-                if agent_name in CHARACTER_PROMPTS:
-                    agents.append(Agent(agent_name, CHARACTER_PROMPTS[agent_name]))
+            agents = make_agents(agent_list)
             is_multi_agent = False if len(agents) == 1 else True
         
         logger.info(f"Created {'multi' if is_multi_agent else 'single'}-agent conversation with {len(agents)} agents")
         
-        # Create initial system message based on conversation type
-        if is_multi_agent:
-            # Multi-agent conversation
-            participants = ", ".join(agent.name for agent in agents)
-            system_message = {
-                "role": "system", 
-                "content": f"IMPORTANT CONVERSATION RULES:\n1. This is a group chat with multiple participants.\n2. Each participant should respond only as themselves.\n3. Never include 'User:' or name prefixes.\n4. Participants: {participants}. Chat Topic: General Discussion."
-            }
-        else:
-            # Single-agent conversation
-            system_message = {
-                "role": "system", 
-                "content": f"This is a one-on-one conversation between the user and {agents[0].name if agents else 'unknown'}. Respond naturally as yourself."
-            }
+        if parallel_rounds is None:
+            parallel_rounds = PARALLEL_ROUNDS
+        if director is None:
+            director = DIRECTOR_TURNS
+        for agent in agents:
+            agent.reacts_to_previous = agent.name in (react_agents or [])
         
         # Initialize the conversation
-        active_conversations[conversation_id] = {
-            "agents": agents,
-            "history": [system_message],
-            "last_activity": datetime.now(),
-            "responses": [],  # Store responses for this request
-            "is_multi_agent": is_multi_agent
-        }
+        conversation = build_conversation(conversation_id, agents, is_multi_agent, parallel_rounds, director)
+        conversation["last_turn_id"] = 0  # No worker has run a turn of a new conversation
+        active_conversations[conversation_id] = conversation
+        conversation_db.save_conversation(
+            conversation_id,
+            [agent.name for agent in agents],
+            is_multi_agent,
+            options={
+                "parallel_rounds": conversation["parallel_rounds"],
+                "react_agents": react_agents or [],
+                "director": conversation["director"]
+            }
+        )
+        if state_backend.shared:
+            # Other workers must be able to find the conversation right away
+            conversation_db.flush(conversation_id)
+    
+    # Exactly one worker runs a conversation's turns; others hand the message over
+    if not state_backend.acquire_or_enqueue(conversation_id, user_message):
+        logger.info(f"Turn loop for conversation {conversation_id} is busy, queued user message")
+        # The running loop takes the message over, so it needs no reservation of its own
+        ticket.release(ran=False)
+        if PREEMPT_TURNS:
+            engine.run_background(preempt_turn(conversation_id))
+        return conversation_id
+    
+    turn_id = state_backend.next_turn_id(conversation_id)
+    conversation = conversation_for_turn(conversation_id, turn_id)
+    turn = begin_turn(conversation_id, conversation, user_message, turn_id, response_callback)
     
-    # Get conversation data
-    conversation = active_conversations[conversation_id]
+    # Hand the turn loop to the shared event loop
+    engine.submit(run_turns(conversation_id, turn, response_callback, ticket))
+    
+    # Return the conversation ID so client can poll for responses
+    return conversation_id
+
+
+def conversation_for_turn(conversation_id, turn_id):
+    """
+    The conversation state to run turn `turn_id` on, claimed for the turn (see
+    `get_conversation`). With a shared state backend another worker may have run
+    earlier turns, so the cached copy is only used if this worker ran the turn
+    before; otherwise it is reloaded from the database.
+    """
+    if state_backend.shared:
+        conversation = active_conversations.claim(conversation_id)
+        if conversation is not None and conversation["last_turn_id"] == turn_id - 1:
+            return conversation
+        active_conversations.discard(conversation_id)
+    return get_conversation(conversation_id, claim=True)
+
+
+async def run_turns(conversation_id, turn, response_callback=None, ticket=None):
+    """
+    Run a turn and then every user message queued behind it while this worker
+    holds the conversation's lease, releasing the lease when the queue is empty.
+    The admission `ticket` is given back when the loop ends.
+    """
+    # Runs as its own task, so this tags every log line of the turn loop
+    set_log_context(conversation_id=conversation_id)
+    if ticket is not None:
+        ticket.start()
+    try:
+        await run_turn_queue(conversation_id, turn, response_callback)
+    finally:
+        if ticket is not None:
+            ticket.release()
+
+
+async def hold_lease(conversation_id, task):
+    """
+    Renew the conversation's lease while `task` (a turn) runs, however long its
+    completions wait. If another worker has taken the lease over, cancel the
+    turn and return False.
+    """
+    interval = state_backend.lease_seconds / 3
+    while not task.done():
+        await asyncio.sleep(interval)
+        if task.done():
+            break
+        if not await asyncio.to_thread(state_backend.renew_lease, conversation_id):
+            logger.warning(f"Lost the turn lease for conversation {conversation_id}, stopping its turn")
+            task.cancel()
+            return False
+    return True
+
+
+async def run_turn_queue(conversation_id, turn, response_callback):
+    """The body of `run_turns`: runs turns until the conversation's queue is empty."""
+    while True:
+        # Each turn is a task of its own so a newer user message can cancel it
+        task = asyncio.ensure_future(turn)
+        lease = asyncio.ensure_future(hold_lease(conversation_id, task)) if state_backend.shared else None
+        await asyncio.wait([task])
+        if lease is not None:
+            if lease.done() and not lease.result():
+                # The new lease holder runs the queued messages
+                return
+            lease.cancel()
+        if state_backend.shared:
+            # Make this turn's messages visible to the next lease holder
+            await asyncio.to_thread(conversation_db.flush, conversation_id)
+        user_message = await asyncio.to_thread(state_backend.finish_turn, conversation_id)
+        if user_message is None:
+            return
+        if state_backend.shared:
+            # A write transaction on the shared database; keep it off the event loop
+            turn_id = await asyncio.to_thread(state_backend.next_turn_id, conversation_id)
+        else:
+            turn_id = state_backend.next_turn_id(conversation_id)
+        conversation = await asyncio.to_thread(conversation_for_turn, conversation_id, turn_id)
+        turn = begin_turn(conversation_id, conversation, user_message, turn_id, response_callback)
+
+
+async def preempt_turn(conversation_id):
+    """
+    Cancel the turn this worker is running for a conversation once a newer user
+    message is queued behind it. Pending completions are aborted and the
+    remaining speakers skipped; the queued message then starts the next turn.
+    """
+    conversation = active_conversations.get(conversation_id)
+    task = conversation.get("turn_task") if conversation is not None else None
+    if task is None or task.done():
+        return
+    if state_backend.shared:
+        pending = await asyncio.to_thread(state_backend.has_pending, conversation_id)
+    else:
+        pending = state_backend.has_pending(conversation_id)
+    # The turn may have finished (and picked up the message) while we checked
+    if pending and conversation.get("turn_task") is task and not task.done():
+        logger.info(f"Preempting running turn for conversation {conversation_id}")
+        task.cancel()
+
+
+class TurnPreempted(Exception):
+    """Raised inside a turn when a newer user message is waiting for the conversation."""
+
+
+def begin_turn(conversation_id, conversation, user_message, turn_id, response_callback=None):
+    """
+    Record the user's message and return the coroutine that generates the agents'
+    replies to it. The caller must hold the conversation's turn-loop lease and
+    passes the `turn_id` it got from `state_backend.next_turn_id`, since that may
+    block on the database and `begin_turn` also runs on the event loop.
+    """
     agents = conversation["agents"]
-    history = conversation["history"]
+    context = conversation["context"]
     is_multi_agent = conversation["is_multi_agent"]
     
-    # Clear previous responses for this request
-    conversation["responses"] = []
+    events = conversation["events"]
+    
+    conversation["generating"] = True
+    conversation["last_activity"] = datetime.now()
+    conversation["last_turn_id"] = turn_id
+    
+    # Mark where this turn starts so /stream clients replay only the current turn
+    conversation["turn_start_seq"] = events.last_seq
+    
+    turn_metrics = {"mode": "multi_agent" if is_multi_agent else "single_agent", "replies": 0}
     
     # Add user message to conversation history
     user_message_formatted = f"User: {user_message}"
-    history.append({"role": "user", "content": user_message_formatted})
+    context.append({"role": "user", "content": user_message_formatted}, speaker=USER_SPEAKER)
+    conversation_db.append_message(conversation_id, "user", user_message_formatted)
+    schedule_summary(conversation_id, context)
+    
+    async def check_preempted():
+        """Skip the remaining speakers once a newer user message is queued (on any worker)."""
+        if not PREEMPT_TURNS:
+            return
+        if state_backend.shared:
+            pending = await asyncio.to_thread(state_backend.has_pending, conversation_id)
+        else:
+            pending = state_backend.has_pending(conversation_id)
+        if pending:
+            raise TurnPreempted()
+    
+    async def stream_reply(agent):
+        """Generate one agent reply, publishing start/token/done events as it streams."""
+        await check_preempted()
+        events.append("agent_start", {"turn": turn_id, "agent": agent.name})
+        reply = await agent.get_response(
+            context.window(),
+            on_token=lambda text: events.append("token", {"turn": turn_id, "agent": agent.name, "text": text})
+        )
+        events.append("agent_done", {"turn": turn_id, "agent": agent.name, "content": reply})
+        return reply
+    
+    async def publish_reply(agent, reply):
+        """Record a finished reply in the history and hand it to pollers and the callback."""
+        context.append({
+            "role": "assistant", 
+            "content": reply
+        }, speaker=agent.name)
+        conversation_db.append_message(conversation_id, "assistant", reply, speaker=agent.name)
+        
+        response = {
+            "turn": turn_id,
+            "agent": agent.name,
+            "content": reply
+        }
+        if state_backend.shared:
+            # The reply is already in the history; finish publishing it even if the turn is preempted
+            publish = asyncio.ensure_future(asyncio.to_thread(state_backend.publish_response, conversation_id, response))
+            try:
+                await asyncio.shield(publish)
+            except asyncio.CancelledError:
+                await publish
+                raise
+        else:
+            state_backend.publish_response(conversation_id, response)
+        
+        with log_context(agent=agent.name):
+            logger.info(f"Agent {agent.name} responded: {reply[:50]}...")
+        turn_metrics["replies"] += 1
+        
+        if response_callback:
+            response_callback(agent.name, reply)
     
-    # Process agent responses in a separate thread
-    def process_responses():
+    async def run_parallel_round(sorted_agents):
+        """
+        Run one multi-agent round speculatively.
+
+        All speak/skip draws are made up front and the speakers' completions are
+        issued concurrently against the same history snapshot. Replies are then
+        published in priority order. Agents with `reacts_to_previous` set are not
+        speculated; they are generated in turn once the earlier replies are in.
+        """
+        speakers = []
+        for agent in sorted_agents:
+            if random.random() < agent.response_rate:
+                speakers.append(agent)
+                agent.response_sort = 1
+            else:
+                agent.response_sort += 1
+            agent.response_rate *= (10 / 15)
+        
+        if not speakers:
+            return
+        
+        # The first speaker sees the same history either way, so it streams live
+        snapshot = context.window()
+        pending = {
+            agent.name: asyncio.ensure_future(agent.get_response(snapshot))
+            for agent in speakers[1:]
+            if not agent.reacts_to_previous
+        }
+        
+        try:
+            for index, agent in enumerate(speakers):
+                if index == 0 or agent.name not in pending:
+                    reply = await stream_reply(agent)
+                else:
+                    reply = await pending[agent.name]
+                    events.append("agent_start", {"turn": turn_id, "agent": agent.name})
+                    events.append("token", {"turn": turn_id, "agent": agent.name, "text": reply})
+                    events.append("agent_done", {"turn": turn_id, "agent": agent.name, "content": reply})
+                await publish_reply(agent, reply)
+        finally:
+            for task in pending.values():
+                task.cancel()
+    
+    async def run_director_burst():
+        """
+        Draw the burst's speaking order up front, then have one structured completion
+        write every line. Each line is cleaned and published as soon as it has
+        streamed in. Falls back to one completion per speaker if the director fails.
+        """
+        speakers = plan_burst(agents)
+        if not speakers:
+            return
+        by_name = {agent.name: agent for agent in agents}
+        lead = speakers[0]
+        parser = DirectorLineParser()
+        lines = asyncio.Queue()
+        
+        def on_token(text):
+            for line in parser.feed(text):
+                lines.put_nowait(line)
+        
+        # The same routing policy as per-agent replies: the lead's model and each line's limit
+        routes = [model_router.route(agent, agent.participants, agent.is_multi_agent, agent.turn_started)
+                  for agent in speakers]
+        max_tokens = sum(route["max_tokens"] for route in routes)
+        with log_context(route=routes[0]["policy"], model=routes[0]["model"], max_tokens=max_tokens):
+            logger.info(f"Routing director burst of {len(speakers)} lines to {routes[0]['model']}")
+        call = asyncio.ensure_future(call_llm(
+            conversation_id, "director", routes[0]["model"],
+            context.window().with_trailer(director_instruction(speakers)),
+            lead.temperature, max_tokens,
+            on_token=on_token, response_format=director_response_format(speakers), kind="director"
+        ))
+        call.add_done_callback(lambda _: lines.put_nowait(None))
+        
+        published = 0
+        try:
+            while published < len(speakers):
+                line = await lines.get()
+                if line is None:
+                    break
+                agent = by_name.get(line["speaker"])
+                if agent is None:
+                    continue
+                text = line["text"].strip()
+                reply = agent.validate_and_clean_response(text)
+                if reply != text:
+                    replies_sanitized.inc(agent=agent.name)
+                events.append("agent_start", {"turn": turn_id, "agent": agent.name})
+                events.append("token", {"turn": turn_id, "agent": agent.name, "text": reply})
+                events.append("agent_done", {"turn": turn_id, "agent": agent.name, "content": reply})
+                await publish_reply(agent, reply)
+                published += 1
+            _, usage = await call
+            prompt_cache_stats.record(conversation_id, "director", usage)
+        except Exception as e:
+            logger.error(f"Director completion failed: {str(e)}")
+            llm_errors.inc(agent="director", error=type(e).__name__)
+        finally:
+            call.cancel()
+        
+        if published == 0:
+            for agent in speakers:
+                reply = await stream_reply(agent)
+                await publish_reply(agent, reply)
+    
+    # Process agent responses as a coroutine on the generation engine
+    async def process_responses():
+        turn_started = time.monotonic()
+        for agent in agents:
+            # Replies late in a long burst are routed to stay within the turn budget
+            agent.turn_started = turn_started
+        # Lets preempt_turn find (and cancel) this turn once it is running
+        conversation["turn_task"] = asyncio.current_task()
+        preempted = False
         try:
             logger.info(f"Processing responses for conversation {conversation_id} (multi-agent: {is_multi_agent})")
             
-            if is_multi_agent:
+            if is_multi_agent and conversation["director"]:
+                # One structured completion writes the whole burst
+                await run_director_burst()
+            elif is_multi_agent:
                 # Multi-agent conversation mode
                 # Reset each agent's response rate
                 for agent in agents:
@@ -287,34 +1031,21 @@ def generate_agent_responses(conversation_id, user_message, agent_list=None, res
                     # Sort agents by their response_sort value (priority)
                     sorted_agents = sorted(agents, key=lambda a: a.response_sort)
                     
+                    if conversation["parallel_rounds"]:
+                        await run_parallel_round(sorted_agents)
+                        continue
+                    
                     for agent in sorted_agents:
                         # Decide if this agent responds
                         if random.random() < agent.response_rate:
-                            reply = agent.get_response(history)
-                            
-                            # Add the response to the conversation history
-                            history.append({
-                                "role": "assistant", 
-                                "content": reply
-                            })
-                            
-                            # Add to responses list
-                            conversation["responses"].append({
-                                "agent": agent.name,
-                                "content": reply
-                            })
-                            
-                            logger.info(f"Agent {agent.name} responded: {reply[:50]}...")
-                            
-                            # Call callback if provided
-                            if response_callback:
-                                response_callback(agent.name, reply)
+                            reply = await stream_reply(agent)
+                            await publish_reply(agent, reply)
                             
                             # Reset this agent's sort priority
                             agent.response_sort = 1
                             
                             # Add a small delay between responses
-                            time.sleep(0.25)
+                            await asyncio.sleep(0.25)
                         else:
                             # Increase this agent's priority for next round
                             agent.response_sort += 1
@@ -329,38 +1060,60 @@ def generate_agent_responses(conversation_id, user_message, agent_list=None, res
                 # Single-agent conversation mode - just get one response from each agent
                 for agent in agents:
                     logger.info(f"Generating single-agent response from {agent.name}")
-                    reply = agent.get_response(history)
-                    
-                    # Add the response to the conversation history
-                    history.append({
-                        "role": "assistant", 
-                        "content": reply
-                    })
-                    
-                    # Add to responses list
-                    conversation["responses"].append({
-                        "agent": agent.name,
-                        "content": reply
-                    })
-                    
-                    logger.info(f"Single-agent response from {agent.name}: {reply[:50]}...")
-                    
-                    # Call callback if provided
-                    if response_callback:
-                        response_callback(agent.name, reply)
+                    reply = await stream_reply(agent)
+                    await publish_reply(agent, reply)
             
             # Update last activity time
             conversation["last_activity"] = datetime.now()
+            schedule_summary(conversation_id, context)
             
+            cache_report = prompt_cache_stats.conversation(conversation_id)
+            logger.info(f"Prompt cache hit ratio for conversation {conversation_id}: {cache_report['hit_ratio']:.0%}")
+            
+        except (TurnPreempted, asyncio.CancelledError):
+            # A newer user message takes over from the history as published so far
+            logger.info(f"Turn {turn_id} preempted after {turn_metrics['replies']} replies")
+            turns_preempted.inc()
+            preempted = True
         except Exception as e:
             logger.error(f"Error processing responses: {str(e)}", exc_info=True)
+        finally:
+            # Always close the turn so streaming clients don't hang
+            events.append("turn_done", {"turn": turn_id, "preempted": preempted})
+            conversation["turn_task"] = None
+            conversation["generating"] = False
+            save_counters(conversation_id, conversation)
+            active_conversations.touch(conversation_id)
+            turn_seconds.observe(time.monotonic() - turn_started, mode=turn_metrics["mode"])
+            turn_replies.observe(turn_metrics["replies"], mode=turn_metrics["mode"])
     
-    # Start processing in a separate thread
-    processing_thread = threading.Thread(target=process_responses, daemon=True)
-    processing_thread.start()
-    
-    # Return the conversation ID so client can poll for responses
-    return conversation_id
+    return process_responses()
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.monotonic()
+    conversation_id = (request.view_args or {}).get('conversation_id')
+    if conversation_id:
+        g.log_context_token = set_log_context(conversation_id=conversation_id)
+
+
+@app.teardown_request
+def clear_log_context(exc):
+    token = g.pop('log_context_token', None)
+    if token is not None:
+        reset_log_context(token)
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get("request_started")
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        http_request_seconds.observe(
+            time.monotonic() - started, route=route, method=request.method, status=response.status_code
+        )
+    return response
+
 
 @app.after_request
 def after_request(response):
@@ -378,6 +1131,33 @@ def after_request(response):
     return response
 
 
+def client_key():
+    """Who a request counts against for the per-client admission rate."""
+    if ADMISSION_CLIENT_HEADER:
+        value = request.headers.get(ADMISSION_CLIENT_HEADER)
+        if value:
+            # X-Forwarded-For style lists start with the original client
+            return value.split(",")[0].strip()
+    return request.remote_addr
+
+
+def admission_rejected_response(rejection):
+    """The fast 429/503 answer for a message turned away by admission control."""
+    admission_rejections.inc(reason=rejection.reason)
+    logger.warning(f"Rejected user message ({rejection.reason}); retry after {rejection.retry_after}s")
+    body = {
+        'error': 'Too many requests' if rejection.status == 429 else 'Server is busy',
+        'reason': rejection.reason,
+        'retry_after': rejection.retry_after
+    }
+    if rejection.queue_position is not None:
+        body['queue_position'] = rejection.queue_position
+    response = jsonify(body)
+    response.status_code = rejection.status
+    response.headers['Retry-After'] = str(rejection.retry_after)
+    return response
+
+
 @app.route('/chat', methods=['POST', 'OPTIONS'])
 def chat():
     # Handle preflight request
@@ -391,18 +1171,20 @@ def chat():
         conversation_id = data.get('conversation_id')
         
         # Get the proper agent name
-        agent_name = AGENT_MAPPING.get(agent_id.lower())
+        persona = personas.current.resolve(agent_id)
+        agent_name = persona.name if persona else None
         
         # Always create a new conversation ID if switching agents
         if not conversation_id or data.get('force_new_conversation', False):
-            conversation_id = f"conv_{int(time.time())}"
+            conversation_id = new_conversation_id()
             logger.info(f"Created new conversation ID: {conversation_id}")
 
         # Generate responses with the agent
         generate_agent_responses(
             conversation_id, 
             message, 
-            agent_list=[agent_name]
+            agent_list=[agent_name],
+            client=client_key()
         )
         
         return jsonify({
@@ -410,6 +1192,8 @@ def chat():
             'status': 'processing'
         })
 
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"Error: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -428,7 +1212,7 @@ def start_conversation():
         
         # Default to empty message if not provided
         user_message = data.get('message', '')
-        conversation_id = data.get('conversation_id') or f"conv_{int(time.time())}"
+        conversation_id = data.get('conversation_id') or new_conversation_id()
         
         # Default to single-agent mode for safety
         is_multi_agent = data.get('multi_agent', False)
@@ -439,10 +1223,17 @@ def start_conversation():
         agent_id = data.get('agent_id')
         agent_list = data.get('agent_list', [])
         
+        # Optional turn engines for group chats: speculative parallel rounds or a single director call
+        parallel_rounds = data.get('parallel_rounds')
+        react_agents = data.get('react_agents')
+        director = data.get('director')
+        
         # If we have agent_list in the request, use it directly
         if agent_list:
             logger.info(f"Using provided agent_list: {agent_list}")
-            generate_agent_responses(conversation_id, user_message, agent_list=agent_list)
+            generate_agent_responses(conversation_id, user_message, agent_list=agent_list,
+                                     parallel_rounds=parallel_rounds, react_agents=react_agents, director=director,
+                                     client=client_key())
             return jsonify({
                 'conversation_id': conversation_id,
                 'status': 'processing'
@@ -450,13 +1241,14 @@ def start_conversation():
             
         # If we have agent_id but no agent_list, create one
         if not is_multi_agent and agent_id:
-            # Get the proper agent name from the mapping
-            agent_name = AGENT_MAPPING.get(agent_id.lower())
+            # Get the proper agent name from the persona registry (ids, names and aliases)
+            persona = personas.current.resolve(agent_id)
+            agent_name = persona.name if persona else None
             
-            if agent_name and agent_name in CHARACTER_PROMPTS:
+            if agent_name:
                 logger.info(f"Starting single-agent conversation with {agent_name}")
                 # Start single-agent conversation
-                generate_agent_responses(conversation_id, user_message, agent_list=[agent_name])
+                generate_agent_responses(conversation_id, user_message, agent_list=[agent_name], client=client_key())
                 return jsonify({
                     'conversation_id': conversation_id,
                     'status': 'processing'
@@ -468,7 +1260,9 @@ def start_conversation():
         # Only start multi-agent conversation if explicitly requested
         if is_multi_agent:
             logger.info("Starting multi-agent conversation with all agents")
-            generate_agent_responses(conversation_id, user_message)
+            generate_agent_responses(conversation_id, user_message,
+                                     parallel_rounds=parallel_rounds, react_agents=react_agents, director=director,
+                                     client=client_key())
             return jsonify({
                 'conversation_id': conversation_id,
                 'status': 'processing'
@@ -478,29 +1272,236 @@ def start_conversation():
             logger.error("No agent specified for single-agent conversation")
             return jsonify({'error': 'No agent specified for single-agent conversation'}), 400
         
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"Error starting conversation: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/get_responses/<conversation_id>', methods=['GET'])
 def get_responses(conversation_id):
-    """Get all responses for a given conversation ID."""
-    if conversation_id not in active_conversations:
+    """
+    Get responses for a given conversation ID.
+
+    Query parameters:
+        after: Sequence number of the last reply the client has seen. Without it the
+            server remembers a cursor per conversation and returns each reply once.
+        wait: Seconds to block until a newer reply arrives (long-poll, capped at
+            MAX_LONG_POLL_SECONDS). Also returns early when the turn finishes.
+
+    Replies carry a `seq` field and the response has an ETag of the newest sequence
+    number; a matching If-None-Match with nothing new yields 304 Not Modified.
+    """
+    conversation = get_conversation(conversation_id)
+    if conversation is None:
         return jsonify({'error': 'Conversation not found'}), 404
     
-    conversation = active_conversations[conversation_id]
+    after = request.args.get('after', type=int)
+    wait = min(max(request.args.get('wait', default=0, type=float), 0), MAX_LONG_POLL_SECONDS)
+    
+    # Blocks until a newer reply arrives or the conversation's turn loop goes idle
+    responses, last_seq, generating = state_backend.read_responses(conversation_id, after=after, wait=wait)
     
-    # Get responses and clear the list
-    responses = conversation["responses"].copy()
-    conversation["responses"] = []
+    etag = f'"{conversation_id}-{last_seq}"'
+    if not responses and request.if_none_match.contains(etag.strip('"')):
+        response = app.response_class(status=304)
+        response.headers['ETag'] = etag
+        return response
     
-    logger.info(f"Returning {len(responses)} responses for conversation {conversation_id}")
+    poll_logger.info(f"Returning {len(responses)} responses for conversation {conversation_id}")
     
-    return jsonify({
+    if responses:
+        cursor = responses[-1]["seq"]
+    else:
+        cursor = after if after is not None else last_seq
+    
+    response = jsonify({
         'conversation_id': conversation_id,
         'responses': responses,
-        'has_more': len(responses) > 0  # If we returned responses, there might be more coming
+        'cursor': cursor,
+        'generating': generating,
+        'has_more': len(responses) > 0 or generating
     })
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def format_sse(event):
+    """Serialize an EventLog entry as a Server-Sent Events frame."""
+    return f"id: {event['seq']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
+@app.route('/stream/<conversation_id>', methods=['GET'])
+def stream_responses(conversation_id):
+    """
+    Stream agent replies for a conversation as Server-Sent Events.
+
+    Emits `agent_start`, `token`, `agent_done` and `turn_done` events. By default the
+    current turn is replayed from its start and the stream closes after `turn_done`;
+    EventSource clients then reconnect with `Last-Event-ID` and pick up the next turn.
+    Pass `?follow=1` to keep the stream open across turns.
+
+    With a shared (multi-worker) state backend the turn may be running in another
+    process, so the stream is built from the shared reply log instead: it carries
+    `agent_done` and `turn_done` events but no tokens.
+    """
+    conversation = get_conversation(conversation_id)
+    if conversation is None:
+        return jsonify({'error': 'Conversation not found'}), 404
+    
+    events = conversation["events"]
+    follow = request.args.get('follow', '0') == '1'
+    
+    # Resume after the last event the client saw, otherwise replay the current turn
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('after')
+    try:
+        cursor = int(last_event_id) if last_event_id else None
+    except ValueError:
+        cursor = None
+    
+    def generate_shared():
+        nonlocal cursor
+        if cursor is None:
+            retained = state_backend.read_responses(conversation_id, after=0)[0]
+            current_turn = [r for r in retained if r["turn"] == retained[-1]["turn"]] if retained else []
+            cursor = current_turn[0]["seq"] - 1 if current_turn else 0
+        yield "retry: 1000\n\n"
+        turn = None
+        last_write = time.monotonic()
+        while True:
+            responses, _, generating = state_backend.read_responses(
+                conversation_id, after=cursor, wait=STREAM_HEARTBEAT_SECONDS
+            )
+            for response in responses:
+                cursor, turn = response["seq"], response["turn"]
+                data = {"turn": turn, "agent": response["agent"], "content": response["content"]}
+                yield format_sse({"seq": cursor, "event": "agent_done", "data": data})
+                last_write = time.monotonic()
+            if turn is not None and not generating:
+                yield format_sse({"seq": cursor, "event": "turn_done", "data": {"turn": turn}})
+                turn = None
+                if not follow:
+                    return
+            if not responses:
+                if not generating:
+                    # Nothing running anywhere; check back for the next turn
+                    time.sleep(SHARED_STREAM_POLL_SECONDS)
+                if time.monotonic() - last_write >= STREAM_HEARTBEAT_SECONDS:
+                    yield ": keep-alive\n\n"
+                    last_write = time.monotonic()
+    
+    if state_backend.shared:
+        return Response(
+            stream_with_context(generate_shared()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+    
+    if cursor is None:
+        cursor = conversation["turn_start_seq"]
+    
+    def generate():
+        nonlocal cursor, events
+        yield "retry: 1000\n\n"
+        while True:
+            if events.closed:
+                # The conversation was evicted; follow its rehydrated copy, whose log continues after cursor
+                current = get_conversation(conversation_id)
+                if current is None:
+                    return
+                if current["events"].closed:
+                    # Evicted again at once (every other conversation is busy); retry shortly
+                    time.sleep(SHARED_STREAM_POLL_SECONDS)
+                events = current["events"]
+            pending = events.wait_after(cursor, timeout=STREAM_HEARTBEAT_SECONDS)
+            if not pending:
+                if not events.closed:
+                    yield ": keep-alive\n\n"
+                continue
+            for event in pending:
+                cursor = event["seq"]
+                yield format_sse(event)
+                if event["event"] == "turn_done" and not follow:
+                    return
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/stats/prompt_cache', methods=['GET'])
+def prompt_cache_report():
+    """Report provider prompt-cache hit ratios per agent and per conversation."""
+    return jsonify(prompt_cache_stats.snapshot())
+
+
+@app.route('/stats/conversations', methods=['GET'])
+def conversation_store_report():
+    """Report how many conversations are held in memory and how many were evicted."""
+    return jsonify({**active_conversations.stats(), 'database': conversation_db.stats()})
+
+
+@app.route('/stats/llm_transport', methods=['GET'])
+def llm_transport_report():
+    """Report how many LLM requests reused a pooled connection."""
+    return jsonify({**llm_connection_stats.snapshot(), **llm_backend.stats()})
+
+
+@app.route('/stats/response_cache', methods=['GET'])
+def response_cache_report():
+    """Report size and hit/miss counters of the opening-reply cache."""
+    return jsonify(response_cache.stats())
+
+
+@app.route('/stats/openers', methods=['GET'])
+def opener_pool_report():
+    """Report pooled openers per persona and how often first replies were served from the pool."""
+    return jsonify(opener_pool.stats())
+
+
+@app.route('/stats/hedging', methods=['GET'])
+def hedging_report():
+    """Report how many LLM calls were hedged, how often the hedge won and the budget left."""
+    return jsonify(hedger.stats())
+
+
+@app.route('/stats/routing', methods=['GET'])
+def routing_report():
+    """Report recent latency per model and the calls, latency and token use of each routing policy."""
+    return jsonify(model_router.stats())
+
+
+@app.route('/stats/scheduler', methods=['GET'])
+def scheduler_report():
+    """Report queued LLM calls and how long calls waited for rate-limit capacity."""
+    return jsonify(llm_scheduler.stats())
+
+
+@app.route('/stats/admission', methods=['GET'])
+def admission_report():
+    """Report turn loops running and queued, and how many messages admission control turned away."""
+    return jsonify({**admission.stats(), 'active_turns': engine.active_turns, 'engine_queued_turns': engine.queued_turns})
+
+
+@app.route('/stats/startup', methods=['GET'])
+def startup_report():
+    """How long this process took to start its services, step by step (milliseconds)."""
+    return jsonify({**startup, "personas": personas.stats()})
+
+
+@app.route('/personas', methods=['GET'])
+def list_personas():
+    """Every persona the server can chat as, with its precomputed prompt size."""
+    return jsonify({"personas": [persona.describe() for persona in personas.current.by_name.values()]})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_report():
+    """Export latency histograms, token/error counters and load gauges for Prometheus."""
+    return Response(metrics.render(), content_type=MetricsRegistry.CONTENT_TYPE)
 
 
 @app.route('/continue_conversation', methods=['POST'])
@@ -511,22 +1512,25 @@ def continue_conversation():
         conversation_id = data.get('conversation_id')
         user_message = data.get('message', '')
         
-        if not conversation_id or conversation_id not in active_conversations:
+        if not conversation_id or get_conversation(conversation_id) is None:
             return jsonify({'error': 'Invalid or missing conversation ID'}), 400
         
         # Continue the conversation
-        generate_agent_responses(conversation_id, user_message)
+        generate_agent_responses(conversation_id, user_message, client=client_key())
         
         return jsonify({
             'conversation_id': conversation_id,
             'status': 'processing'
         })
         
+    except AdmissionRejected as e:
+        return admission_rejected_response(e)
     except Exception as e:
         logger.error(f"Error continuing conversation: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
 
 if __name__ == '__main__':
+    create_app()
     logger.info("Starting Flask server...")
     app.run(debug=True, port=8000)
\ No newline at end of file
@@ -0,0 +1,149 @@
+"""
+Run many scripted conversations in parallel and stream the results to JSONL.
+
+Each line of the input file is one script:
+
+    {"id": "qa-001", "messages": ["Hi everyone!", "What about AI?"],
+     "agents": ["Albert Einstein", "Alan Turing"], "director": false}
+
+Only "messages" is required; "id" defaults to the line number and "agents" to the
+batch_messages_loop default. Every finished script is appended to the output
+file as one JSON line holding its transcript with per-turn timings and token
+usage. A script with any failed reply is recorded as "error". Scripts already
+recorded as "ok" in the output file are skipped, so an interrupted run resumes
+where it stopped and failed scripts are retried:
+
+    python batch_runner.py scripts.jsonl -o results.jsonl --workers 16
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from Chat_main import batch_messages_loop, make_agents
+
+
+def load_scripts(path):
+    """Read scripts from a JSONL file, assigning ids to scripts without one."""
+    scripts = []
+    with open(path) as source:
+        for number, line in enumerate(source, 1):
+            line = line.strip()
+            if not line:
+                continue
+            script = json.loads(line)
+            script.setdefault("id", f"line-{number}")
+            scripts.append(script)
+    return scripts
+
+
+def load_finished(path, retry_failed=True):
+    """Ids of scripts already in the output file (only successful ones if `retry_failed`)."""
+    finished = set()
+    if not os.path.exists(path):
+        return finished
+    with open(path) as output:
+        for line in output:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partial line from an interrupted write
+            if record.get("status") == "ok" or not retry_failed:
+                finished.add(record["id"])
+    return finished
+
+
+def run_script(script, director=False, pause=0, reply_delay=0):
+    """Run one script through batch_messages_loop and return its result record."""
+    started = time.monotonic()
+    record = {"id": script["id"]}
+    try:
+        messages = script["messages"]
+        if not isinstance(messages, list) or not messages:
+            raise ValueError("script needs a non-empty 'messages' list")
+        agents = make_agents(script["agents"]) if script.get("agents") else None
+        turns = batch_messages_loop(
+            messages, agents=agents, director=script.get("director", director),
+            pause=pause, reply_delay=reply_delay, verbose=False
+        )
+        error_replies = sum(
+            1 for turn in turns for reply in turn["replies"]
+            if reply["content"].startswith("[Error in generating response")
+        )
+        record.update({
+            "status": "ok",
+            "turns": turns,
+            "prompt_tokens": sum(turn["prompt_tokens"] for turn in turns),
+            "completion_tokens": sum(turn["completion_tokens"] for turn in turns),
+            "error_replies": error_replies,
+        })
+        if error_replies:
+            # The transcript is kept, but the script is run again on resume
+            record.update({"status": "error", "error": f"{error_replies} replies failed to generate"})
+    except Exception as e:
+        record.update({"status": "error", "error": str(e)})
+    record["seconds"] = round(time.monotonic() - started, 3)
+    record["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    return record
+
+
+def open_output(path):
+    """Open the output for appending, terminating a line cut off by an interrupted run."""
+    output = open(path, "a+")
+    output.seek(0, os.SEEK_END)
+    if output.tell() > 0:
+        output.seek(output.tell() - 1)
+        if output.read(1) != "\n":
+            output.write("\n")
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scripts", help="JSONL file with one script per line")
+    parser.add_argument("-o", "--output", default="batch_results.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Conversations run at once; caps concurrent LLM calls across the batch")
+    parser.add_argument("--processes", action="store_true", help="Use a process pool instead of threads")
+    parser.add_argument("--director", action="store_true", help="Default scripts to the director turn engine")
+    parser.add_argument("--pause", type=float, default=0, help="Seconds between user messages")
+    parser.add_argument("--reply-delay", type=float, default=0, help="Seconds after each agent reply")
+    parser.add_argument("--no-retry-failed", action="store_true", help="On resume, skip scripts that errored too")
+    args = parser.parse_args(argv)
+
+    scripts = load_scripts(args.scripts)
+    finished = load_finished(args.output, retry_failed=not args.no_retry_failed)
+    pending = [script for script in scripts if script["id"] not in finished]
+    print(f"{len(scripts)} scripts, {len(scripts) - len(pending)} already done, running {len(pending)} "
+          f"with {args.workers} workers", file=sys.stderr)
+
+    executor_class = ProcessPoolExecutor if args.processes else ThreadPoolExecutor
+    completed = failed = 0
+    with open_output(args.output) as output, executor_class(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(run_script, script, args.director, args.pause, args.reply_delay)
+            for script in pending
+        ]
+        try:
+            for future in as_completed(futures):
+                record = future.result()
+                output.write(json.dumps(record) + "\n")
+                output.flush()
+                completed += 1
+                failed += record["status"] != "ok"
+                print(f"[{completed}/{len(pending)}] {record['id']} {record['status']} {record['seconds']:.1f}s",
+                      file=sys.stderr)
+        except KeyboardInterrupt:
+            for future in futures:
+                future.cancel()
+            print("Interrupted; rerun the same command to resume", file=sys.stderr)
+            raise
+    print(f"Finished {completed} scripts ({failed} failed); results in {args.output}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Tail-latency benchmark for hedged LLM requests.
+
+Runs the load test (benchmarks/load_test.py) twice against a self-started server
+with the fake backend and a heavy-tailed latency distribution, once with
+HEDGE_REQUESTS=0 and once with HEDGE_REQUESTS=1, and prints p50/p99 time to first
+reply and turn completion side by side together with the extra calls hedging cost:
+
+    python benchmarks/hedge_bench.py --users 10 --turns 12
+"""
+import argparse
+import json
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, "benchmarks"))
+
+import load_test  # noqa: E402
+
+
+def run(args, hedge):
+    argv = [
+        "--users", str(args.users), "--turns", str(args.turns), "--mode", args.mode,
+        "--port", str(args.port + hedge), "--seed", str(args.seed),
+        "--server-env", f"HEDGE_REQUESTS={hedge}",
+        "--server-env", f"HEDGE_PERCENTILE={args.percentile}",
+        "--server-env", f"HEDGE_BUDGET={args.budget}",
+        "--server-env", f"FAKE_LLM_LATENCY_MS={args.latency_ms}",
+        "--server-env", f"FAKE_LLM_LATENCY_JITTER={args.jitter}",
+        "--server-env", f"FAKE_LLM_SEED={args.seed}",
+        "--server-env", "LOG_FILE=",
+        # Every call should reach the backend, so the comparison isn't skewed by cached openers
+        "--server-env", "RESPONSE_CACHE_SIZE=0",
+        "--server-env", "OPENER_POOL_SIZE=0",
+    ]
+    print(f"\n--- HEDGE_REQUESTS={hedge} ---")
+    return load_test.main(argv)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--mode", choices=["single", "multi", "mixed"], default="single")
+    parser.add_argument("--port", type=int, default=8775, help="Port of the first server (the second uses port + 1)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency-ms", type=float, default=400, help="Median fake LLM latency")
+    parser.add_argument("--jitter", type=float, default=1.0, help="Lognormal spread of the fake latency (tail weight)")
+    parser.add_argument("--percentile", type=float, default=95, help="HEDGE_PERCENTILE for the hedged run")
+    parser.add_argument("--budget", type=float, default=0.05, help="HEDGE_BUDGET for the hedged run")
+    parser.add_argument("--json", help="Also write both reports to this file")
+    args = parser.parse_args(argv)
+
+    reports = {"baseline": run(args, 0), "hedged": run(args, 1)}
+
+    print(f"\n{'metric':>26} {'baseline':>10} {'hedged':>10}")
+    for name in ("time_to_first_reply", "turn_time"):
+        for pct in (50, 99):
+            key = f"{name}_p{pct}"
+            values = [load_test.format_seconds(reports[run_name][key]) for run_name in ("baseline", "hedged")]
+            print(f"{key:>26} {values[0]:>10} {values[1]:>10}")
+    print(f"{'replies':>26} {reports['baseline']['replies']:>10} {reports['hedged']['replies']:>10}")
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(reports, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
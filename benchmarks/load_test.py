@@ -0,0 +1,319 @@
+"""
+Load-generation benchmark for the chat server.
+
+Drives N concurrent simulated users through the HTTP API (/start_conversation,
+/continue_conversation, /get_responses) and reports time-to-first-reply, turn
+completion time, throughput and server memory.
+
+By default it starts its own server with the fake LLM backend, so it needs no
+network access or API key:
+
+    python benchmarks/load_test.py --users 50 --turns 3
+
+Point it at a running server instead with --url (and --server-pid to sample its RSS).
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+AGENT_IDS = ["einstein", "monroe", "turing", "tesla", "edison", "jobs"]
+
+USER_MESSAGES = [
+    "Hi there!",
+    "What inspired your greatest work?",
+    "How do you think the world has changed since your time?",
+    "What advice would you give someone starting out today?",
+    "Tell me about a failure that taught you something.",
+    "What do you think about artificial intelligence?",
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of `values` (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def post_json(url, payload, timeout=30, headers=None):
+    request = urllib.request.Request(
+        url, data=json.dumps(payload).encode(), headers={"Content-Type": "application/json", **(headers or {})},
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def get_json(url, timeout=60):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def read_rss_bytes(pid):
+    """Resident set size of `pid` from /proc (Linux) or psutil, if available."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss
+    except Exception:
+        return None
+
+
+class RssSampler(threading.Thread):
+    """Samples the server's RSS in the background, keeping the peak and last value."""
+
+    def __init__(self, pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self.last = None
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            rss = read_rss_bytes(self.pid)
+            if rss is not None:
+                self.last = rss
+                self.peak = max(self.peak or 0, rss)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.first_reply = []
+        self.turn_time = []
+        self.turns = 0
+        self.replies = 0
+        self.error_replies = 0
+        self.failed_requests = 0
+        self.rejected_requests = 0
+
+    def record_turn(self, first_reply, turn_time, replies, error_replies):
+        with self.lock:
+            self.turns += 1
+            self.replies += replies
+            self.error_replies += error_replies
+            self.turn_time.append(turn_time)
+            if first_reply is not None:
+                self.first_reply.append(first_reply)
+
+    def record_failure(self):
+        with self.lock:
+            self.failed_requests += 1
+
+    def record_rejection(self):
+        with self.lock:
+            self.rejected_requests += 1
+
+
+def run_turn(base_url, endpoint, payload, cursor, poll_wait, turn_timeout, client_id=None):
+    """Send one user message and follow its replies after `cursor` until the turn loop finishes."""
+    started = time.monotonic()
+    reply = post_json(f"{base_url}/{endpoint}", payload, headers={"X-Client-Id": client_id} if client_id else None)
+    conversation_id = reply["conversation_id"]
+    first_reply = None
+    replies = error_replies = 0
+    while time.monotonic() - started < turn_timeout:
+        data = get_json(f"{base_url}/get_responses/{conversation_id}?after={cursor}&wait={poll_wait}")
+        if data["responses"] and first_reply is None:
+            first_reply = time.monotonic() - started
+        replies += len(data["responses"])
+        error_replies += sum(1 for r in data["responses"] if r.get("content", "").startswith("[Error"))
+        cursor = data["cursor"]
+        if not data["generating"] and not data["responses"]:
+            break
+    return conversation_id, cursor, first_reply, time.monotonic() - started, replies, error_replies
+
+
+def simulate_user(base_url, user_index, args, results):
+    rng = random.Random(args.seed + user_index)
+    multi_agent = args.mode == "multi" or (args.mode == "mixed" and rng.random() < args.multi_fraction)
+    payload = {"message": rng.choice(USER_MESSAGES)}
+    if multi_agent:
+        payload["multi_agent"] = True
+    else:
+        payload["agent_id"] = args.agent or rng.choice(AGENT_IDS)
+
+    conversation_id, cursor = None, 0
+    for turn in range(args.turns):
+        try:
+            if turn == 0:
+                body, endpoint = dict(payload), "start_conversation"
+            else:
+                body = {"conversation_id": conversation_id, "message": rng.choice(USER_MESSAGES)}
+                endpoint = "continue_conversation"
+            conversation_id, cursor, first_reply, turn_time, replies, error_replies = run_turn(
+                base_url, endpoint, body, cursor, args.poll_wait, args.turn_timeout, f"user-{user_index}"
+            )
+            results.record_turn(first_reply, turn_time, replies, error_replies)
+        except urllib.error.HTTPError as e:
+            # 429/503 from admission control: the server turned the message away
+            if e.code in (429, 503):
+                results.record_rejection()
+            else:
+                results.record_failure()
+            if conversation_id is None:
+                return
+        except (urllib.error.URLError, OSError, KeyError, ValueError):
+            results.record_failure()
+            if conversation_id is None:
+                return
+        if args.think_time:
+            time.sleep(rng.uniform(0, args.think_time))
+
+
+def start_server(port, extra_env):
+    """Start app.py with the fake backend in a scratch directory; returns the process."""
+    workdir = tempfile.mkdtemp(prefix="time-machine-bench-")
+    env = {
+        **os.environ,
+        "LLM_BACKEND": "fake",
+        "LLM_WARM_CONNECTIONS": "0",
+        # Each simulated user sends its own X-Client-Id, so the per-client rate applies per user
+        "ADMISSION_CLIENT_HEADER": "X-Client-Id",
+        "CONVERSATION_DB_PATH": os.path.join(workdir, "conversations.db"),
+        "PYTHONPATH": REPO_ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""),
+        **extra_env,
+    }
+    code = f"import app; app.app.run(port={port}, threaded=True)"
+    process = subprocess.Popen(
+        [sys.executable, "-c", code], cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            get_json(f"http://127.0.0.1:{port}/stats/scheduler", timeout=1)
+            return process
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start within 30s")
+
+
+def format_seconds(value):
+    return "-" if value is None else f"{value * 1000:.0f}ms"
+
+
+def summarize(results, elapsed, sampler):
+    report = {
+        "turns": results.turns,
+        "replies": results.replies,
+        "error_replies": results.error_replies,
+        "failed_requests": results.failed_requests,
+        "rejected_requests": results.rejected_requests,
+        "elapsed_seconds": round(elapsed, 3),
+        "turns_per_second": round(results.turns / elapsed, 3) if elapsed else 0.0,
+        "replies_per_second": round(results.replies / elapsed, 3) if elapsed else 0.0,
+        "server_rss_peak_bytes": sampler.peak if sampler else None,
+        "server_rss_final_bytes": sampler.last if sampler else None,
+    }
+    for name, values in (("time_to_first_reply", results.first_reply), ("turn_time", results.turn_time)):
+        for pct in (50, 95, 99):
+            report[f"{name}_p{pct}"] = percentile(values, pct)
+    return report
+
+
+def print_report(report):
+    print(f"turns: {report['turns']}  replies: {report['replies']}  "
+          f"error replies: {report['error_replies']}  failed requests: {report['failed_requests']}  "
+          f"rejected: {report['rejected_requests']}")
+    print(f"throughput: {report['turns_per_second']:.2f} turns/s, {report['replies_per_second']:.2f} replies/s "
+          f"over {report['elapsed_seconds']:.1f}s")
+    for name, label in (("time_to_first_reply", "time to first reply"), ("turn_time", "turn completion")):
+        print(f"{label}: p50 {format_seconds(report[f'{name}_p50'])}  "
+              f"p95 {format_seconds(report[f'{name}_p95'])}  p99 {format_seconds(report[f'{name}_p99'])}")
+    if report["server_rss_peak_bytes"]:
+        print(f"server RSS: peak {report['server_rss_peak_bytes'] / 2**20:.1f} MiB, "
+              f"final {report['server_rss_final_bytes'] / 2**20:.1f} MiB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of a running server (default: start one with the fake backend)")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the self-started server")
+    parser.add_argument("--server-pid", type=int, help="PID of the --url server, to sample its RSS")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=3, help="User messages per simulated user")
+    parser.add_argument("--mode", choices=["single", "multi", "mixed"], default="mixed")
+    parser.add_argument("--multi-fraction", type=float, default=0.3, help="Share of group chats in mixed mode")
+    parser.add_argument("--agent", help="Agent id for single-agent chats (default: random)")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Max pause between a user's turns (s)")
+    parser.add_argument("--poll-wait", type=float, default=10.0, help="Long-poll wait per /get_responses call (s)")
+    parser.add_argument("--turn-timeout", type=float, default=120.0, help="Give up on a turn after this long (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--server-env", action="append", default=[], metavar="NAME=VALUE",
+                        help="Extra environment for the self-started server, e.g. FAKE_LLM_LATENCY_MS=300")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    process = None
+    if args.url:
+        base_url = args.url.rstrip("/")
+        server_pid = args.server_pid
+    else:
+        extra_env = dict(item.split("=", 1) for item in args.server_env)
+        process = start_server(args.port, extra_env)
+        base_url = f"http://127.0.0.1:{args.port}"
+        server_pid = process.pid
+
+    sampler = None
+    if server_pid:
+        sampler = RssSampler(server_pid)
+        sampler.start()
+
+    results = Results()
+    try:
+        started = time.monotonic()
+        users = [
+            threading.Thread(target=simulate_user, args=(base_url, index, args, results), daemon=True)
+            for index in range(args.users)
+        ]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        elapsed = time.monotonic() - started
+    finally:
+        if sampler:
+            sampler.stop()
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    report = summarize(results, elapsed, sampler)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(report, output, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Microbenchmark and golden-corpus check for the reply sanitizer.
+
+Verifies that `ReplySanitizer.clean` and the streaming sanitizer (fed the reply
+in random chunks and one character at a time) give exactly the recorded output
+of the original label-by-label cleanup for every reply in
+benchmarks/data/sanitizer_golden.jsonl, then times the original function against the compiled one by kind of reply:
+
+    python benchmarks/sanitizer_bench.py
+    python benchmarks/sanitizer_bench.py --regenerate   # rebuild the corpus
+
+The corpus records the original function's output, so regenerating it is only
+needed when the persona list changes.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from core.personas import DEFAULT_PERSONAS_DIR, PersonaRegistry  # noqa: E402
+from core.sanitizer import ROLE_PREFIXES, USER_LABEL, ReplySanitizer, legacy_clean  # noqa: E402
+
+GOLDEN_PATH = os.path.join(REPO_ROOT, "benchmarks", "data", "sanitizer_golden.jsonl")
+
+# The names in the persona files, so the corpus and timings follow the personas the server loads
+PERSONA_NAMES = PersonaRegistry(DEFAULT_PERSONAS_DIR, reload_interval=0).current.names
+
+SENTENCES = [
+    "Time is relative, my friend",
+    "Honestly that's the best question I've heard all week",
+    "Machines will think one day, mark my words",
+    "Speak softly and carry a big stick",
+    "Alternating current is the future, obviously",
+    "I have not failed, I've just found ten thousand ways that won't work",
+    "Diamonds are a girl's best friend",
+    "Imagination is more important than knowledge",
+    "Ratio: 3:2, like a good photograph",
+    "As I always say, keep moving",
+    "I am not sure about that one",
+    "Meet me at 10:30 by the lab",
+    "Users: please stop asking",
+    "Einstein: wrong again, Tesla",
+    "Alan Turing would disagree",
+]
+
+
+def generate_corpus(count, seed=7):
+    """Realistic replies plus label, prefix and colon edge cases."""
+    rng = random.Random(seed)
+    labels = [USER_LABEL] + [f"{name}:" for name in PERSONA_NAMES]
+    replies = [
+        "", "Hi!", "User:", "User: hi", "hi User:", "Alan Turing:Alan Turing:",
+        "As", "As:", "As: ", "As I said: yes", "Speaking as a physicist: no",
+        "You: Me: hello", "Me: You: hello", "I am Einstein: hi", "I am so happy today",
+        "User: As I said: yes", "Alan Turing: As a mathematician: Me: it works",
+        "Nikola Tesla: Thomas Alva Edison: we agree?", "Alan Tu ring: almost a label",
+        "Albert Einstein : spaced label", "albert einstein: lower case",
+        "Marilyn Monroe:Marilyn Monroe: twice", "Thomas Alva Edison:", "::", "a:b:c",
+        # Removing a label joins the text around it into another label
+        "Alan User:Turing: spliced", "Alan Albert User:Einstein:Turing: twice spliced", "Albert EinUser:stein:",
+    ]
+    while len(replies) < count:
+        parts = []
+        if rng.random() < 0.3:
+            parts.append(rng.choice(labels + list(ROLE_PREFIXES)))
+        for _ in range(rng.randint(1, 4)):
+            sentence = rng.choice(SENTENCES)
+            if rng.random() < 0.25:
+                position = rng.randint(0, len(sentence))
+                sentence = sentence[:position] + " " + rng.choice(labels) + " " + sentence[position:]
+            parts.append(sentence + rng.choice([".", "!", "?", ""]))
+        replies.append(" ".join(parts).strip())
+    return replies
+
+
+def random_chunks(text, rng):
+    chunks = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 8)
+        chunks.append(text[position:position + size])
+        position += size
+    return chunks
+
+
+def stream_clean(sanitizer, reply, rng):
+    stream = sanitizer.stream()
+    return "".join(stream.feed(chunk) for chunk in random_chunks(reply, rng)) + stream.finish()
+
+
+def check(sanitizer, corpus):
+    """Compare both sanitizers with the recorded outputs; returns the mismatches."""
+    rng = random.Random(0)
+    mismatches = []
+    for entry in corpus:
+        reply, expected = entry["reply"], entry["expected"]
+        if sanitizer.clean(reply) != expected:
+            mismatches.append(("clean", reply))
+        if stream_clean(sanitizer, reply, rng) != expected:
+            mismatches.append(("stream", reply))
+        stream = sanitizer.stream()
+        if "".join(stream.feed(char) for char in reply) + stream.finish() != expected:
+            mismatches.append(("stream by character", reply))
+    return mismatches
+
+
+def time_groups(sanitizer, replies, names, number):
+    """Time both implementations on replies without colons, without labels and with labels."""
+    groups = {
+        "no colon": [reply for reply in replies if ":" not in reply],
+        "colon, no label": [reply for reply in replies if ":" in reply and sanitizer.clean(reply) == reply],
+        "labels/prefixes": [reply for reply in replies if sanitizer.clean(reply) != reply],
+        "all": replies,
+    }
+    print(f"{'replies':>16} {'count':>6} {'original us':>12} {'compiled us':>12} {'speedup':>8}")
+    for group, members in groups.items():
+        if not members:
+            continue
+        calls = len(members) * number
+        original = timeit.timeit(lambda: [legacy_clean(reply, names) for reply in members], number=number) / calls
+        compiled = timeit.timeit(lambda: [sanitizer.clean(reply) for reply in members], number=number) / calls
+        print(f"{group:>16} {len(members):>6} {original * 1e6:>12.2f} {compiled * 1e6:>12.2f} "
+              f"{original / compiled:>7.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--regenerate", action="store_true", help="Rebuild the golden corpus from the original function")
+    parser.add_argument("--size", type=int, default=400, help="Replies in a regenerated corpus")
+    parser.add_argument("--number", type=int, default=20, help="Timed passes over the corpus")
+    parser.add_argument("--extra-personas", type=int, default=60,
+                        help="Also time a roster with this many extra personas (0 to skip)")
+    args = parser.parse_args(argv)
+
+    if args.regenerate:
+        os.makedirs(os.path.dirname(GOLDEN_PATH), exist_ok=True)
+        with open(GOLDEN_PATH, "w") as golden:
+            for reply in generate_corpus(args.size):
+                golden.write(json.dumps({"reply": reply, "expected": legacy_clean(reply, PERSONA_NAMES)}) + "\n")
+        print(f"Wrote {args.size} replies to {GOLDEN_PATH}")
+
+    with open(GOLDEN_PATH) as golden:
+        corpus = [json.loads(line) for line in golden if line.strip()]
+    sanitizer = ReplySanitizer(PERSONA_NAMES)
+
+    mismatches = check(sanitizer, corpus)
+    for kind, reply in mismatches[:10]:
+        print(f"MISMATCH ({kind}): {reply!r}")
+    print(f"{len(corpus)} golden replies, {len(mismatches)} mismatches")
+
+    replies = [entry["reply"] for entry in corpus]
+    print(f"\n{len(PERSONA_NAMES)} personas:")
+    time_groups(sanitizer, replies, PERSONA_NAMES, args.number)
+    if args.extra_personas:
+        # How each approach scales with the size of the roster
+        names = PERSONA_NAMES + [f"Guest Persona {index}" for index in range(args.extra_personas)]
+        print(f"\n{len(names)} personas:")
+        time_groups(ReplySanitizer(names), replies, names, args.number)
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
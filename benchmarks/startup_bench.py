@@ -0,0 +1,107 @@
+"""
+Cold-start and fork-time benchmark for the chat server.
+
+Measures, in fresh interpreter processes:
+
+* import: `import app` (objects only; no threads, connections or files)
+* create_app: starting the process's services (logging, personas, database, sweeper)
+* first request: serving GET /personas right after create_app
+* fork: time from os.fork() in a started parent until the child has served its
+  first request, i.e. a preforked worker becoming ready
+
+    python benchmarks/startup_bench.py --runs 5 --forks 8
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r"""
+import json, os, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app()
+created = time.perf_counter()
+client = app.app.test_client()
+assert client.get("/personas").status_code == 200
+served = time.perf_counter()
+result = {
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "fork_ms": [],
+}
+for _ in range(int(sys.argv[1])):
+    read_end, write_end = os.pipe()
+    forked = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        child = app.app.test_client()
+        child.get("/personas")
+        os.write(write_end, str((time.perf_counter() - forked) * 1000).encode())
+        os._exit(0)
+    os.close(write_end)
+    with os.fdopen(read_end) as pipe:
+        result["fork_ms"].append(float(pipe.read()))
+    os.waitpid(pid, 0)
+print(json.dumps(result))
+"""
+
+
+def run_probe(forks, workdir):
+    env = dict(
+        os.environ,
+        PYTHONPATH=REPO_ROOT,
+        LLM_BACKEND="fake",
+        LOG_FILE="",
+        LOG_LEVEL="WARNING",
+        CONVERSATION_DB_PATH=os.path.join(workdir, "startup.db"),
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE, str(forks)], cwd=workdir, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(values):
+    return {"median": round(statistics.median(values), 2), "min": round(min(values), 2), "max": round(max(values), 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreter processes to measure")
+    parser.add_argument("--forks", type=int, default=4, help="Workers forked from each started process")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for _ in range(args.runs):
+            results.append(run_probe(args.forks, workdir))
+
+    summary = {
+        name: summarize([result[name] for result in results])
+        for name in ("import_ms", "create_app_ms", "first_request_ms")
+    }
+    forks = [value for result in results for value in result["fork_ms"]]
+    if forks:
+        summary["fork_ms"] = summarize(forks)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return 0
+    print(f"{'phase':>17} {'median ms':>10} {'min ms':>8} {'max ms':>8}")
+    for name, values in summary.items():
+        print(f"{name[:-3]:>17} {values['median']:>10.2f} {values['min']:>8.2f} {values['max']:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Shared backend infrastructure for the T.I.M.E Machine chat server."""
@@ -0,0 +1,156 @@
+"""Admission control for new turns: a per-client request rate and a bounded turn queue."""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from core.scheduler import TokenBucket
+
+
+class AdmissionRejected(Exception):
+    """
+    A user message turned away before any work was done for it.
+
+    Args:
+        status: HTTP status to answer with (429 for a client over its rate, 503
+            when the server's turn queue is full).
+        reason: "client_rate" or "queue_full".
+        retry_after: Whole seconds the client should wait before retrying.
+        queue_position: Position the turn would have had in the queue (queue_full only).
+    """
+
+    def __init__(self, status, reason, retry_after, queue_position=None):
+        super().__init__(f"Request rejected ({reason}); retry after {retry_after}s")
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+        self.queue_position = queue_position
+
+
+class AdmissionTicket:
+    """
+    One admitted turn loop's reservation. `queue_position` is 0 when the loop can
+    start right away, otherwise the number of loops it waits behind. The turn
+    loop calls `start()` once it gets a slot and `release()` when it ends.
+    """
+
+    def __init__(self, controller, queue_position):
+        self.queue_position = queue_position
+        self._controller = controller
+        self._started_at = None
+        self._released = False
+
+    def start(self):
+        self._started_at = time.monotonic()
+
+    def release(self, ran=True):
+        """
+        Give the reservation back. `ran=False` for a message that didn't need a
+        turn loop of its own (it was handed to the conversation's running loop).
+        """
+        if not self._released:
+            self._released = True
+            self._controller._release(self, ran)
+
+
+class AdmissionController:
+    """
+    Decides, before a user message starts any work, whether the server takes it.
+
+    * Each client (an IP address or a configured header) has a token bucket of
+      `client_requests_per_minute` requests; a client over it gets a 429.
+    * At most `max_active_turns` turn loops generate at once (the engine enforces
+      this) and up to `max_queued_turns` more wait for a slot. A message that
+      would need a turn loop beyond that gets a 503.
+
+    Rejections carry a Retry-After estimate: for a full queue, the average time a
+    turn loop runs times the queue length over the number of turn slots. The
+    controller only counts reservations; turns wait for a slot in the engine.
+
+    Args:
+        max_active_turns: Turn loops generating at once (0 for no limit and no queue).
+        max_queued_turns: Admitted turn loops allowed to wait for a free slot.
+        client_requests_per_minute: Requests per client per minute (0 disables it).
+        max_clients: Client buckets kept; the least recently seen are dropped first.
+    """
+
+    def __init__(self, max_active_turns=64, max_queued_turns=256, client_requests_per_minute=60, max_clients=10000):
+        self.max_active_turns = max_active_turns
+        self.max_queued_turns = max_queued_turns
+        self.client_requests_per_minute = client_requests_per_minute
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()
+        self._pid = os.getpid()
+        self.pending = 0  # Admitted turn loops that haven't finished (running or queued)
+        self.admitted = 0
+        self.rejected = {"client_rate": 0, "queue_full": 0}
+        # Moving average of a turn loop's duration, for Retry-After estimates
+        self.turn_seconds_avg = 5.0
+
+    def admit(self, client=None):
+        """
+        Reserve capacity for one turn loop on behalf of `client` (None skips the
+        per-client rate). Returns an `AdmissionTicket`; raises `AdmissionRejected`.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent's reservations belong to the parent
+                self._pid = os.getpid()
+                self.pending = 0
+                self._clients.clear()
+            bucket = None
+            if client is not None and self.client_requests_per_minute > 0:
+                bucket = self._bucket(client)
+                delay = bucket.delay_for(1)
+                if delay > 0:
+                    self.rejected["client_rate"] += 1
+                    raise AdmissionRejected(429, "client_rate", max(1, math.ceil(delay)))
+            if self.max_active_turns > 0 and self.pending >= self.max_active_turns + self.max_queued_turns:
+                queue_position = self.pending - self.max_active_turns + 1
+                self.rejected["queue_full"] += 1
+                raise AdmissionRejected(503, "queue_full", self._retry_after(queue_position), queue_position)
+            # Only an admitted request uses up the client's rate, not one turned away with a 503
+            if bucket is not None:
+                bucket.take(1)
+            self.pending += 1
+            self.admitted += 1
+            queue_position = max(0, self.pending - self.max_active_turns) if self.max_active_turns > 0 else 0
+            return AdmissionTicket(self, queue_position)
+
+    def _bucket(self, client):
+        bucket = self._clients.get(client)
+        if bucket is None:
+            bucket = self._clients[client] = TokenBucket(self.client_requests_per_minute)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+        else:
+            self._clients.move_to_end(client)
+        return bucket
+
+    def _retry_after(self, queue_position):
+        return max(1, math.ceil(self.turn_seconds_avg * queue_position / self.max_active_turns))
+
+    def _release(self, ticket, ran):
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self.pending = max(0, self.pending - 1)
+            if ran and ticket._started_at is not None:
+                seconds = time.monotonic() - ticket._started_at
+                self.turn_seconds_avg += 0.1 * (seconds - self.turn_seconds_avg)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_active_turns": self.max_active_turns,
+                "max_queued_turns": self.max_queued_turns,
+                "client_requests_per_minute": self.client_requests_per_minute,
+                "pending_turns": self.pending,
+                "queued_turns": max(0, self.pending - self.max_active_turns) if self.max_active_turns > 0 else 0,
+                "admitted": self.admitted,
+                "rejected": dict(self.rejected),
+                "tracked_clients": len(self._clients),
+                "turn_seconds_avg": round(self.turn_seconds_avg, 3),
+            }
@@ -0,0 +1,50 @@
+"""Agent state shared by the chat server (app.py) and the command-line chat (Chat_main.py)."""
+import logging
+
+from core.prompts import split_sentences
+
+logger = logging.getLogger(__name__)
+
+
+class BaseAgent:
+    """
+    One persona taking part in a conversation: its system prompt, its odds of
+    speaking in a group round and the cleanup applied to its replies. The server
+    and the command-line chat subclass it with their own completion calls.
+
+    Args:
+        persona: The `Persona` this agent speaks as.
+        sanitizer: `ReplySanitizer` covering every persona's speaker labels.
+        system_prompt: Prompt to use instead of the persona's default prompt.
+    """
+
+    def __init__(self, persona, sanitizer, system_prompt=None):
+        self.persona = persona
+        self.name = persona.name
+        self.system_prompt = system_prompt or persona.prompt
+        self.sanitizer = sanitizer
+        # Initialize per-agent probabilities:
+        self.response_rate = 12 / 15
+        self.response_sort = 1
+
+    @property
+    def prompt_sentences(self):
+        """The system prompt split into sentences, precomputed for persona prompts."""
+        if self.system_prompt == self.persona.prompt:
+            return self.persona.prompt_sentences
+        if self.system_prompt == self.persona.group_prompt:
+            return self.persona.group_prompt_sentences
+        return tuple(split_sentences(self.system_prompt))
+
+    def validate_and_clean_response(self, reply):
+        """
+        Validate and clean agent responses to prevent impersonation: removes "User:"
+        and persona name labels and cuts leading role prefixes like "You:".
+        """
+        return self.sanitizer.clean(reply, self.warn_sanitized)
+
+    def warn_sanitized(self, kind, text):
+        if kind == "prefix":
+            logger.warning(f"Agent {self.name} attempted to use '{text}' prefix")
+        else:
+            logger.warning(f"Agent {self.name} attempted to include '{text}' in response")
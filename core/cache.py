@@ -0,0 +1,106 @@
+"""Bounded LRU + TTL cache for agent replies to short, common conversation openings."""
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s.!?,;:]+$")
+
+
+def normalize_text(text):
+    """Case-fold and collapse whitespace and trailing punctuation so trivial variants share a key."""
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", text.strip().lower()))
+
+
+class ResponseCache:
+    """
+    Least-recently-used cache of replies with a time-to-live per entry.
+
+    Each key keeps up to `max_variants` distinct replies. A lookup only serves a
+    cached reply with probability `serve_probability`; otherwise it reports a miss
+    so the caller generates (and stores) a fresh variant, which keeps common
+    openers from always getting the same answer.
+    """
+
+    def __init__(self, max_entries=1024, ttl_seconds=600, serve_probability=0.7, max_variants=3):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.serve_probability = serve_probability
+        self.max_variants = max_variants
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(agent_name, model, temperature, max_tokens, messages):
+        """Build a cache key from the agent, generation settings and the (normalized) messages."""
+        return (
+            agent_name,
+            model,
+            temperature,
+            max_tokens,
+            tuple((message["role"], message.get("name"), normalize_text(message["content"])) for message in messages)
+        )
+
+    def get(self, key):
+        """Return a cached reply for `key`, or None on a miss."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry["created"] > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            # Sometimes generate anyway so the same opener gets varied replies
+            if len(entry["variants"]) < self.max_variants and random.random() >= self.serve_probability:
+                self.skipped += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return random.choice(entry["variants"])
+
+    def put(self, key, reply):
+        """Store a reply variant for `key`, evicting the least recently used entries if full."""
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = {"created": time.monotonic(), "variants": []}
+                self._entries[key] = entry
+            if reply not in entry["variants"]:
+                entry["variants"].append(reply)
+                del entry["variants"][:-self.max_variants]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses + self.skipped
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
@@ -0,0 +1,246 @@
+"""Token-budgeted conversation context with a rolling summary of older turns."""
+import logging
+import re
+import threading
+from bisect import bisect_left
+from collections.abc import Sequence
+from itertools import islice
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a character-based estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Rough per-message framing overhead used by chat completion APIs
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken when available, otherwise estimate ~4 characters per token."""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        return len(_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def chat_name(speaker):
+    """A speaker's name in the form the chat API's `name` field accepts ("Alan Turing" -> "Alan_Turing")."""
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", speaker).strip("_")[:64]
+
+
+def message_speaker(message):
+    """The speaker recorded on a history message by `ContextWindow.append`, or None."""
+    name = message.get("name")
+    return name.replace("_", " ") if name else None
+
+
+def message_tokens(message):
+    """Token count of a chat message including its framing overhead."""
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+class MessageView(Sequence):
+    """
+    Read-only messages for one completion: a short `prefix` list, then
+    `history[start:end]`, then an optional `trailer` message.
+
+    The history list is only ever appended to, so the view stays valid while the
+    conversation grows, and building one copies nothing. `tokens` is the
+    messages' token count, known up front from the window's running total.
+    """
+
+    __slots__ = ("_prefix", "_history", "_start", "_end", "_trailer", "tokens")
+
+    def __init__(self, prefix, history, start, end, tokens, trailer=None):
+        self._prefix = prefix
+        self._history = history
+        self._start = start
+        self._end = end
+        self._trailer = trailer
+        self.tokens = tokens
+
+    def __len__(self):
+        return len(self._prefix) + self._end - self._start + (self._trailer is not None)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("message index out of range")
+        if index < len(self._prefix):
+            return self._prefix[index]
+        index += self._start - len(self._prefix)
+        return self._history[index] if index < self._end else self._trailer
+
+    def __iter__(self):
+        yield from self._prefix
+        yield from islice(self._history, self._start, self._end)
+        if self._trailer is not None:
+            yield self._trailer
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def with_trailer(self, message):
+        """The same messages followed by `message` (e.g. an agent's turn instruction)."""
+        tokens = self.tokens + message_tokens(message)
+        return MessageView(self._prefix, self._history, self._start, self._end, tokens, message)
+
+
+class ContextWindow:
+    """
+    Conversation history that keeps prompts within a token budget.
+
+    Pinned messages (the conversation's system and global-context messages) are
+    always sent. Token counts are computed once, when a message is appended, and
+    kept as a running total, and `window()` returns a view of the one history list
+    that every agent shares, so a completion costs the same however long the
+    conversation has run. When
+    the history no longer fits the budget, the last `keep_turns` turns (a turn
+    starts at each user message) are kept verbatim and everything older is folded
+    into a rolling summary by `summarize()`, which is meant to run in the background.
+    """
+
+    def __init__(self, pinned, token_budget=3000, keep_turns=4):
+        self.pinned = list(pinned)
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.messages = []
+        self.summary = ""
+        # Rough memory footprint of the stored message text
+        self.approx_bytes = sum(len(message["content"]) for message in self.pinned)
+        # _cumulative[i] is the token count of messages[:i]
+        self._cumulative = [0]
+        self._prefix = list(self.pinned)
+        self._pinned_tokens = sum(message_tokens(message) for message in self.pinned)
+        self._summary_tokens = 0
+        # Messages before this index are represented by the summary
+        self._summarized_upto = 0
+        self._summarizing = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def append(self, message, speaker=None):
+        """
+        Append a message to the history, caching its token count.
+
+        `speaker` (the user or an agent's name) is recorded as the message's chat
+        `name`, so in a group chat every agent sees who wrote each line while all
+        of them still share the same history prefix.
+        """
+        if speaker:
+            message = {**message, "name": chat_name(speaker)}
+        tokens = message_tokens(message)
+        with self._lock:
+            self.messages.append(message)
+            self._cumulative.append(self._cumulative[-1] + tokens)
+            self.approx_bytes += len(message["content"])
+
+    @property
+    def summarized_upto(self):
+        """How many history messages the rolling summary covers."""
+        return self._summarized_upto
+
+    def restore_summary(self, summary, summarized_upto):
+        """
+        Continue from a summary of the first `summarized_upto` history messages,
+        stored when an earlier copy of this conversation ran `summarize()`.
+        """
+        with self._lock:
+            if not summary or not self._summarized_upto < summarized_upto <= len(self.messages):
+                return
+            self.summary = summary
+            self._summary_tokens = message_tokens(self._summary_message())
+            self._prefix = self.pinned + [self._summary_message()]
+            self._summarized_upto = summarized_upto
+
+    def _recent_start(self, turns=None):
+        """Index where the last `turns` turns (default `keep_turns`) begin."""
+        turns = turns or self.keep_turns
+        seen = 0
+        for index in range(len(self.messages) - 1, self._summarized_upto - 1, -1):
+            if self.messages[index]["role"] == "user":
+                seen += 1
+                if seen == turns:
+                    return index
+        return self._summarized_upto
+
+    def _summary_message(self):
+        return {"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"}
+
+    def _used_tokens(self, start):
+        """Tokens sent when the history from `start` on is included."""
+        return self._pinned_tokens + self._summary_tokens + self._cumulative[-1] - self._cumulative[start]
+
+    def window(self):
+        """
+        Return the messages to send for the next completion: pinned messages, the
+        rolling summary (if any) and as much recent history as the budget allows,
+        as a `MessageView` of the shared history.
+        """
+        with self._lock:
+            start = self._summarized_upto
+            if self._used_tokens(start) > self.token_budget:
+                start = self._recent_start()
+                # Very long turns: drop older messages but always keep the latest turn
+                last_turn = self._recent_start(turns=1)
+                if start < last_turn and self._used_tokens(start) > self.token_budget:
+                    excess = self._used_tokens(0) - self.token_budget
+                    start = bisect_left(self._cumulative, excess, start, last_turn)
+            return MessageView(self._prefix, self.messages, start, len(self.messages), self._used_tokens(start))
+
+    def prompt_tokens(self):
+        """Token count of the current window (excluding per-agent system prompts)."""
+        with self._lock:
+            return self._used_tokens(self._summarized_upto)
+
+    def needs_summary(self):
+        """True when there are over-budget turns that haven't been folded into the summary."""
+        with self._lock:
+            if self._summarizing:
+                return False
+            used = self._used_tokens(self._summarized_upto)
+            return used > self.token_budget and self._recent_start() > self._summarized_upto
+
+    async def summarize(self, summarizer):
+        """
+        Fold turns older than the last `keep_turns` into the rolling summary.
+        Returns True if the summary changed.
+
+        Args:
+            summarizer: Coroutine function `(previous_summary, messages) -> str`
+        """
+        with self._lock:
+            if self._summarizing:
+                return False
+            self._summarizing = True
+            start, end = self._summarized_upto, self._recent_start()
+            to_fold = self.messages[start:end]
+            previous = self.summary
+        try:
+            if not to_fold:
+                return False
+            summary = await summarizer(previous, to_fold)
+            with self._lock:
+                self.summary = summary
+                self._summary_tokens = message_tokens(self._summary_message())
+                self._prefix = self.pinned + [self._summary_message()]
+                self._summarized_upto = end
+            logger.info(f"Folded {len(to_fold)} messages into the conversation summary")
+            return True
+        except Exception as e:
+            logger.error(f"Error summarizing conversation history: {str(e)}")
+            return False
+        finally:
+            with self._lock:
+                self._summarizing = False
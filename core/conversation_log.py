@@ -0,0 +1,95 @@
+"""Append-only conversation log with cached, incrementally built per-agent views."""
+
+USER_SPEAKER = "User"
+
+
+class ConversationLog:
+    """
+    Every message of a conversation in order, with who said it.
+
+    Entries are never changed once appended, so each agent's `AgentView` only has
+    to render the entries added since it was last used: a turn costs
+    O(new messages) instead of rebuilding the prompt from the whole history.
+
+    Args:
+        system_messages: Conversation-wide system messages (rules, context) that
+            start every view.
+    """
+
+    def __init__(self, system_messages=()):
+        self.entries = []
+        self._views = {}
+        for content in system_messages:
+            self.append("system", content)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def append(self, role, content, speaker=None):
+        """Record a message; user messages default to the "User" speaker."""
+        if role == "user" and speaker is None:
+            speaker = USER_SPEAKER
+        entry = {"role": role, "content": content, "speaker": speaker}
+        self.entries.append(entry)
+        return entry
+
+    def add_user_message(self, content):
+        return self.append("user", content, USER_SPEAKER)
+
+    def add_reply(self, speaker, content):
+        return self.append("assistant", content, speaker)
+
+    def view(self, name, system_prompt=None):
+        """
+        The cached view of the conversation as `name` sees it (created on first
+        use). `name=None` gives an observer's view in which every agent's line is
+        attributed, e.g. for a director writing several agents' replies.
+        """
+        view = self._views.get(name)
+        if view is None:
+            view = self._views[name] = AgentView(self, name, system_prompt)
+        return view
+
+    def transcript(self):
+        """The user and agent messages as "<speaker>: <content>" display lines."""
+        return [f"{entry['speaker']}: {entry['content']}" for entry in self.entries if entry["role"] != "system"]
+
+
+class AgentView:
+    """
+    The chat messages one agent is prompted with, extended in place as the log grows.
+
+    The agent's own lines are its "assistant" messages; the user's and the other
+    agents' lines are "user" messages labelled with their speaker ("User: ...",
+    "Alan Turing: ..."), so each agent can tell who said what without the
+    message `name` field.
+
+    Args:
+        log: The `ConversationLog` this view follows.
+        name: The agent whose view this is (None for an observer).
+        system_prompt: Optional system message placed before the conversation.
+    """
+
+    def __init__(self, log, name, system_prompt=None):
+        self.log = log
+        self.name = name
+        self.messages = [{"role": "system", "content": system_prompt}] if system_prompt else []
+        self._seen = 0
+
+    def render(self, entry):
+        if entry["role"] == "system":
+            return {"role": "system", "content": entry["content"]}
+        if self.name is not None and entry["speaker"] == self.name:
+            return {"role": "assistant", "content": entry["content"]}
+        return {"role": "user", "content": f"{entry['speaker']}: {entry['content']}"}
+
+    def refresh(self):
+        """
+        Render the entries appended since the last call and return the messages.
+        The list is the view's own cache: callers may send it but must not modify it.
+        """
+        entries = self.log.entries
+        if self._seen < len(entries):
+            self.messages.extend(self.render(entry) for entry in entries[self._seen:])
+            self._seen = len(entries)
+        return self.messages
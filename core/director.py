@@ -0,0 +1,138 @@
+"""
+"Director" turn engine: one structured completion writes a whole group-chat burst.
+
+Instead of one completion per speaking turn (each resending the growing history),
+the speaking order is drawn up front with the usual response_rate/response_sort
+rules and a single JSON-mode completion writes every line of the burst.
+"""
+import json
+import random
+
+RESPONSE_THRESHOLD = 0.18
+RESPONSE_DECAY = 10 / 15
+
+
+def plan_burst(agents, threshold=RESPONSE_THRESHOLD, decay=RESPONSE_DECAY, draw=None):
+    """
+    Draw the speaking order for one user message without calling the model.
+
+    Follows the multi-agent loop exactly: response rates are reset to 12/15, each
+    round visits agents by `response_sort`, an agent speaks with probability
+    `response_rate` (resetting its sort priority, otherwise raising it) and every
+    rate decays until all fall below `threshold`. Returns the speakers in order.
+    """
+    draw = draw or random.random
+    for agent in agents:
+        agent.response_rate = 12 / 15
+    speakers = []
+    while max(agent.response_rate for agent in agents) >= threshold:
+        for agent in sorted(agents, key=lambda a: a.response_sort):
+            if draw() < agent.response_rate:
+                speakers.append(agent)
+                agent.response_sort = 1
+            else:
+                agent.response_sort += 1
+            agent.response_rate *= decay
+    return speakers
+
+
+def persona_block(agents):
+    """System message describing every participant, for prompts without a group header."""
+    return {
+        "role": "system",
+        "content": "\n\n".join(f"Persona of {agent.name}: {agent.system_prompt}" for agent in agents)
+    }
+
+
+def director_instruction(speakers):
+    """Trailing system message asking for the planned lines as JSON."""
+    order = "\n".join(f"{index}. {agent.name}" for index, agent in enumerate(speakers, 1))
+    return {
+        "role": "system",
+        "content": (
+            "Write the next messages of this group chat, one per line below, in exactly this order:\n"
+            f"{order}\n"
+            "Each message is written by that participant only, in their own voice and persona, reacting "
+            "to the conversation and to the messages before it. Keep each one short like a text message "
+            "and never include speaker names or labels in the text.\n"
+            'Answer with JSON only: {"lines": [{"speaker": "<name>", "text": "<message>"}, ...]}'
+        )
+    }
+
+
+def director_response_format(speakers):
+    """Structured-output schema restricting speakers to the planned participants."""
+    names = list(dict.fromkeys(agent.name for agent in speakers))
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "group_chat_burst",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "lines": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "speaker": {"type": "string", "enum": names},
+                                "text": {"type": "string"}
+                            },
+                            "required": ["speaker", "text"],
+                            "additionalProperties": False
+                        }
+                    }
+                },
+                "required": ["lines"],
+                "additionalProperties": False
+            }
+        }
+    }
+
+
+class DirectorLineParser:
+    """
+    Incrementally extracts {speaker, text} objects from a streamed
+    `{"lines": [...]}` reply, so each line can be published as soon as its
+    closing brace arrives.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._position = None  # Index just inside the "lines" array once found
+        self._decoder = json.JSONDecoder()
+        self.done = False
+
+    def feed(self, text):
+        """Add streamed text; returns the lines completed by it."""
+        self._buffer += text
+        lines = []
+        if self._position is None:
+            key = self._buffer.find('"lines"')
+            start = self._buffer.find("[", key) if key != -1 else -1
+            if start == -1:
+                return lines
+            self._position = start + 1
+        while not self.done:
+            position = self._position
+            while position < len(self._buffer) and self._buffer[position] in " \t\r\n,":
+                position += 1
+            if position >= len(self._buffer):
+                break
+            if self._buffer[position] == "]":
+                self.done = True
+                break
+            try:
+                line, end = self._decoder.raw_decode(self._buffer, position)
+            except json.JSONDecodeError:
+                break  # Incomplete object; wait for more text
+            self._position = end
+            if isinstance(line, dict) and isinstance(line.get("speaker"), str) and isinstance(line.get("text"), str):
+                lines.append(line)
+        return lines
+
+
+def parse_director_reply(reply):
+    """All {speaker, text} lines of a complete director reply."""
+    return DirectorLineParser().feed(reply)
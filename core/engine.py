@@ -0,0 +1,97 @@
+"""Single event loop that runs every conversation's turn loop as a coroutine."""
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationEngine:
+    """
+    Runs turn loops as coroutines on one background event loop.
+
+    Instead of one OS thread per user message, every turn loop is scheduled on a
+    shared loop living in a single daemon thread. LLM calls made from those
+    coroutines should hold `llm_slot()` so the number of in-flight requests never
+    exceeds `max_inflight_calls`. At most `max_active_turns` turn loops run at
+    once (0 for no limit); later ones wait, in order, for a running one to end.
+    """
+
+    def __init__(self, max_inflight_calls=32, max_active_turns=0):
+        self.max_inflight_calls = max_inflight_calls
+        self.max_active_turns = max_active_turns
+        self.active_turns = 0
+        self.queued_turns = 0
+        self._loop = None
+        self._thread = None
+        self._llm_slots = None
+        self._turn_slots = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self):
+        """The engine's event loop, started on first use."""
+        self.start()
+        return self._loop
+
+    def start(self):
+        """Start the event loop thread if it isn't running yet."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            self._llm_slots = asyncio.Semaphore(self.max_inflight_calls)
+            if self.max_active_turns > 0:
+                self._turn_slots = asyncio.Semaphore(self.max_active_turns)
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(self._loop)
+                self._loop.call_soon(ready.set)
+                self._loop.run_forever()
+
+            self._thread = threading.Thread(target=run, name="generation-engine", daemon=True)
+            self._thread.start()
+            ready.wait()
+            logger.info(f"Generation engine started (max in-flight LLM calls: {self.max_inflight_calls})")
+
+    def submit(self, coro):
+        """
+        Schedule a turn-loop coroutine on the engine from any thread.
+        Returns a concurrent.futures.Future for its result.
+        """
+        return asyncio.run_coroutine_threadsafe(self._run_turn(coro), self.loop)
+
+    def run_background(self, coro):
+        """Schedule a background coroutine that isn't counted as a turn loop."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def llm_slot(self):
+        """Async context manager that bounds the number of concurrent LLM calls."""
+        self.start()
+        return self._llm_slots
+
+    async def _run_turn(self, coro):
+        if self._turn_slots is not None:
+            self.queued_turns += 1
+            try:
+                await self._turn_slots.acquire()
+            except BaseException:
+                coro.close()
+                raise
+            finally:
+                self.queued_turns -= 1
+        self.active_turns += 1
+        try:
+            return await coro
+        finally:
+            self.active_turns -= 1
+            if self._turn_slots is not None:
+                self._turn_slots.release()
+
+    def stop(self):
+        """Stop the event loop. Pending turn loops are abandoned."""
+        with self._lock:
+            if self._loop is not None and self._loop.is_running():
+                self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread = None
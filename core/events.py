@@ -0,0 +1,65 @@
+"""Sequence-numbered event logs used to push conversation updates to clients."""
+import threading
+from collections import deque
+
+
+class EventLog:
+    """
+    Bounded, append-only log of events with monotonically increasing sequence numbers.
+
+    Writers append from the generation thread; readers keep a cursor (the last
+    sequence number they have seen) and block on the log's condition variable
+    until something newer arrives. A log rebuilt for a conversation that was
+    evicted starts after `start_seq`, so cursors keep increasing; `close()`
+    wakes readers of the old log so they can move to the new one.
+    """
+
+    def __init__(self, maxlen=1000, start_seq=0):
+        self._events = deque(maxlen=maxlen)
+        self._next_seq = start_seq + 1
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        with self.condition:
+            return len(self._events)
+
+    @property
+    def last_seq(self):
+        """Sequence number of the newest event, or 0 if nothing was appended yet."""
+        with self.condition:
+            return self._next_seq - 1
+
+    def append(self, event_type, data):
+        """Append an event and wake up every waiting reader. Returns its sequence number."""
+        with self.condition:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._events.append({"seq": seq, "event": event_type, "data": data})
+            self.condition.notify_all()
+            return seq
+
+    def advance(self, seq):
+        """Make sure the next event is numbered after `seq`."""
+        with self.condition:
+            self._next_seq = max(self._next_seq, seq + 1)
+
+    def close(self):
+        """Mark the log as replaced and wake every waiting reader."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def read_after(self, seq):
+        """Return all retained events newer than `seq`, oldest first."""
+        with self.condition:
+            return [event for event in self._events if event["seq"] > seq]
+
+    def wait_after(self, seq, timeout=None):
+        """
+        Block until an event newer than `seq` exists, the log is closed or
+        `timeout` seconds pass. Returns the newer events (an empty list on timeout).
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self._next_seq - 1 > seq or self.closed, timeout=timeout)
+            return [event for event in self._events if event["seq"] > seq]
@@ -0,0 +1,169 @@
+"""Hedged LLM calls: a duplicate request once the first is slower than usual; the first to answer wins."""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from core.routing import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+
+class Hedger:
+    """
+    Runs a call and, if it hasn't produced anything after the `percentile` of
+    recently observed latency, starts a second identical call. Whichever shows
+    a result first wins and the other is cancelled. For streamed calls the
+    result is the first token; otherwise it is the completed reply. A failed
+    attempt leaves the other one running, so a hedge also covers an error.
+
+    Hedges are paid for from a global budget: every call earns `budget_ratio`
+    credits (up to `max_credits`) and a hedge spends one, so hedging adds at
+    most about `budget_ratio` extra requests per call however slow the upstream
+    gets.
+
+    Args:
+        percentile: Latency percentile (per key) after which a hedge is sent.
+        budget_ratio: Hedges allowed per call on average (e.g. 0.05 = 5%).
+        max_credits: Most hedges that can be saved up for a burst of slow calls.
+        min_samples: Latencies a key needs before it is hedged.
+        min_delay: Never hedge sooner than this many seconds.
+        enabled: False runs every call once (latencies are still observed).
+        can_hedge: Callable returning False when a duplicate would only add load,
+            e.g. while calls are queued for rate-limit capacity.
+    """
+
+    def __init__(self, percentile=95, budget_ratio=0.05, max_credits=10, min_samples=20, min_delay=0.05,
+                 enabled=True, can_hedge=None):
+        self.percentile = percentile
+        self.budget_ratio = budget_ratio
+        self.max_credits = max_credits
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.enabled = enabled
+        self.can_hedge = can_hedge or (lambda: True)
+        self.credits = float(max_credits)
+        self._lock = threading.Lock()
+        self._latency = defaultdict(LatencyWindow)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_denied = 0
+
+    def delay_for(self, key):
+        """Seconds to wait before hedging a call for `key`, or None if it can't be hedged yet."""
+        with self._lock:
+            window = self._latency.get(key)
+            if window is None or len(window) < self.min_samples:
+                return None
+            return max(self.min_delay, window.percentile(self.percentile))
+
+    def observe(self, key, seconds):
+        with self._lock:
+            self._latency[key].add(seconds)
+
+    def _earn(self):
+        with self._lock:
+            self.calls += 1
+            self.credits = min(self.max_credits, self.credits + self.budget_ratio)
+
+    def _spend(self):
+        with self._lock:
+            if self.credits < 1:
+                self.budget_denied += 1
+                return False
+            self.credits -= 1
+            self.hedged += 1
+            return True
+
+    async def run(self, key, attempt):
+        """
+        Run `attempt(claim)`, hedging it if it is slow.
+
+        `attempt` is a coroutine function making one call. A streamed attempt
+        must call `claim()` before passing on each token and drop the token when
+        it returns False (another attempt already streams). Returns the winning
+        attempt's result.
+        """
+        self._earn()
+        delay = self.delay_for(key) if self.enabled else None
+        winner = None
+        first_result = asyncio.Event()
+        tasks = []
+        started = []
+
+        def claimer(index):
+            def claim():
+                nonlocal winner
+                if winner is None:
+                    winner = index
+                    self.observe(key, time.monotonic() - started[index])
+                    first_result.set()
+                    # The other attempt can't win any more; stop paying for it
+                    for other, task in enumerate(tasks):
+                        if other != index:
+                            task.cancel()
+                return winner == index
+            return claim
+
+        def launch():
+            index = len(tasks)
+            started.append(time.monotonic())
+            tasks.append(asyncio.ensure_future(attempt(claimer(index))))
+
+        launch()
+        try:
+            if delay is not None:
+                waiter = asyncio.ensure_future(first_result.wait())
+                try:
+                    await asyncio.wait([tasks[0], waiter], timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    waiter.cancel()
+                if not tasks[0].done() and winner is None and self.can_hedge() and self._spend():
+                    logger.debug(f"Hedging a call for {key} after {delay:.2f}s")
+                    launch()
+            return await self._first_result(tasks, claimer)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _first_result(self, tasks, claimer):
+        """The result of the claiming (or first successful) attempt; the rest are cancelled."""
+        pending = set(tasks)
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                index = tasks.index(task)
+                if task.cancelled():
+                    continue
+                if task.exception() is not None:
+                    error = error or task.exception()
+                    continue
+                if not claimer(index)():
+                    # Lost to an attempt that already streamed its first token
+                    continue
+                if index > 0:
+                    with self._lock:
+                        self.hedge_wins += 1
+                return task.result()
+        raise error
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "percentile": self.percentile,
+                "budget_ratio": self.budget_ratio,
+                "credits": round(self.credits, 2),
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "budget_denied": self.budget_denied,
+                "hedge_ratio": round(self.hedged / self.calls, 4) if self.calls else 0.0,
+                "delays": {
+                    str(key): window.percentile(self.percentile)
+                    for key, window in self._latency.items() if len(window) >= self.min_samples
+                },
+            }
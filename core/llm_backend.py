@@ -0,0 +1,261 @@
+"""Pluggable chat-completion backends: the real OpenAI API and a local fake for load tests."""
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import threading
+
+from core.llm_client import make_openai_client, warm_async_client
+from core.scheduler import estimate_prompt_tokens
+
+logger = logging.getLogger(__name__)
+
+
+def is_rate_limit_error(error):
+    """True for the API's 429 Too Many Requests error (openai.RateLimitError)."""
+    return getattr(error, "status_code", None) == 429
+
+
+class LLMBackend:
+    """
+    Interface the turn loop uses for completions.
+
+    `complete` returns `(reply, usage)`: the stripped reply text and the provider's
+    usage block (an object or a dict with prompt/completion token counts). When
+    `on_token` is given the reply is streamed and `on_token(text)` is called for
+    every content delta as it arrives. `response_format` requests structured
+    (JSON) output in the OpenAI format, and `stop` is a list of up to four
+    sequences that end the reply.
+    """
+
+    name = "base"
+
+    async def complete(self, model, messages, temperature, max_tokens, on_token=None, response_format=None,
+                       stop=None):
+        raise NotImplementedError
+
+    async def warm(self, connections):
+        """Prepare the backend before the first conversation arrives."""
+
+    def stats(self):
+        return {"backend": self.name}
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    Completions from the OpenAI API through an AsyncOpenAI client, which is
+    built by `client_factory` on first use unless one is passed in. A built
+    client is rebuilt in a forked process, so workers never share pooled
+    connections with their parent.
+    """
+
+    name = "openai"
+
+    def __init__(self, client=None, client_factory=None):
+        self._client = client
+        self._client_factory = client_factory
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        stale = self._client_factory is not None and self._pid != os.getpid()
+        if self._client is None or stale:
+            with self._lock:
+                if self._client is None or (self._client_factory is not None and self._pid != os.getpid()):
+                    self._client = self._client_factory()
+                    self._pid = os.getpid()
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    async def complete(self, model, messages, temperature, max_tokens, on_token=None, response_format=None,
+                       stop=None):
+        options = {"response_format": response_format} if response_format is not None else {}
+        if stop:
+            options["stop"] = stop
+        response = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=on_token is not None,
+            **options,
+            # Ask for a final usage chunk so cache hits are visible when streaming
+            extra_body={"stream_options": {"include_usage": True}} if on_token is not None else None,
+        )
+        if on_token is None:
+            return response.choices[0].message.content.strip(), response.usage
+        parts = []
+        usage = None
+        try:
+            async for chunk in response:
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    on_token(delta)
+        finally:
+            # A cancelled call (a hedge loser, a preempted turn) leaves the loop early;
+            # close the response so its pooled connection is released right away
+            await response.close()
+        return "".join(parts).strip(), usage
+
+    async def warm(self, connections):
+        await warm_async_client(self.client, connections)
+
+
+FAKE_WORDS = (
+    "indeed the idea of time is curious and every experiment teaches us something new "
+    "about light energy machines people and the questions we keep asking each other"
+).split()
+
+
+class FakeBackend(LLMBackend):
+    """
+    Local stand-in for the API with no network access or spend, for benchmarks.
+
+    Args:
+        latency_ms: Median time to the first token.
+        latency_jitter: Spread of the latency distribution (relative, 0 = none).
+        distribution: "fixed", "uniform", "lognormal" or "exponential".
+        tokens_per_second: Streaming rate after the first token (0 = instant).
+        reply_tokens: (min, max) reply length in tokens, also capped by max_tokens.
+        error_rate: Fraction of calls that fail with a connection error.
+        rate_limit_rate: Fraction of calls rejected with 429 Too Many Requests.
+        seed: Seed for reproducible runs.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency_ms=800, latency_jitter=0.5, distribution="lognormal",
+                 tokens_per_second=50, reply_tokens=(15, 60), error_rate=0.0,
+                 rate_limit_rate=0.0, seed=None):
+        self.latency_ms = latency_ms
+        self.latency_jitter = latency_jitter
+        self.distribution = distribution
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    def sample_latency(self):
+        """Seconds until the first token, drawn from the configured distribution."""
+        median = self.latency_ms / 1000.0
+        if self.distribution == "fixed" or self.latency_jitter <= 0:
+            return median
+        if self.distribution == "uniform":
+            return max(0.0, self._random.uniform(median * (1 - self.latency_jitter), median * (1 + self.latency_jitter)))
+        if self.distribution == "exponential":
+            return self._random.expovariate(1.0 / median) if median > 0 else 0.0
+        return median * math.exp(self._random.gauss(0.0, self.latency_jitter))
+
+    def _inject_failure(self):
+        roll = self._random.random()
+        if roll >= self.rate_limit_rate + self.error_rate:
+            return
+        # Real client exceptions, so retry and error handling see what the API raises
+        import httpx
+        import openai
+
+        request = httpx.Request("POST", "http://fake-llm.local/v1/chat/completions")
+        if roll < self.rate_limit_rate:
+            self.rate_limited += 1
+            response = httpx.Response(429, headers={"retry-after": "1"}, request=request)
+            raise openai.RateLimitError("Rate limit reached (injected)", response=response, body=None)
+        self.errors += 1
+        raise openai.APIConnectionError(message="Connection error (injected)", request=request)
+
+    def _sentence(self, max_tokens):
+        low, high = self.reply_tokens
+        length = max(1, min(self._random.randint(low, high), max_tokens))
+        words = [self._random.choice(FAKE_WORDS) for _ in range(length)]
+        return " ".join(words).capitalize() + "."
+
+    def _structured_reply(self, response_format, max_tokens):
+        """A JSON reply with one line per speaker allowed by a director schema."""
+        try:
+            item = response_format["json_schema"]["schema"]["properties"]["lines"]["items"]
+            speakers = item["properties"]["speaker"]["enum"]
+        except (KeyError, TypeError):
+            return json.dumps({"text": self._sentence(max_tokens)})
+        per_line = max(1, max_tokens // max(len(speakers), 1))
+        return json.dumps({"lines": [{"speaker": name, "text": self._sentence(per_line)} for name in speakers]})
+
+    async def complete(self, model, messages, temperature, max_tokens, on_token=None, response_format=None,
+                       stop=None):
+        self.calls += 1
+        await asyncio.sleep(self.sample_latency())
+        self._inject_failure()
+
+        if response_format is not None:
+            reply = self._structured_reply(response_format, max_tokens)
+            # Roughly four characters per token
+            pieces = [reply[index:index + 4] for index in range(0, len(reply), 4)]
+        else:
+            reply = self._sentence(max_tokens)
+            for sequence in stop or ():
+                if sequence in reply:
+                    reply = reply[:reply.index(sequence)].rstrip()
+            pieces = reply.split(" ")
+            pieces = [pieces[0]] + [f" {piece}" for piece in pieces[1:]]
+        delay = 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        if on_token is not None:
+            for index, piece in enumerate(pieces):
+                if index and delay:
+                    await asyncio.sleep(delay)
+                on_token(piece)
+        elif delay:
+            await asyncio.sleep(delay * (len(pieces) - 1))
+
+        prompt_tokens = estimate_prompt_tokens(messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(pieces),
+            "total_tokens": prompt_tokens + len(pieces),
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        return reply, usage
+
+    def stats(self):
+        return {
+            "backend": self.name,
+            "calls": self.calls,
+            "injected_errors": self.errors,
+            "injected_rate_limits": self.rate_limited,
+        }
+
+
+def backend_from_env(stats=None):
+    """
+    Build the backend selected by LLM_BACKEND ("openai" or "fake"); the fake is
+    configured through FAKE_LLM_* variables.
+    """
+    kind = os.getenv("LLM_BACKEND", "openai")
+    if kind == "fake":
+        seed = os.getenv("FAKE_LLM_SEED")
+        backend = FakeBackend(
+            latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "800")),
+            latency_jitter=float(os.getenv("FAKE_LLM_LATENCY_JITTER", "0.5")),
+            distribution=os.getenv("FAKE_LLM_LATENCY_DISTRIBUTION", "lognormal"),
+            tokens_per_second=float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50")),
+            reply_tokens=(int(os.getenv("FAKE_LLM_MIN_TOKENS", "15")), int(os.getenv("FAKE_LLM_MAX_TOKENS", "60"))),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0")),
+            rate_limit_rate=float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0")),
+            seed=int(seed) if seed else None,
+        )
+        logger.info(f"Using fake LLM backend ({backend.distribution}, median {backend.latency_ms:.0f}ms)")
+        return backend
+    if kind != "openai":
+        raise ValueError(f"Unknown LLM_BACKEND: {kind}")
+    return OpenAIBackend(client_factory=lambda: make_openai_client(async_client=True, stats=stats))
@@ -0,0 +1,149 @@
+"""Factory for OpenAI clients on a tuned, shared HTTP transport."""
+import asyncio
+import logging
+import os
+import threading
+
+try:
+    import h2  # noqa: F401  (HTTP/2 support for httpx is optional)
+except ImportError:
+    h2 = None
+
+logger = logging.getLogger(__name__)
+
+
+def transport_settings_from_env():
+    """Read the transport configuration from LLM_* environment variables."""
+    return {
+        "max_connections": int(os.getenv("LLM_POOL_SIZE", "100")),
+        "max_keepalive_connections": int(os.getenv("LLM_KEEPALIVE_CONNECTIONS", "20")),
+        "keepalive_expiry": float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+        "connect_timeout": float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+        "read_timeout": float(os.getenv("LLM_READ_TIMEOUT", "30")),
+        "write_timeout": float(os.getenv("LLM_WRITE_TIMEOUT", "10")),
+        "pool_timeout": float(os.getenv("LLM_POOL_TIMEOUT", "10")),
+        "http2": os.getenv("LLM_HTTP2", "0") == "1",
+        "max_retries": int(os.getenv("LLM_MAX_RETRIES", "2")),
+    }
+
+
+class ConnectionStats:
+    """
+    Counts requests and newly opened TCP connections through httpx's trace hook,
+    so connection reuse across LLM calls can be observed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.new_connections = 0
+
+    def _record(self, event_name):
+        if event_name == "connection.connect_tcp.started":
+            with self._lock:
+                self.new_connections += 1
+
+    def trace(self, event_name, info):
+        self._record(event_name)
+
+    async def atrace(self, event_name, info):
+        self._record(event_name)
+
+    def on_request(self, request):
+        request.extensions["trace"] = self.trace
+        with self._lock:
+            self.requests += 1
+
+    async def aon_request(self, request):
+        request.extensions["trace"] = self.atrace
+        with self._lock:
+            self.requests += 1
+
+    def snapshot(self):
+        with self._lock:
+            reused = max(self.requests - self.new_connections, 0)
+            return {
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0
+            }
+
+
+def _timeout(settings):
+    import httpx
+
+    return httpx.Timeout(
+        connect=settings["connect_timeout"],
+        read=settings["read_timeout"],
+        write=settings["write_timeout"],
+        pool=settings["pool_timeout"],
+    )
+
+
+def make_http_client(async_client=True, stats=None, **overrides):
+    """
+    Build an httpx client with explicit pool limits, keep-alive expiry and per-phase
+    timeouts. HTTP/2 is used when requested and the optional `h2` package is installed.
+    """
+    import httpx  # Imported on first use, like openai below
+
+    settings = {**transport_settings_from_env(), **overrides}
+    http2 = settings["http2"]
+    if http2 and h2 is None:
+        logger.warning("LLM_HTTP2 is set but the 'h2' package is not installed; using HTTP/1.1")
+        http2 = False
+
+    kwargs = {
+        "limits": httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive_connections"],
+            keepalive_expiry=settings["keepalive_expiry"],
+        ),
+        "timeout": _timeout(settings),
+        "http2": http2,
+    }
+    if async_client:
+        if stats is not None:
+            kwargs["event_hooks"] = {"request": [stats.aon_request]}
+        return httpx.AsyncClient(**kwargs)
+    if stats is not None:
+        kwargs["event_hooks"] = {"request": [stats.on_request]}
+    return httpx.Client(**kwargs)
+
+
+def make_openai_client(async_client=True, stats=None, **overrides):
+    """Build an OpenAI (or AsyncOpenAI) client on a tuned HTTP transport."""
+    import openai  # Imported on first use: it dominates the server's import time
+
+    settings = {**transport_settings_from_env(), **overrides}
+    http_client = make_http_client(async_client=async_client, stats=stats, **settings)
+    client_class = openai.AsyncOpenAI if async_client else openai.OpenAI
+    return client_class(
+        http_client=http_client,
+        timeout=_timeout(settings),
+        max_retries=settings["max_retries"],
+    )
+
+
+async def warm_async_client(client, connections=2):
+    """Open `connections` pooled connections ahead of the first real request."""
+    async def touch():
+        try:
+            await client.models.list()
+        except Exception as e:
+            logger.warning(f"Connection pool warm-up request failed: {str(e)}")
+
+    await asyncio.gather(*(touch() for _ in range(connections)))
+    logger.info(f"Warmed LLM connection pool with {connections} connections")
+
+
+def warm_client(client, connections=2):
+    """Synchronous variant of `warm_async_client`, run in background threads."""
+    def touch():
+        try:
+            client.models.list()
+        except Exception as e:
+            logger.warning(f"Connection pool warm-up request failed: {str(e)}")
+
+    for _ in range(connections):
+        threading.Thread(target=touch, name="llm-pool-warmup", daemon=True).start()
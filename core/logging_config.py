@@ -0,0 +1,219 @@
+"""Non-blocking, structured logging with rotation and sampling of high-frequency events."""
+import atexit
+import contextlib
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+# Fields attached to every record logged while they are set (per thread / asyncio task);
+# route/model/max_tokens describe an LLM call's routing decision
+LOG_CONTEXT_FIELDS = ("conversation_id", "agent", "route", "model", "max_tokens")
+_log_context = contextvars.ContextVar("log_context", default={})
+
+
+@contextlib.contextmanager
+def log_context(**fields):
+    """Attach `fields` (e.g. conversation_id, agent) to records logged inside the block."""
+    token = _log_context.set({**_log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+
+def set_log_context(**fields):
+    """Set context fields until `reset_log_context(token)`; for request hooks."""
+    return _log_context.set({**_log_context.get(), **fields})
+
+
+def reset_log_context(token):
+    _log_context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copies the current log context onto the record. Filters run in the thread
+    that logs, before the record is queued, so this sees the caller's context.
+    """
+
+    def filter(self, record):
+        for name, value in _log_context.get().items():
+            if not hasattr(record, name):
+                setattr(record, name, value)
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `per_second` records through per logger (with bursts of up to
+    `burst`), dropping the rest. The next record let through carries the number
+    dropped in between as `suppressed`.
+    """
+
+    def __init__(self, per_second=1.0, burst=5):
+        super().__init__()
+        self.per_second = per_second
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def filter(self, record):
+        if self.per_second <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            level, updated, suppressed = self._buckets.get(record.name, (self.burst, now, 0))
+            level = min(self.burst, level + (now - updated) * self.per_second)
+            if level < 1:
+                self._buckets[record.name] = (level, now, suppressed + 1)
+                return False
+            self._buckets[record.name] = (level - 1, now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with timestamp, level, logger, message and context fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in LOG_CONTEXT_FIELDS + ("suppressed",):
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic one-line format, with context fields appended when present."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(levelname)s - %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = [f"{name}={getattr(record, name)}" for name in LOG_CONTEXT_FIELDS + ("suppressed",)
+                  if getattr(record, name, None) is not None]
+        return f"{line} [{' '.join(fields)}]" if fields else line
+
+
+# Formats tracebacks before records are queued (see DroppingQueueHandler.prepare)
+_traceback_formatter = logging.Formatter()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        """
+        Copy the record for the queue with its arguments merged into the message.
+        Unlike `QueueHandler.prepare`, the traceback is not appended to the
+        message but kept as `exc_text`, so formatters still report it separately.
+        """
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Format it here: the traceback's frames shouldn't outlive the call
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _file_handler(path, max_bytes, backup_count, rotate_when):
+    if rotate_when:
+        return logging.handlers.TimedRotatingFileHandler(path, when=rotate_when, backupCount=backup_count)
+    return logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count)
+
+
+# The listener of the process that configured logging; a forked child starts its own
+_listener = None
+_listener_pid = None
+
+
+def configure_logging(level=logging.INFO):
+    """
+    Route all logging through a bounded in-memory queue drained by a background
+    listener thread, so request threads never wait on stdout or disk.
+
+    Configured through environment variables:
+        LOG_FORMAT: "json" (default) or "text".
+        LOG_FILE: Log file path, rotated in place; empty to log to stdout only.
+        LOG_MAX_BYTES / LOG_BACKUP_COUNT: Size-based rotation settings.
+        LOG_ROTATE_WHEN: Rotate by time instead ("midnight", "H", ...).
+        LOG_QUEUE_SIZE: Records buffered before new ones are dropped.
+
+    Returns the QueueListener, which is stopped (and flushed) at exit. Calling
+    it again in the same process returns the running listener; in a forked
+    child, whose copy of the listener thread is gone, it starts a new one.
+    """
+    global _listener, _listener_pid
+    if _listener is not None:
+        if _listener_pid == os.getpid():
+            return _listener
+        atexit.unregister(_listener.stop)
+
+    formatter = JsonFormatter() if os.getenv("LOG_FORMAT", "json") == "json" else TextFormatter()
+    handlers = [logging.StreamHandler(sys.stdout)]
+    log_file = os.getenv("LOG_FILE", "backend.log")
+    if log_file:
+        handlers.append(_file_handler(
+            log_file,
+            max_bytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backup_count=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+            rotate_when=os.getenv("LOG_ROTATE_WHEN", ""),
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+    queue_handler = DroppingQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    _listener, _listener_pid = listener, os.getpid()
+    return listener
+
+
+def sampled_logger(name, per_second=1.0, burst=5):
+    """A logger for high-frequency events (e.g. polls) that drops records above `per_second`."""
+    logger = logging.getLogger(name)
+    if not any(isinstance(f, RateLimitFilter) for f in logger.filters):
+        logger.addFilter(RateLimitFilter(per_second=per_second, burst=burst))
+    return logger
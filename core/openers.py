@@ -0,0 +1,173 @@
+"""Pool of pre-generated opening replies per persona, refilled in the background."""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+from core.cache import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# First messages that don't ask anything in particular (compared after normalize_text)
+GENERIC_OPENINGS = frozenset({
+    "", "hi", "hello", "hey", "hi there", "hello there", "hey there", "hiya", "howdy", "yo", "sup",
+    "greetings", "good morning", "good afternoon", "good evening", "what's up", "whats up", "how are you",
+    "hi everyone", "hello everyone", "hey everyone", "hi all", "hello all", "hey all",
+})
+
+# The user turn openers are written for
+OPENER_REQUEST = {"role": "user", "content": "User: Hi!"}
+
+
+def is_generic_opening(message):
+    """True for an empty or greeting-only first message ("User: hey!" included)."""
+    if message.startswith("User:"):
+        message = message[len("User:"):]
+    return normalize_text(message) in GENERIC_OPENINGS
+
+
+class OpenerPool:
+    """
+    A few fresh replies to a generic "Hi!" kept ready for every persona, so the
+    first reply of a new conversation doesn't wait for a completion.
+
+    A background task (`run`) tops each persona's pool up to `size` replies,
+    one completion at a time and only while `is_idle()` says the server has
+    spare capacity. Replies are sanitized when generated, dropped after
+    `max_age_seconds` and handed out at most once. Only a share
+    `serve_rate` of eligible openings are served from the pool; the rest are
+    generated as usual so openers stay varied. A persona whose prompt changes
+    (the persona files were edited) starts over with an empty pool.
+
+    Args:
+        personas: `PersonaRegistry` whose personas get a pool.
+        generate: Coroutine function `(persona) -> str` writing one raw opener.
+        size: Openers kept per persona (0 disables the pool).
+        max_age_seconds: Openers older than this are discarded.
+        serve_rate: Share (0-1) of eligible first replies served from the pool.
+        refill_interval: Seconds between refill passes.
+        is_idle: Callable returning True when refilling won't compete with users.
+    """
+
+    def __init__(self, personas, generate, size=2, max_age_seconds=900, serve_rate=1.0,
+                 refill_interval=5.0, is_idle=None):
+        self.personas = personas
+        self.generate = generate
+        self.size = size
+        self.max_age_seconds = max_age_seconds
+        self.serve_rate = serve_rate
+        self.refill_interval = refill_interval
+        self.is_idle = is_idle or (lambda: True)
+        self._pools = {}  # persona name -> (prompt, deque of (created, reply))
+        self._lock = threading.Lock()
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.generated = 0
+        self.expired = 0
+        self.failures = 0
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def take(self, persona, message):
+        """
+        An opener for `persona` if `message` (the conversation's only user message)
+        is generic and the pool has a fresh one, else None.
+        """
+        if not self.enabled or not is_generic_opening(message):
+            return None
+        with self._lock:
+            if random.random() >= self.serve_rate:
+                self.skipped += 1
+                return None
+            pooled = self._pools.get(persona.name)
+            # An agent created before the persona was edited gets no stale openers
+            entries = self._entries(persona) if pooled and pooled[0] == persona.prompt else None
+            if not entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entries.popleft()[1]
+
+    def _entries(self, persona):
+        """The persona's fresh openers, oldest first (caller holds the lock)."""
+        prompt, entries = self._pools.get(persona.name, (None, None))
+        if entries is None or prompt != persona.prompt:
+            entries = deque()
+            self._pools[persona.name] = (persona.prompt, entries)
+        cutoff = time.monotonic() - self.max_age_seconds
+        while entries and entries[0][0] < cutoff:
+            entries.popleft()
+            self.expired += 1
+        return entries
+
+    def start(self, engine):
+        """Run the refill task on `engine` (once per process)."""
+        if not self.enabled or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        with self._lock:
+            # A forked worker doesn't hand out the openers its parent may also serve
+            self._pools.clear()
+        engine.run_background(self.run())
+        logger.info(f"Opener pool started ({self.size} per persona, max age {self.max_age_seconds:.0f}s)")
+
+    async def run(self):
+        """Refill the pools every `refill_interval` seconds, forever."""
+        while True:
+            try:
+                await self.refill()
+            except Exception as e:
+                logger.error(f"Error refilling the opener pool: {str(e)}")
+            await asyncio.sleep(self.refill_interval)
+
+    async def refill(self):
+        """Top every persona's pool up while the server is idle. Returns the openers added."""
+        persona_set = self.personas.current
+        with self._lock:
+            for name in [name for name in self._pools if name not in persona_set]:
+                del self._pools[name]
+        added = 0
+        for persona in list(persona_set.by_name.values()):
+            while self.is_idle():
+                with self._lock:
+                    if len(self._entries(persona)) >= self.size:
+                        break
+                try:
+                    reply = await self.generate(persona)
+                except Exception as e:
+                    self.failures += 1
+                    logger.warning(f"Could not generate an opener for {persona.name}: {str(e)}")
+                    return added
+                reply = persona_set.sanitizer.clean(reply.strip())
+                if not reply:
+                    self.failures += 1
+                    break
+                with self._lock:
+                    self._entries(persona).append((time.monotonic(), reply))
+                    self.generated += 1
+                added += 1
+        return added
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.skipped
+            return {
+                "size": self.size,
+                "max_age_seconds": self.max_age_seconds,
+                "serve_rate": self.serve_rate,
+                "pooled": {name: len(entries) for name, (_, entries) in self._pools.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "generated": self.generated,
+                "expired": self.expired,
+                "failures": self.failures,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
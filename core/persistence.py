@@ -0,0 +1,213 @@
+"""Durable conversation storage on SQLite with batched, off-request-path writes."""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    agents TEXT NOT NULL,
+    is_multi_agent INTEGER NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}',
+    counters TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    speaker TEXT,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_by_conversation ON messages (conversation_id, id);
+"""
+
+
+def new_conversation_id():
+    """Collision-free conversation ID that still sorts roughly by creation time."""
+    return f"conv_{int(time.time())}_{uuid.uuid4().hex[:12]}"
+
+
+def connect(path):
+    """Open a connection in WAL mode so readers never block the writer."""
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ConversationDatabase:
+    """
+    Appends conversations and their messages to a local SQLite database.
+
+    Writes are queued and applied by a single writer thread, which groups up to
+    `batch_size` statements (or whatever arrives within `flush_interval` seconds)
+    into one transaction, so request handlers and turn loops never wait on disk.
+    Reads go through a separate connection. Queued writes are counted per
+    conversation, so a read waits only for its own conversation's writes.
+
+    The connection and the writer thread are opened by `start()`, which runs on
+    first use and again in a forked child, since neither survives a fork.
+    """
+
+    def __init__(self, path, batch_size=200, flush_interval=0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._reader = None
+        self._read_lock = threading.Lock()
+        # Conversation id -> queued statements not yet committed
+        self._pending = {}
+        self._pending_changed = threading.Condition()
+        self.batches_written = 0
+        self.statements_written = 0
+
+    def start(self):
+        """Open the read connection and start the writer thread in this process."""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue()
+            with self._pending_changed:
+                self._pending = {}
+            self._reader = connect(self.path)
+            self._reader.executescript(SCHEMA)
+            columns = [row[1] for row in self._reader.execute("PRAGMA table_info(conversations)")]
+            if "counters" not in columns:
+                # Databases created before cursors were kept across evictions and restarts
+                try:
+                    self._reader.execute("ALTER TABLE conversations ADD COLUMN counters TEXT NOT NULL DEFAULT '{}'")
+                    self._reader.commit()
+                except sqlite3.OperationalError:
+                    pass  # Another worker added it first
+            writer = threading.Thread(target=self._run, args=(self._queue,), name="conversation-db-writer", daemon=True)
+            writer.start()
+            self._pid = os.getpid()
+
+    def _put(self, conversation_id, sql, params):
+        self.start()
+        with self._pending_changed:
+            self._pending[conversation_id] = self._pending.get(conversation_id, 0) + 1
+        self._queue.put((conversation_id, sql, params))
+
+    def _written(self, batch):
+        with self._pending_changed:
+            for conversation_id, _, _ in batch:
+                remaining = self._pending.get(conversation_id, 0) - 1
+                if remaining > 0:
+                    self._pending[conversation_id] = remaining
+                else:
+                    self._pending.pop(conversation_id, None)
+            self._pending_changed.notify_all()
+
+    def _run(self, write_queue):
+        conn = connect(self.path)
+        while True:
+            batch = [write_queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(write_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                with conn:
+                    for _, sql, params in batch:
+                        conn.execute(sql, params)
+                self.batches_written += 1
+                self.statements_written += len(batch)
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} statements to conversation database: {str(e)}", exc_info=True)
+            finally:
+                self._written(batch)
+                for _ in batch:
+                    write_queue.task_done()
+
+    def flush(self, conversation_id=None):
+        """
+        Block until the queued writes of `conversation_id` (or, without one, every
+        queued write) have been committed.
+        """
+        if self._pid != os.getpid():
+            return
+        if conversation_id is None:
+            self._queue.join()
+            return
+        with self._pending_changed:
+            self._pending_changed.wait_for(lambda: conversation_id not in self._pending)
+
+    def save_conversation(self, conversation_id, agent_names, is_multi_agent, options=None):
+        """Record a new conversation's roster and settings."""
+        self._put(
+            conversation_id,
+            "INSERT OR IGNORE INTO conversations (id, agents, is_multi_agent, options, created_at) VALUES (?, ?, ?, ?, ?)",
+            (conversation_id, json.dumps(agent_names), int(is_multi_agent), json.dumps(options or {}), time.time())
+        )
+
+    def append_message(self, conversation_id, role, content, speaker=None):
+        """Append one user or assistant message to a conversation."""
+        self._put(
+            conversation_id,
+            "INSERT INTO messages (conversation_id, role, speaker, content, created_at) VALUES (?, ?, ?, ?, ?)",
+            (conversation_id, role, speaker, content, time.time())
+        )
+
+    def save_counters(self, conversation_id, counters):
+        """Store the sequence numbers a rehydrated conversation continues from."""
+        self._put(
+            conversation_id,
+            "UPDATE conversations SET counters = ? WHERE id = ?",
+            (json.dumps(counters), conversation_id)
+        )
+
+    def load_conversation(self, conversation_id):
+        """
+        Load a conversation's settings, counters and full message list.
+        Returns None if the conversation was never stored.
+        """
+        self.start()
+        # Only this conversation's own queued writes matter (none for an unknown id)
+        self.flush(conversation_id)
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT agents, is_multi_agent, options, counters FROM conversations WHERE id = ?",
+                (conversation_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            messages = self._reader.execute(
+                "SELECT role, speaker, content FROM messages WHERE conversation_id = ? ORDER BY id",
+                (conversation_id,)
+            ).fetchall()
+        return {
+            "agents": json.loads(row[0]),
+            "is_multi_agent": bool(row[1]),
+            "options": json.loads(row[2]),
+            "counters": json.loads(row[3]),
+            "messages": [{"role": role, "speaker": speaker, "content": content} for role, speaker, content in messages]
+        }
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "pending_writes": self._queue.qsize() if self._pid == os.getpid() else 0,
+            "pending_conversations": len(self._pending) if self._pid == os.getpid() else 0,
+            "batches_written": self.batches_written,
+            "statements_written": self.statements_written
+        }
@@ -0,0 +1,217 @@
+"""
+Persona registry loaded from JSON files, with prompt artifacts computed once per load.
+
+Each persona lives in its own file in the personas directory:
+
+    {
+      "id": "einstein",
+      "name": "Albert Einstein",
+      "order": 1,
+      "prompt": "You are Albert Einstein, ...",
+      "group_prompt": "You are Albert Einstein, ... in a lively group chat ...",
+      "aliases": ["albert"]
+    }
+
+Only "name" and "prompt" are required; "id" defaults to the file name. Adding,
+editing or removing a file takes effect without a restart: the directory is
+re-checked at most every `reload_interval` seconds when the registry is read.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+from core.prompts import split_sentences
+from core.sanitizer import ReplySanitizer
+from core.scheduler import estimate_prompt_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PERSONAS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "personas")
+
+
+class Persona:
+    """
+    One character's prompts plus what is derived from them: token estimates,
+    prompt sentences (for shared group headers) and the speaker label.
+    """
+
+    def __init__(self, persona_id, name, prompt, group_prompt=None, aliases=(), order=None, source=None):
+        self.id = persona_id
+        self.name = name
+        self.prompt = prompt
+        self.group_prompt = group_prompt or prompt
+        self.aliases = tuple(aliases)
+        self.order = order
+        self.source = source
+        self.label = f"{name}:"
+        self.prompt_tokens = estimate_prompt_tokens([{"role": "system", "content": prompt}])
+        self.group_prompt_tokens = estimate_prompt_tokens([{"role": "system", "content": self.group_prompt}])
+        self.prompt_sentences = tuple(split_sentences(prompt))
+        self.group_prompt_sentences = tuple(split_sentences(self.group_prompt))
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as source:
+            data = json.load(source)
+        for field in ("name", "prompt"):
+            if not isinstance(data.get(field), str) or not data[field].strip():
+                raise ValueError(f"{path}: '{field}' must be a non-empty string")
+        return cls(
+            persona_id=data.get("id") or os.path.splitext(os.path.basename(path))[0],
+            name=data["name"],
+            prompt=data["prompt"],
+            group_prompt=data.get("group_prompt"),
+            aliases=data.get("aliases", ()),
+            order=data.get("order"),
+            source=path,
+        )
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "aliases": list(self.aliases),
+            "prompt_tokens": self.prompt_tokens,
+            "group_prompt_tokens": self.group_prompt_tokens,
+        }
+
+
+class PersonaSet:
+    """
+    An immutable snapshot of every persona and the lookup tables built from it.
+
+    `resolve` accepts an id ("einstein"), a full name in any case or an alias;
+    `sanitizer` strips every persona's speaker label from replies.
+    """
+
+    def __init__(self, personas, version=1):
+        ordered = sorted(personas, key=lambda p: (p.order is None, p.order or 0, p.id))
+        self.version = version
+        self.loaded_at = time.time()
+        self.by_name = {}
+        self.lookup = {}
+        for persona in ordered:
+            if persona.name in self.by_name:
+                raise ValueError(f"Duplicate persona name: {persona.name}")
+            self.by_name[persona.name] = persona
+            for key in (persona.id, persona.name, *persona.aliases):
+                key = key.lower()
+                if self.lookup.setdefault(key, persona) is not persona:
+                    raise ValueError(f"'{key}' refers to both {self.lookup[key].name} and {persona.name}")
+        self.names = list(self.by_name)
+        self.sanitizer = ReplySanitizer(self.names)
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def get(self, name):
+        """The persona with exactly this name, or None."""
+        return self.by_name.get(name)
+
+    def resolve(self, key):
+        """The persona for an id, name or alias (case-insensitive), or None."""
+        return self.lookup.get(key.strip().lower()) if key else None
+
+
+class PersonaRegistry:
+    """
+    Loads personas from a directory on first use and reloads them when the
+    files change.
+
+    Reads go through `current`, which returns the latest `PersonaSet`; a reload
+    builds a complete new set and swaps it in, so readers never see a partial
+    one. A directory that fails to load (bad JSON, duplicate names, ...) is
+    logged and the previous set stays in use.
+
+    Args:
+        directory: Folder of *.json persona files.
+        reload_interval: Minimum seconds between checks for changed files
+            (0 disables hot reloading).
+    """
+
+    def __init__(self, directory=DEFAULT_PERSONAS_DIR, reload_interval=5.0):
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._current = None
+        self._signature = None
+        self._failed_signature = None
+        self._checked_at = 0.0
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error = None
+
+    @property
+    def current(self):
+        """The latest persona set, loading or reloading it if needed."""
+        current = self._current
+        if current is None:
+            return self._load(initial=True)
+        if self.reload_interval > 0 and time.monotonic() - self._checked_at >= self.reload_interval:
+            self.reload()
+            current = self._current
+        return current
+
+    def _files(self):
+        return sorted(
+            os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith(".json")
+        )
+
+    def _directory_signature(self, files):
+        signature = []
+        for path in files:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _load(self, initial=False):
+        with self._lock:
+            if initial and self._current is not None:
+                return self._current
+            self._checked_at = time.monotonic()
+            signature = None
+            version = self._current.version + 1 if self._current is not None else 1
+            try:
+                files = self._files()
+                signature = self._directory_signature(files)
+                if signature in (self._signature, self._failed_signature):
+                    return self._current
+                persona_set = PersonaSet([Persona.from_file(path) for path in files], version=version)
+                if not persona_set.names:
+                    raise ValueError(f"No personas found in {self.directory}")
+            except Exception as e:
+                if self._current is None:
+                    raise
+                # Report a broken edit once, not on every check
+                self._failed_signature = signature
+                self.reload_errors += 1
+                self.last_error = str(e)
+                logger.error(f"Keeping personas version {self._current.version}; reload failed: {str(e)}")
+                return self._current
+            self._current, self._signature = persona_set, signature
+            if version > 1:
+                self.reloads += 1
+            logger.info(f"Loaded {len(persona_set)} personas (version {version}) from {self.directory}")
+            return persona_set
+
+    def reload(self):
+        """Re-read the directory if any file changed. Returns True if the set was replaced."""
+        previous = self._current
+        return self._load() is not previous
+
+    def stats(self):
+        current = self._current
+        return {
+            "directory": self.directory,
+            "version": current.version if current else 0,
+            "personas": len(current) if current else 0,
+            "loaded_at": current.loaded_at if current else None,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
+        }
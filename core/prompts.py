@@ -0,0 +1,136 @@
+"""Prompt assembly tuned for provider-side prefix caching, plus cache hit accounting."""
+import re
+import threading
+from collections import defaultdict
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text):
+    """Split a persona prompt into sentences, dropping empty fragments."""
+    return [sentence.strip() for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+class PromptLayout:
+    """
+    Orders a conversation's prompt content for the longest stable shared prefix.
+
+    Provider prompt caching only reuses an identical leading run of tokens. Putting
+    each agent's persona before the shared history gives every agent a different
+    prefix, so nothing is shared between the agents of a group chat. Instead:
+
+    * Group chats send one header system message holding the conversation rules
+      and every participant's persona (with sentences repeated across personas
+      listed once), then the shared history, then a short per-agent trailer naming
+      who should speak. Only the trailer differs between agents.
+    * One-on-one chats merge the persona and the conversation system message into
+      a single header.
+    """
+
+    def __init__(self, agents, conversation_message, is_multi_agent):
+        self.is_multi_agent = is_multi_agent
+        if is_multi_agent:
+            content = self._group_header(agents, conversation_message["content"])
+        else:
+            persona = agents[0].system_prompt if agents else ""
+            content = f"{persona}\n\n{conversation_message['content']}".strip()
+        self.header = {"role": "system", "content": content}
+
+    @staticmethod
+    def _group_header(agents, rules):
+        persona_sentences = {agent.name: agent.prompt_sentences for agent in agents}
+        counts = defaultdict(int)
+        for sentences in persona_sentences.values():
+            for sentence in set(sentences):
+                counts[sentence] += 1
+        # Sentences repeated across personas become shared rules, listed once
+        shared = []
+        for sentences in persona_sentences.values():
+            for sentence in sentences:
+                if counts[sentence] > 1 and sentence not in shared:
+                    shared.append(sentence)
+
+        sections = [rules]
+        if shared:
+            sections.append("Rules for every participant:\n" + "\n".join(f"- {sentence}" for sentence in shared))
+        for name, sentences in persona_sentences.items():
+            own = " ".join(sentence for sentence in sentences if counts[sentence] == 1)
+            sections.append(f"Persona of {name}: {own}")
+        return "\n\n".join(sections)
+
+    def messages_for(self, agent, window):
+        """
+        Build the messages for `agent` from a context window (a `MessageView`)
+        whose first message is this layout's header. The window is not copied:
+        group chats get it back with the agent's trailer added to the view.
+        """
+        if not self.is_multi_agent:
+            return window
+        trailer = {
+            "role": "system",
+            "content": f"You are {agent.name}. Write {agent.name}'s next message only, following the persona of {agent.name} above."
+        }
+        return window.with_trailer(trailer)
+
+
+def usage_field(obj, name):
+    """Read a usage field from either a typed response object or a raw dict."""
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def cached_prompt_tokens(usage):
+    """Return (prompt_tokens, cached_tokens) from a completion's usage block."""
+    prompt_tokens = usage_field(usage, "prompt_tokens") or 0
+    details = usage_field(usage, "prompt_tokens_details")
+    cached_tokens = usage_field(details, "cached_tokens") or 0
+    return prompt_tokens, cached_tokens
+
+
+class PromptCacheStats:
+    """Running totals of prompt and cached prompt tokens per conversation and per agent."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_conversation = defaultdict(lambda: [0, 0])
+        self._by_agent = defaultdict(lambda: [0, 0])
+
+    def record(self, conversation_id, agent_name, usage):
+        """Add one completion's usage to the totals."""
+        prompt_tokens, cached_tokens = cached_prompt_tokens(usage)
+        if not prompt_tokens:
+            return
+        with self._lock:
+            for totals in (self._by_conversation[conversation_id], self._by_agent[agent_name]):
+                totals[0] += prompt_tokens
+                totals[1] += cached_tokens
+
+    @staticmethod
+    def _report(totals):
+        prompt_tokens, cached_tokens = totals
+        return {
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "hit_ratio": round(cached_tokens / prompt_tokens, 4) if prompt_tokens else 0.0
+        }
+
+    def conversation(self, conversation_id):
+        """Cache report for one conversation."""
+        with self._lock:
+            return self._report(self._by_conversation.get(conversation_id, [0, 0]))
+
+    def snapshot(self):
+        """Cache reports for every agent and conversation seen so far."""
+        with self._lock:
+            return {
+                "agents": {name: self._report(totals) for name, totals in self._by_agent.items()},
+                "conversations": {cid: self._report(totals) for cid, totals in self._by_conversation.items()}
+            }
+
+    def forget(self, conversation_id):
+        """Drop a conversation's totals (e.g. once it is evicted)."""
+        with self._lock:
+            self._by_conversation.pop(conversation_id, None)
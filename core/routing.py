@@ -0,0 +1,164 @@
+"""Per-call choice of model, max_tokens and stop sequences for agent replies."""
+import threading
+import time
+from collections import defaultdict, deque
+
+from core.prompts import usage_field
+
+# The chat completions API accepts at most four stop sequences
+MAX_STOP_SEQUENCES = 4
+
+
+def label_stop_sequences(name, participants):
+    """
+    Stop sequences that end a reply where it starts a new speaker's line: the
+    user's label first, then the other participants' and finally the agent's own.
+    """
+    others = [participant for participant in participants if participant != name]
+    labels = ["User"] + others + [name]
+    return [f"\n{label}:" for label in labels][:MAX_STOP_SEQUENCES]
+
+
+class LatencyWindow:
+    """The last `size` call latencies of one model, for percentile estimates."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """Nearest-rank percentile of the window (None while it is empty)."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))]
+
+
+class ModelRouter:
+    """
+    Picks the model and generation limits for each agent reply.
+
+    Every reply gets a `max_tokens` sized for a text-message answer (tighter in
+    group chats) and stop sequences on speaker labels ("\\nUser:", "\\nAlan
+    Turing:", ...), so a reply that runs on into someone else's line is cut at
+    the API instead of being generated and then sanitized away. On top of that
+    one policy is chosen per call:
+
+    * "budget": the turn has less time left than the agent's model usually
+      takes (its p90 latency), so the fast model is used with `tight_max_tokens`.
+    * "fast": the agent's model has recently been slower than `slow_seconds` at
+      p90, so the fast model is used.
+    * "default": the agent's own model.
+
+    Latencies are observed per model (`observe`) and each call's outcome per
+    policy (`record`), so `stats()` compares latency and token use by policy.
+    Without a `fast_model` only the limits change between policies.
+
+    Args:
+        fast_model: Model used by the "fast" and "budget" policies ('' keeps the agent's model).
+        single_max_tokens: max_tokens for one-on-one replies.
+        group_max_tokens: max_tokens for group-chat replies.
+        tight_max_tokens: max_tokens under the "budget" policy.
+        slow_seconds: p90 latency that moves calls to the fast model (0 disables).
+        turn_budget_seconds: Target duration of a whole reply burst (0 disables).
+        min_samples: Latencies a model needs before they are trusted.
+    """
+
+    def __init__(self, fast_model="", single_max_tokens=120, group_max_tokens=80, tight_max_tokens=40,
+                 slow_seconds=0.0, turn_budget_seconds=0.0, min_samples=20):
+        self.fast_model = fast_model
+        self.single_max_tokens = single_max_tokens
+        self.group_max_tokens = group_max_tokens
+        self.tight_max_tokens = tight_max_tokens
+        self.slow_seconds = slow_seconds
+        self.turn_budget_seconds = turn_budget_seconds
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._latency = defaultdict(LatencyWindow)
+        self._policies = defaultdict(lambda: {"calls": 0, "seconds": 0.0, "completion_tokens": 0, "prompt_tokens": 0})
+
+    def observe(self, model, seconds):
+        """Record how long one completion of `model` took."""
+        with self._lock:
+            self._latency[model].add(seconds)
+
+    def expected_seconds(self, model, pct=90):
+        """The model's recent latency percentile, or None until it has `min_samples` calls."""
+        with self._lock:
+            window = self._latency.get(model)
+            if window is None or len(window) < self.min_samples:
+                return None
+            return window.percentile(pct)
+
+    def route(self, agent, participants, is_multi_agent, turn_started=None):
+        """
+        Choose how to generate `agent`'s next reply.
+
+        Args:
+            agent: The agent replying (its name, model and max_tokens cap are used).
+            participants: Names of the conversation's agents.
+            is_multi_agent: Group chat (True) or one-on-one (False).
+            turn_started: time.monotonic() when the turn's burst began.
+
+        Returns a dict with "policy", "model", "max_tokens", "stop" and "reason".
+        """
+        max_tokens = min(agent.max_tokens, self.group_max_tokens if is_multi_agent else self.single_max_tokens)
+        model = agent.model
+        policy, reason = "default", ""
+        expected = self.expected_seconds(agent.model)
+        remaining = None
+        if self.turn_budget_seconds > 0 and turn_started is not None:
+            remaining = self.turn_budget_seconds - (time.monotonic() - turn_started)
+        if remaining is not None and expected is not None and remaining < expected:
+            policy, reason = "budget", f"{remaining:.1f}s left in the turn, p90 {expected:.2f}s"
+            model = self.fast_model or agent.model
+            max_tokens = min(max_tokens, self.tight_max_tokens)
+        elif self.slow_seconds > 0 and expected is not None and expected > self.slow_seconds and self.fast_model:
+            policy, reason = "fast", f"p90 {expected:.2f}s over {self.slow_seconds:.2f}s"
+            model = self.fast_model
+        return {
+            "policy": policy,
+            "model": model,
+            "max_tokens": max_tokens,
+            "stop": label_stop_sequences(agent.name, participants),
+            "reason": reason,
+        }
+
+    def record(self, route, seconds, usage):
+        """Add one routed call's duration and token use to its policy's totals."""
+        with self._lock:
+            totals = self._policies[route["policy"]]
+            totals["calls"] += 1
+            totals["seconds"] += seconds
+            totals["prompt_tokens"] += usage_field(usage, "prompt_tokens") or 0
+            totals["completion_tokens"] += usage_field(usage, "completion_tokens") or 0
+
+    def stats(self):
+        with self._lock:
+            policies = {
+                policy: {
+                    "calls": totals["calls"],
+                    "seconds_avg": round(totals["seconds"] / totals["calls"], 4) if totals["calls"] else 0.0,
+                    "prompt_tokens_avg": round(totals["prompt_tokens"] / totals["calls"], 1) if totals["calls"] else 0.0,
+                    "completion_tokens_avg": (
+                        round(totals["completion_tokens"] / totals["calls"], 1) if totals["calls"] else 0.0
+                    ),
+                }
+                for policy, totals in self._policies.items()
+            }
+            latency = {
+                model: {"samples": len(window), "p50": window.percentile(50), "p90": window.percentile(90)}
+                for model, window in self._latency.items()
+            }
+        return {
+            "fast_model": self.fast_model,
+            "slow_seconds": self.slow_seconds,
+            "turn_budget_seconds": self.turn_budget_seconds,
+            "policies": policies,
+            "latency": latency,
+        }
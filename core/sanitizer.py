@@ -0,0 +1,246 @@
+"""
+Reply sanitizer: strips speaker labels and role prefixes from agent replies.
+
+Agents must not speak for the user or for each other, so every "User:" and
+"<persona name>:" label is removed from a reply and a leading role prefix
+("You:", "As ...:", ...) is cut off. `ReplySanitizer.clean` does this for a
+complete reply; `ReplySanitizer.stream` does the same on a streamed reply,
+chunk by chunk, holding back only text that could still turn out to be part of
+a label or prefix.
+"""
+import re
+
+USER_LABEL = "User:"
+ROLE_PREFIXES = ("You:", "Me:", "I am", "As", "Speaking as")
+# Up to this many labels, one `in` check per label beats a compiled pattern
+MAX_LABELS_CHECKED_EACH = 12
+
+
+def legacy_clean(reply, names, warn=None):
+    """
+    The original label-by-label cleanup: one `in` check and `str.replace` per
+    label, then the role prefixes. Kept as the reference `ReplySanitizer.clean`
+    must match, and as its fallback for replies where removing one label joins
+    the text around it into another label.
+    """
+    if USER_LABEL in reply:
+        if warn:
+            warn("label", USER_LABEL)
+        reply = reply.replace(USER_LABEL, "")
+    for name in names:
+        if f"{name}:" in reply:
+            if warn:
+                warn("label", f"{name}:")
+            reply = reply.replace(f"{name}:", "")
+    return _strip_role_prefixes(reply, warn)
+
+
+def _strip_role_prefixes(reply, warn=None):
+    for prefix in ROLE_PREFIXES:
+        if reply.startswith(prefix):
+            if warn:
+                warn("prefix", prefix)
+            parts = reply.split(":", 1)
+            if len(parts) > 1:
+                reply = parts[1].strip()
+    return reply
+
+
+def _remove_each(reply, labels, warn=None):
+    """`legacy_clean`'s label loop over precomputed labels."""
+    for label in labels:
+        if label in reply:
+            if warn:
+                warn("label", label)
+            reply = reply.replace(label, "")
+    return reply
+
+
+class ReplySanitizer:
+    """
+    Removes "User:" and "<name>:" labels for the given persona names plus a
+    leading role prefix, with the same result as `legacy_clean`.
+
+    Every label ends in ":", so a reply without a colon (most of them) only has
+    its role prefixes checked. Otherwise, small rosters check each label with
+    `in`, which is fastest up to `MAX_LABELS_CHECKED_EACH` labels, and larger
+    ones are removed in one pass of a compiled alternation of every label.
+
+    Args:
+        names: Persona names whose "<name>:" labels are removed.
+    """
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.labels = [USER_LABEL] + [f"{name}:" for name in self.names]
+        # Longest first, so the longest label at a position wins
+        self._pattern = re.compile("|".join(re.escape(label) for label in sorted(self.labels, key=len, reverse=True)))
+        # A label ending in another ("Alan Turing:", "Turing:") makes the removal
+        # order matter, which only the label-by-label loop gets right
+        nested = any(other != label and label.endswith(other) for label in self.labels for other in self.labels)
+        self._check_each = nested or len(self.labels) <= MAX_LABELS_CHECKED_EACH
+        # Every proper prefix of a label: the text a stream may have to hold back
+        self._partials = {label[:end] for label in self.labels for end in range(1, len(label))}
+        self._longest_partial = max(len(label) for label in self.labels) - 1
+
+    def clean(self, reply, warn=None):
+        """
+        Sanitize a complete reply. `warn(kind, text)` is called for every label
+        ("label", "Alan Turing:") or role prefix ("prefix", "As") found, in the
+        order `legacy_clean` reports them.
+        """
+        if ":" in reply:
+            reply = self.remove_labels(reply, warn)
+        return _strip_role_prefixes(reply, warn)
+
+    def remove_labels(self, text, warn=None):
+        """Remove every label from `text` (`clean` without the role prefixes)."""
+        if self._check_each:
+            return _remove_each(text, self.labels, warn)
+        cleaned, count = self._pattern.subn("", text)
+        if not count:
+            return text
+        if self._pattern.search(cleaned):
+            # A removal spliced a new label together; the label-by-label
+            # order decides which of those survive
+            return _remove_each(text, self.labels, warn)
+        if warn:
+            found = set(self._pattern.findall(text))
+            for label in self.labels:
+                if label in found:
+                    warn("label", label)
+        return cleaned
+
+    def partial_label_length(self, text):
+        """Length of the longest suffix of `text` that could be the start of a label."""
+        for length in range(min(self._longest_partial, len(text)), 0, -1):
+            if text[-length:] in self._partials:
+                return length
+        return 0
+
+    def held_length(self, text):
+        """
+        Length of the suffix of streamed `text` that may still change: a partial
+        label at the end of the text as it reads with labels removed (in
+        "Alan User:Tu" the "Alan Tu" could become "Alan Turing:"), and, since a
+        label completed that way is removed too, any partial label before it.
+        """
+        # The text with labels removed in `legacy_clean` order, and where each
+        # of its characters came from
+        cleaned, positions = text, range(len(text))
+        if ":" in text:
+            for label in self.labels:
+                index = cleaned.find(label)
+                if index == -1:
+                    continue
+                pieces, kept = [], []
+                position = 0
+                while index != -1:
+                    pieces.append(cleaned[position:index])
+                    kept.extend(positions[position:index])
+                    position = index + len(label)
+                    index = cleaned.find(label, position)
+                pieces.append(cleaned[position:])
+                kept.extend(positions[position:])
+                cleaned, positions = "".join(pieces), kept
+
+        end = len(cleaned)
+        while end:
+            partial = self.partial_label_length(cleaned[:end])
+            if not partial:
+                break
+            end -= partial
+        return len(text) - positions[end] if end < len(cleaned) else 0
+
+    def stream(self):
+        """A `StreamingSanitizer` for one streamed reply."""
+        return StreamingSanitizer(self)
+
+
+class StreamingSanitizer:
+    """
+    Sanitizes a reply as it streams in. `feed(chunk)` returns the text that is
+    safe to show so far and `finish()` the rest once the reply is complete;
+    together they equal `clean()` of the stripped full reply.
+
+    Text is held back only while it might still change: a trailing partial
+    label ("Alan Tu", or "Alan User:Tu", which removing "User:" could turn into
+    a label), the opening of the reply while it starts with a role prefix and
+    its ":" has not arrived yet, and trailing whitespace that the final strip
+    would drop.
+    """
+
+    def __init__(self, sanitizer):
+        self._sanitizer = sanitizer
+        self._raw = ""  # Unscanned raw text (a possible partial label)
+        self._head = ""  # Cleaned text held until the role prefixes are decided
+        self._prefix_index = 0  # Next role prefix to check; past the end once decided
+        self._started = False
+        self._emitted = False
+        self._strip_trailing = False  # Set once a prefix cut stripped the reply
+        self._whitespace = ""  # Trailing whitespace held back
+        self._raw_whitespace = ""
+
+    def feed(self, chunk):
+        """Add streamed text; returns the sanitized text that can be shown now."""
+        text = self._raw_whitespace + chunk
+        if not self._started:
+            text = text.lstrip()
+            self._started = bool(text)
+        # The reply is stripped before cleaning, so trailing whitespace waits for more text
+        stripped = text.rstrip()
+        self._raw_whitespace = text[len(stripped):]
+        self._raw += stripped
+        hold = self._sanitizer.held_length(self._raw)
+        ready = self._raw[:len(self._raw) - hold]
+        self._raw = self._raw[len(self._raw) - hold:]
+        return self._emit(self._sanitizer.remove_labels(ready), final=False)
+
+    def finish(self):
+        """The remaining sanitized text once the stream is complete."""
+        tail = self._sanitizer.remove_labels(self._raw)
+        self._raw = self._raw_whitespace = ""
+        return self._emit(tail, final=True)
+
+    def _emit(self, text, final):
+        if self._prefix_index < len(ROLE_PREFIXES):
+            self._head += text
+            if not self._decide_prefixes(final):
+                return ""
+            text, self._head = self._head, ""
+        if self._strip_trailing and not self._emitted:
+            # The reply was stripped after a prefix cut; drop whitespace before its first text
+            text = text.lstrip()
+        self._emitted = self._emitted or bool(text)
+        text = self._whitespace + text
+        if final:
+            self._whitespace = ""
+            return text.rstrip() if self._strip_trailing else text
+        if not self._strip_trailing:
+            return text
+        body = text.rstrip()
+        self._whitespace = text[len(body):]
+        return body
+
+    def _decide_prefixes(self, final):
+        """Apply the role prefixes to the held opening; False while undecided."""
+        while self._prefix_index < len(ROLE_PREFIXES):
+            prefix = ROLE_PREFIXES[self._prefix_index]
+            if self._strip_trailing:
+                # A prefix was cut and the rest stripped
+                self._head = self._head.lstrip()
+            head = self._head
+            if not head.startswith(prefix):
+                if not final and len(head) < len(prefix) and prefix.startswith(head):
+                    return False
+                self._prefix_index += 1
+                continue
+            if ":" not in head:
+                if not final:
+                    return False
+                self._prefix_index += 1
+                continue
+            self._head = head.split(":", 1)[1].lstrip()
+            self._strip_trailing = True
+            self._prefix_index += 1
+        return True
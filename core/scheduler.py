@@ -0,0 +1,211 @@
+"""Global rate limiting and fair-share scheduling of LLM calls across conversations."""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_prompt_tokens(messages):
+    """
+    Cheap prompt size estimate (~4 characters per token) used for rate limiting.
+    A context window's `MessageView` already knows its token count.
+    """
+    tokens = getattr(messages, "tokens", None)
+    if tokens is not None:
+        return tokens
+    return sum(len(message["content"]) // 4 + 4 for message in messages)
+
+
+def retry_after_seconds(error, default=5.0):
+    """Read the provider's Retry-After hint from a rate-limit error, if it sent one."""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(float(value), 0.0) if value is not None else default
+    except ValueError:
+        return default
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute / 60` per second, holding at
+    most `per_minute`. A limit of 0 disables the bucket.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay_for(self, amount):
+        """Seconds until `amount` can be taken (0 if available now)."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        if self.enabled:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount):
+        """Give back (positive) or charge extra (negative) once actual usage is known."""
+        if self.enabled:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+    def drain(self, seconds):
+        """Empty the bucket so nothing is granted for roughly `seconds`."""
+        if self.enabled:
+            self._refill()
+            self.level = min(self.level, -seconds * self.rate)
+
+
+class FairScheduler:
+    """
+    Grants LLM calls under requests-per-minute and tokens-per-minute limits.
+
+    Waiting calls are queued per conversation and served round-robin, so a busy
+    group chat with six agents queued can't starve single-agent conversations:
+    each conversation with a waiting call gets one grant per rotation. All methods
+    must be used from the generation engine's event loop, except `queued` and
+    `stats()`, which may be read from any thread.
+    """
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._queues = OrderedDict()
+        # Waiting calls, kept up to date by the loop so other threads never walk the queues
+        self._queued = 0
+        self._wakeup = None
+        self._dispatcher = None
+        self.granted = 0
+        self.rate_limited = 0
+        self._waits = deque(maxlen=1000)
+        self._waits_lock = threading.Lock()
+
+    def slot(self, conversation_id, estimated_tokens):
+        """Async context manager that waits for this conversation's fair share of capacity."""
+        return _Slot(self, conversation_id, estimated_tokens)
+
+    async def acquire(self, conversation_id, estimated_tokens):
+        if not self.requests.enabled and not self.tokens.enabled:
+            self.granted += 1
+            return
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is not None and self._dispatcher.get_loop() is not loop:
+            # Started on another event loop (e.g. the parent's, inherited across a fork)
+            self._queues.clear()
+            self._queued = 0
+            self._dispatcher = None
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+        waiter = loop.create_future()
+        self._queues.setdefault(conversation_id, deque()).append((waiter, estimated_tokens, time.monotonic()))
+        self._queued += 1
+        self._wakeup.set()
+        await waiter
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Correct the token bucket once a call's real token usage is known."""
+        if actual_tokens:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+    def backoff(self, seconds):
+        """Pause all grants after the provider answered 429."""
+        self.rate_limited += 1
+        self.requests.drain(seconds)
+        logger.warning(f"LLM rate limit hit, pausing new calls for {seconds:.1f}s")
+
+    def _next_waiter(self):
+        """Pop the head waiter of the next conversation in round-robin order."""
+        while self._queues:
+            conversation_id, queue = next(iter(self._queues.items()))
+            while queue and queue[0][0].done():
+                queue.popleft()  # Cancelled while waiting
+                self._queued -= 1
+            if not queue:
+                del self._queues[conversation_id]
+                continue
+            return conversation_id, queue
+        return None, None
+
+    async def _dispatch(self):
+        while True:
+            conversation_id, queue = self._next_waiter()
+            if queue is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            waiter, estimated_tokens, enqueued = queue[0]
+            delay = max(self.requests.delay_for(1), self.tokens.delay_for(estimated_tokens))
+            if delay > 0:
+                await asyncio.sleep(min(delay, 1.0))
+                continue
+            queue.popleft()
+            self._queued -= 1
+            if waiter.done():
+                continue
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+            self.granted += 1
+            with self._waits_lock:
+                self._waits.append(time.monotonic() - enqueued)
+            waiter.set_result(None)
+            # Rotate: this conversation goes to the back of the line
+            self._queues.move_to_end(conversation_id)
+            if not queue:
+                del self._queues[conversation_id]
+
+    @property
+    def queued(self):
+        """Calls currently waiting for capacity."""
+        return self._queued
+
+    def stats(self):
+        """Queue depth and wait-time statistics."""
+        with self._waits_lock:
+            waits = sorted(self._waits)
+        queued = self.queued
+        return {
+            "queued_calls": queued,
+            "queued_conversations": len(self._queues),
+            "granted": self.granted,
+            "rate_limited": self.rate_limited,
+            "wait_seconds_avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+            "wait_seconds_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else 0.0,
+            "wait_seconds_max": round(waits[-1], 4) if waits else 0.0,
+        }
+
+
+class _Slot:
+    def __init__(self, scheduler, conversation_id, estimated_tokens):
+        self.scheduler = scheduler
+        self.conversation_id = conversation_id
+        self.estimated_tokens = estimated_tokens
+
+    async def __aenter__(self):
+        await self.scheduler.acquire(self.conversation_id, self.estimated_tokens)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
@@ -0,0 +1,445 @@
+"""
+Conversation state shared between server workers.
+
+A state backend holds what every worker must agree on: the sequence-numbered
+reply log that /get_responses serves, which worker currently owns a
+conversation's turn loop (a lease), and user messages waiting for the owner.
+Any worker can read; only the lease holder runs turns.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from core.events import EventLog
+from core.persistence import connect
+
+
+def worker_id():
+    """Identifier of this worker process (evaluated per call, so it is correct after fork)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class StateBackend:
+    """Interface implemented by the in-memory and SQLite state backends."""
+
+    # True when several processes share this state (replies can't be pushed in-process)
+    shared = False
+
+    def acquire_or_enqueue(self, conversation_id, user_message):
+        """
+        Atomically take the conversation's turn-loop lease, or queue `user_message`
+        for the current owner. Returns True if the caller now owns the lease.
+        """
+        raise NotImplementedError
+
+    def renew_lease(self, conversation_id):
+        """
+        Extend the caller's lease while a long turn is running. Returns False if
+        the lease has expired and another worker has taken it over.
+        """
+        raise NotImplementedError
+
+    def finish_turn(self, conversation_id):
+        """
+        Called by the lease holder after a turn. Atomically pops the next queued
+        user message, or releases the lease and returns None if there is none.
+        Also returns None, touching nothing, if the caller has lost the lease.
+        """
+        raise NotImplementedError
+
+    def has_pending(self, conversation_id):
+        """True if a user message is queued behind the running turn (it should be preempted)."""
+        raise NotImplementedError
+
+    def next_turn_id(self, conversation_id):
+        """Monotonically increasing turn number for the conversation."""
+        raise NotImplementedError
+
+    def publish_response(self, conversation_id, response):
+        """Append a reply to the conversation's log. Returns its sequence number."""
+        raise NotImplementedError
+
+    def read_responses(self, conversation_id, after=None, wait=0):
+        """
+        Return `(responses, last_seq, generating)` for replies newer than `after`.
+
+        With `after=None` the backend's own cursor for the conversation is used and
+        advanced, so cursor-less clients get each reply once. With `wait > 0` the
+        call blocks until a newer reply exists or no turn is running.
+        """
+        raise NotImplementedError
+
+    def counters(self, conversation_id):
+        """
+        The conversation's reply sequence number, turn count and legacy cursor, to
+        be stored with the conversation so `restore` can continue from them.
+        """
+        return {}
+
+    def restore(self, conversation_id, counters):
+        """
+        Continue a rehydrated conversation's reply log and turn numbers from stored
+        `counters`, so clients' cursors stay valid. Durable backends ignore this.
+        """
+
+    def save_summary(self, conversation_id, summary, summarized_upto):
+        """
+        Store the conversation's rolling summary of its first `summarized_upto`
+        history messages, for workers that reload the conversation. Only shared
+        backends keep it; a single process keeps its conversations in memory.
+        """
+
+    def load_summary(self, conversation_id):
+        """The stored `(summary, summarized_upto)`, or None."""
+        return None
+
+    def forget(self, conversation_id):
+        """Drop per-process bookkeeping for an evicted conversation."""
+
+
+class InMemoryStateBackend(StateBackend):
+    """Single-process backend: replies live in an EventLog, the lease is a flag."""
+
+    def __init__(self, response_buffer_size=200):
+        self.response_buffer_size = response_buffer_size
+        self._lock = threading.Lock()
+        self._states = {}
+
+    def _state(self, conversation_id):
+        with self._lock:
+            state = self._states.get(conversation_id)
+            if state is None:
+                state = {
+                    "responses": EventLog(maxlen=self.response_buffer_size),
+                    "leased": False,
+                    "pending": deque(),
+                    "legacy_cursor": 0,
+                    "turn_count": 0
+                }
+                self._states[conversation_id] = state
+            return state
+
+    def acquire_or_enqueue(self, conversation_id, user_message):
+        state = self._state(conversation_id)
+        responses = state["responses"]
+        with responses.condition:
+            if state["leased"]:
+                state["pending"].append(user_message)
+                return False
+            state["leased"] = True
+            return True
+
+    def renew_lease(self, conversation_id):
+        return True
+
+    def finish_turn(self, conversation_id):
+        state = self._state(conversation_id)
+        responses = state["responses"]
+        with responses.condition:
+            if state["pending"]:
+                return state["pending"].popleft()
+            state["leased"] = False
+            responses.condition.notify_all()
+            return None
+
+    def has_pending(self, conversation_id):
+        state = self._state(conversation_id)
+        with state["responses"].condition:
+            return bool(state["pending"])
+
+    def next_turn_id(self, conversation_id):
+        state = self._state(conversation_id)
+        with state["responses"].condition:
+            state["turn_count"] += 1
+            return state["turn_count"]
+
+    def publish_response(self, conversation_id, response):
+        return self._state(conversation_id)["responses"].append("response", response)
+
+    def read_responses(self, conversation_id, after=None, wait=0):
+        state = self._state(conversation_id)
+        responses = state["responses"]
+        cursor = after if after is not None else state["legacy_cursor"]
+        with responses.condition:
+            if wait > 0:
+                responses.condition.wait_for(
+                    lambda: responses.last_seq > cursor or not state["leased"],
+                    timeout=wait
+                )
+            pending = responses.read_after(cursor)
+            if after is None and pending:
+                state["legacy_cursor"] = pending[-1]["seq"]
+            return (
+                [{"seq": event["seq"], **event["data"]} for event in pending],
+                responses.last_seq,
+                state["leased"]
+            )
+
+    def counters(self, conversation_id):
+        with self._lock:
+            state = self._states.get(conversation_id)
+        if state is None:
+            return {}
+        with state["responses"].condition:
+            return {
+                "last_seq": state["responses"].last_seq,
+                "turn_count": state["turn_count"],
+                "legacy_cursor": state["legacy_cursor"]
+            }
+
+    def restore(self, conversation_id, counters):
+        state = self._state(conversation_id)
+        with state["responses"].condition:
+            state["responses"].advance(counters.get("last_seq", 0))
+            state["turn_count"] = max(state["turn_count"], counters.get("turn_count", 0))
+            state["legacy_cursor"] = max(state["legacy_cursor"], counters.get("legacy_cursor", 0))
+
+    def forget(self, conversation_id):
+        with self._lock:
+            state = self._states.get(conversation_id)
+            # Keep the state of conversations that are mid-turn
+            if state is not None and not state["leased"]:
+                del self._states[conversation_id]
+
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversation_state (
+    conversation_id TEXT PRIMARY KEY,
+    lease_owner TEXT,
+    lease_expires REAL NOT NULL DEFAULT 0,
+    legacy_cursor INTEGER NOT NULL DEFAULT 0,
+    last_seq INTEGER NOT NULL DEFAULT 0,
+    turn_count INTEGER NOT NULL DEFAULT 0,
+    summary TEXT,
+    summarized_upto INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS responses (
+    conversation_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    body TEXT NOT NULL,
+    PRIMARY KEY (conversation_id, seq)
+);
+CREATE TABLE IF NOT EXISTS pending_turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+"""
+
+
+class SqliteStateBackend(StateBackend):
+    """
+    Multi-process backend on a SQLite file shared by every worker on the host.
+
+    Leases expire after `lease_seconds` unless renewed, so a crashed worker's
+    conversations are taken over by the next worker that receives a message for
+    them. Lease updates check `lease_owner`, so a worker whose lease was taken
+    over can't release or extend the new owner's. The rolling summary of each
+    conversation's history is kept here too, so a worker that picks a
+    conversation up doesn't summarize it again. Long-polls re-check the database
+    every `poll_interval` seconds, since condition variables don't cross process
+    boundaries.
+    """
+
+    shared = True
+
+    def __init__(self, path, lease_seconds=120, response_buffer_size=200, poll_interval=0.1):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.response_buffer_size = response_buffer_size
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(STATE_SCHEMA)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(conversation_state)")]
+        if "summary" not in columns:
+            # State files created before summaries were shared between workers
+            try:
+                conn.execute("ALTER TABLE conversation_state ADD COLUMN summary TEXT")
+                conn.execute("ALTER TABLE conversation_state ADD COLUMN summarized_upto INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # Another worker added them first
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or getattr(self._local, "pid", None) != os.getpid():
+            conn = connect(self.path)
+            conn.isolation_level = None  # Transactions are managed explicitly
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _transaction(self, work):
+        """Run `work(conn)` inside a write transaction and return its result."""
+        conn = self._conn()
+        for attempt in range(50):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                break
+            except sqlite3.OperationalError:
+                time.sleep(0.02 * (attempt + 1))
+        else:
+            conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+            conn.execute("COMMIT")
+            return result
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _ensure_row(conn, conversation_id):
+        conn.execute("INSERT OR IGNORE INTO conversation_state (conversation_id) VALUES (?)", (conversation_id,))
+
+    def acquire_or_enqueue(self, conversation_id, user_message):
+        owner = worker_id()
+
+        def work(conn):
+            self._ensure_row(conn, conversation_id)
+            lease_owner, lease_expires = conn.execute(
+                "SELECT lease_owner, lease_expires FROM conversation_state WHERE conversation_id = ?",
+                (conversation_id,)
+            ).fetchone()
+            if lease_owner is None or lease_expires < time.time():
+                conn.execute(
+                    "UPDATE conversation_state SET lease_owner = ?, lease_expires = ? WHERE conversation_id = ?",
+                    (owner, time.time() + self.lease_seconds, conversation_id)
+                )
+                return True
+            conn.execute(
+                "INSERT INTO pending_turns (conversation_id, message) VALUES (?, ?)",
+                (conversation_id, user_message)
+            )
+            return False
+
+        return self._transaction(work)
+
+    def renew_lease(self, conversation_id):
+        cursor = self._conn().execute(
+            "UPDATE conversation_state SET lease_expires = ? WHERE conversation_id = ? AND lease_owner = ?",
+            (time.time() + self.lease_seconds, conversation_id, worker_id())
+        )
+        return cursor.rowcount == 1
+
+    def finish_turn(self, conversation_id):
+        owner = worker_id()
+
+        def work(conn):
+            lease_owner = conn.execute(
+                "SELECT lease_owner FROM conversation_state WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+            if lease_owner is None or lease_owner[0] != owner:
+                # Taken over by another worker, which now runs the queued messages
+                return None
+            row = conn.execute(
+                "SELECT id, message FROM pending_turns WHERE conversation_id = ? ORDER BY id LIMIT 1",
+                (conversation_id,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("DELETE FROM pending_turns WHERE id = ?", (row[0],))
+                conn.execute(
+                    "UPDATE conversation_state SET lease_expires = ? WHERE conversation_id = ?",
+                    (time.time() + self.lease_seconds, conversation_id)
+                )
+                return row[1]
+            conn.execute(
+                "UPDATE conversation_state SET lease_owner = NULL, lease_expires = 0 WHERE conversation_id = ?",
+                (conversation_id,)
+            )
+            return None
+
+        return self._transaction(work)
+
+    def has_pending(self, conversation_id):
+        return self._conn().execute(
+            "SELECT EXISTS (SELECT 1 FROM pending_turns WHERE conversation_id = ?)", (conversation_id,)
+        ).fetchone()[0] == 1
+
+    def next_turn_id(self, conversation_id):
+        def work(conn):
+            self._ensure_row(conn, conversation_id)
+            conn.execute(
+                "UPDATE conversation_state SET turn_count = turn_count + 1 WHERE conversation_id = ?",
+                (conversation_id,)
+            )
+            return conn.execute(
+                "SELECT turn_count FROM conversation_state WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()[0]
+
+        return self._transaction(work)
+
+    def publish_response(self, conversation_id, response):
+        body = json.dumps(response)
+
+        def work(conn):
+            self._ensure_row(conn, conversation_id)
+            seq = conn.execute(
+                "SELECT last_seq FROM conversation_state WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()[0] + 1
+            conn.execute(
+                "INSERT INTO responses (conversation_id, seq, body) VALUES (?, ?, ?)",
+                (conversation_id, seq, body)
+            )
+            # Publishing also renews the publisher's own lease; keep only the newest replies
+            conn.execute(
+                "UPDATE conversation_state SET last_seq = ?, "
+                "lease_expires = CASE WHEN lease_owner = ? THEN ? ELSE lease_expires END WHERE conversation_id = ?",
+                (seq, worker_id(), time.time() + self.lease_seconds, conversation_id)
+            )
+            conn.execute(
+                "DELETE FROM responses WHERE conversation_id = ? AND seq <= ?",
+                (conversation_id, seq - self.response_buffer_size)
+            )
+            return seq
+
+        return self._transaction(work)
+
+    def save_summary(self, conversation_id, summary, summarized_upto):
+        # Never replace a summary that covers more of the conversation
+        self._conn().execute(
+            "UPDATE conversation_state SET summary = ?, summarized_upto = ? "
+            "WHERE conversation_id = ? AND summarized_upto < ?",
+            (summary, summarized_upto, conversation_id, summarized_upto)
+        )
+
+    def load_summary(self, conversation_id):
+        row = self._conn().execute(
+            "SELECT summary, summarized_upto FROM conversation_state WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()
+        return tuple(row) if row is not None and row[0] else None
+
+    def _snapshot(self, conversation_id):
+        row = self._conn().execute(
+            "SELECT lease_owner, lease_expires, legacy_cursor, last_seq FROM conversation_state WHERE conversation_id = ?",
+            (conversation_id,)
+        ).fetchone()
+        if row is None:
+            return False, 0, 0
+        lease_owner, lease_expires, legacy_cursor, last_seq = row
+        return lease_owner is not None and lease_expires >= time.time(), legacy_cursor, last_seq
+
+    def read_responses(self, conversation_id, after=None, wait=0):
+        deadline = time.monotonic() + wait
+        generating, legacy_cursor, last_seq = self._snapshot(conversation_id)
+        cursor = after if after is not None else legacy_cursor
+        while last_seq <= cursor and generating and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            generating, legacy_cursor, last_seq = self._snapshot(conversation_id)
+
+        rows = self._conn().execute(
+            "SELECT seq, body FROM responses WHERE conversation_id = ? AND seq > ? ORDER BY seq",
+            (conversation_id, cursor)
+        ).fetchall()
+        responses = [{"seq": seq, **json.loads(body)} for seq, body in rows]
+        if after is None and responses:
+            self._conn().execute(
+                "UPDATE conversation_state SET legacy_cursor = MAX(legacy_cursor, ?) WHERE conversation_id = ?",
+                (responses[-1]["seq"], conversation_id)
+            )
+        return responses, last_seq, generating
+
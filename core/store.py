@@ -0,0 +1,160 @@
+"""Memory-bounded store for active conversations with idle eviction."""
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationStore:
+    """
+    Dict-like container for conversation state with bounded memory.
+
+    Entries are evicted when they have been idle (by their `last_activity`) for
+    longer than `ttl_seconds`, and least-recently-used entries are evicted when the
+    store holds more than `max_entries` conversations or more than `max_bytes` of
+    (approximate) state. Conversations that are still generating are never
+    evicted. A background sweeper thread enforces the TTL.
+    """
+
+    def __init__(self, ttl_seconds=3600, max_entries=5000, max_bytes=256 * 1024 * 1024,
+                 size_of=None, on_evict=None, sweep_interval=60):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval
+        self._size_of = size_of or (lambda conversation: 0)
+        self._on_evict = on_evict
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.RLock()
+        self._sweeper = None
+        self._stop = threading.Event()
+        self.evictions = {"ttl": 0, "max_entries": 0, "max_bytes": 0}
+
+    def __contains__(self, conversation_id):
+        with self._lock:
+            return conversation_id in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __getitem__(self, conversation_id):
+        with self._lock:
+            conversation = self._entries[conversation_id]
+            self._entries.move_to_end(conversation_id)
+            return conversation
+
+    def get(self, conversation_id, default=None):
+        try:
+            return self[conversation_id]
+        except KeyError:
+            return default
+
+    def claim(self, conversation_id):
+        """
+        Return an entry marked as generating, or None if it isn't stored. The mark
+        is set under the store's lock, so the entry can't be evicted between being
+        fetched and its turn starting.
+        """
+        with self._lock:
+            conversation = self._entries.get(conversation_id)
+            if conversation is not None:
+                conversation["generating"] = True
+                self._entries.move_to_end(conversation_id)
+            return conversation
+
+    def __setitem__(self, conversation_id, conversation):
+        with self._lock:
+            self._entries[conversation_id] = conversation
+            self._entries.move_to_end(conversation_id)
+            self._resize(conversation_id)
+            self._enforce_caps()
+
+    def discard(self, conversation_id):
+        """Remove an entry without counting it as an eviction."""
+        with self._lock:
+            if self._entries.pop(conversation_id, None) is not None:
+                self._total_bytes -= self._sizes.pop(conversation_id, 0)
+
+    def touch(self, conversation_id):
+        """Refresh an entry's recency and size estimate after it changed."""
+        with self._lock:
+            if conversation_id not in self._entries:
+                return
+            self._entries.move_to_end(conversation_id)
+            self._resize(conversation_id)
+            self._enforce_caps()
+
+    def _resize(self, conversation_id):
+        size = self._size_of(self._entries[conversation_id])
+        self._total_bytes += size - self._sizes.get(conversation_id, 0)
+        self._sizes[conversation_id] = size
+
+    def _evict(self, conversation_id, reason):
+        conversation = self._entries.pop(conversation_id)
+        self._total_bytes -= self._sizes.pop(conversation_id, 0)
+        self.evictions[reason] += 1
+        logger.info(f"Evicted conversation {conversation_id} ({reason})")
+        if self._on_evict:
+            try:
+                self._on_evict(conversation_id, conversation)
+            except Exception as e:
+                logger.error(f"Error in eviction callback for {conversation_id}: {str(e)}")
+
+    def _evictable(self):
+        """Conversation IDs from least to most recently used, skipping busy ones."""
+        return [cid for cid, conversation in self._entries.items() if not conversation.get("generating")]
+
+    def _enforce_caps(self):
+        if len(self._entries) <= self.max_entries and self._total_bytes <= self.max_bytes:
+            return
+        for conversation_id in self._evictable():
+            if len(self._entries) > self.max_entries:
+                self._evict(conversation_id, "max_entries")
+            elif self._total_bytes > self.max_bytes:
+                self._evict(conversation_id, "max_bytes")
+            else:
+                break
+
+    def sweep(self):
+        """Evict every idle conversation whose last activity is older than the TTL."""
+        now = datetime.now()
+        with self._lock:
+            for conversation_id in self._evictable():
+                last_activity = self._entries[conversation_id].get("last_activity", now)
+                if (now - last_activity).total_seconds() > self.ttl_seconds:
+                    self._evict(conversation_id, "ttl")
+
+    def start_sweeper(self):
+        """Run `sweep()` every `sweep_interval` seconds in a daemon thread (again after a fork)."""
+        if self._sweeper is not None and self._sweeper.is_alive():
+            return
+
+        def run():
+            while not self._stop.wait(self.sweep_interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.error(f"Error sweeping conversations: {str(e)}", exc_info=True)
+
+        self._sweeper = threading.Thread(target=run, name="conversation-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+
+    def stats(self):
+        """Current size and eviction counters."""
+        with self._lock:
+            return {
+                "conversations": len(self._entries),
+                "approx_bytes": self._total_bytes,
+                "max_conversations": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "evictions": dict(self.evictions)
+            }
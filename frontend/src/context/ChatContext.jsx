@@ -112,6 +112,19 @@ export const ChatProvider = ({ children }) => {
             }
           }
           
+          // 'append' adds streamed text to a message; 'update' replaces some of its fields
+          if (message.type === 'append' || message.type === 'update') {
+            return {
+              ...chat,
+              messages: chat.messages.map(msg => {
+                if (msg.id !== message.id) return msg;
+                return message.type === 'append'
+                  ? { ...msg, content: msg.content + message.text }
+                  : { ...msg, ...message.fields };
+              })
+            };
+          }
+
           // Otherwise, add the message
           debugLog('Adding new message to chat');
           return {
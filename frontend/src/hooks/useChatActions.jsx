@@ -25,6 +25,8 @@ export const useChatActions = () => {
   } = useChat();
   
   const messagesEndRef = useRef(null);
+  // Message id of the reply each agent is currently streaming
+  const partialMessagesRef = useRef({});
 
   // Process new responses from the backend
   const handleNewResponses = useCallback((responses) => {
@@ -54,6 +56,18 @@ export const useChatActions = () => {
         content = content.slice(0, -3); // Remove trailing ellipsis
       }
       
+      // A streamed reply is replaced by its final (sanitized) text
+      const partialId = partialMessagesRef.current[agentName];
+      if (partialId) {
+        delete partialMessagesRef.current[agentName];
+        addMessage({
+          type: 'update',
+          id: partialId,
+          fields: { content: content, partial: false }
+        });
+        return;
+      }
+      
       // Add the message to the chat
       addMessage({
         type: 'agent',
@@ -67,6 +81,49 @@ export const useChatActions = () => {
     });
   }, [addMessage]);
 
+  // Show a reply as soon as its agent starts writing
+  const handleAgentStart = useCallback((agentName) => {
+    if (partialMessagesRef.current[agentName]) return;
+    const id = `agent_msg_${Date.now()}_${Math.random().toString(36).substr(2, 5)}`;
+    partialMessagesRef.current[agentName] = id;
+    addMessage({
+      type: 'agent',
+      content: '',
+      agent: agentName,
+      partial: true,
+      timestamp: new Date().toISOString(),
+      id: id
+    });
+  }, [addMessage]);
+
+  // Append streamed text to the agent's partial reply
+  const handleToken = useCallback((agentName, text) => {
+    if (!partialMessagesRef.current[agentName]) handleAgentStart(agentName);
+    addMessage({
+      type: 'append',
+      id: partialMessagesRef.current[agentName],
+      text: text
+    });
+  }, [addMessage, handleAgentStart]);
+
+  // Drop partial replies that never finished (the agent failed or the turn was cut short)
+  const handleTurnDone = useCallback(() => {
+    Object.values(partialMessagesRef.current).forEach(id => {
+      addMessage({ type: 'remove', id: id });
+    });
+    partialMessagesRef.current = {};
+  }, [addMessage]);
+
+  // The stream reads its handlers through a ref, so a re-render (one per streamed
+  // token) doesn't close and reopen it
+  const streamHandlersRef = useRef({});
+  streamHandlersRef.current = {
+    onNewResponses: handleNewResponses,
+    onAgentStart: handleAgentStart,
+    onToken: handleToken,
+    onTurnDone: handleTurnDone
+  };
+
   // Setup polling for responses when conversation ID changes
   useEffect(() => {
     // Clear existing polling if any
@@ -77,18 +134,34 @@ export const useChatActions = () => {
       return;
     }
     
+    // Prefer the SSE stream; fall back to polling where EventSource is unavailable
+    let closeStream = null;
+    
     // Short delay before starting to poll to prevent race conditions
     const timer = setTimeout(() => {
-      console.log("Starting polling for conversation:", currentConversationId);
       setIsPolling(true);
       
       try {
-        chatService.pollForResponses(
-          currentConversationId,
-          handleNewResponses,
-          15,  // Max 15 polling attempts
-          1000  // Poll every second
-        );
+        if (typeof window !== 'undefined' && window.EventSource) {
+          console.log("Starting response stream for conversation:", currentConversationId);
+          closeStream = chatService.streamResponses(
+            currentConversationId,
+            (responses) => streamHandlersRef.current.onNewResponses(responses),
+            {
+              onAgentStart: (agentName) => streamHandlersRef.current.onAgentStart(agentName),
+              onToken: (agentName, text) => streamHandlersRef.current.onToken(agentName, text),
+              onTurnDone: (turn) => streamHandlersRef.current.onTurnDone(turn)
+            }
+          );
+        } else {
+          console.log("Starting polling for conversation:", currentConversationId);
+          chatService.pollForResponses(
+            currentConversationId,
+            (responses) => streamHandlersRef.current.onNewResponses(responses),
+            15,  // Max 15 polling attempts
+            1000  // Poll every second
+          );
+        }
       } catch (error) {
         console.error("Error setting up polling:", error);
         setApiError(`Failed to get responses: ${error.message}`);
@@ -99,9 +172,11 @@ export const useChatActions = () => {
     return () => {
       console.log("Cleaning up polling");
       clearTimeout(timer);
+      if (closeStream) closeStream();
+      streamHandlersRef.current.onTurnDone();
       setIsPolling(false);
     };
-  }, [currentConversationId, handleNewResponses]);
+  }, [currentConversationId]);
 
   // Helper to remove loading message
   const removeLoadingMessage = useCallback((loadingId) => {
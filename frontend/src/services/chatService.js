@@ -157,11 +157,17 @@ export const continueConversation = async (message, conversationId) => {
 /**
  * Get responses for an ongoing conversation
  * @param {string} conversationId - The ID of the conversation
+ * @param {number|null} after - Sequence number of the last response already received
+ * @param {number} wait - Seconds the server may hold the request open for new responses
  * @returns {Promise<Object>} - The responses
  */
-export const getResponses = async (conversationId) => {
+export const getResponses = async (conversationId, after = null, wait = 0) => {
   try {
-    const url = `${API_BASE_URL}/get_responses/${conversationId}`;
+    const params = new URLSearchParams();
+    if (after !== null) params.set('after', after);
+    if (wait > 0) params.set('wait', wait);
+    const query = params.toString();
+    const url = `${API_BASE_URL}/get_responses/${conversationId}${query ? `?${query}` : ''}`;
     console.log(`Fetching responses from: ${url}`);
     
     const response = await fetch(url, {
@@ -250,15 +256,19 @@ export const sendAgentMessage = async (agentId, message, conversationId = null)
  * @param {function} onNewResponses - Callback for when new responses are received
  * @param {number} maxAttempts - Maximum number of polling attempts (default: 10)
  * @param {number} interval - Interval between polls in ms (default: 1000)
+ * @param {number} wait - Seconds each poll may wait on the server for new responses (default: 20)
  */
 export const pollForResponses = async (
   conversationId,
   onNewResponses,
   maxAttempts = 10,
-  interval = 1000
+  interval = 1000,
+  wait = 20
 ) => {
   let attempts = 0;
   let emptyResponseCount = 0;
+  // Sequence number of the last response we have, so nothing is missed or repeated
+  let cursor = 0;
   
   const poll = async () => {
     if (attempts >= maxAttempts) {
@@ -268,9 +278,13 @@ export const pollForResponses = async (
     
     try {
       console.log(`Polling for responses (attempt ${attempts+1}/${maxAttempts})...`);
-      const data = await getResponses(conversationId);
+      const data = await getResponses(conversationId, cursor, wait);
       console.log("Got response data:", data);
       
+      if (typeof data.cursor === 'number') {
+        cursor = data.cursor;
+      }
+      
       if (data.responses && data.responses.length > 0) {
         console.log(`Received ${data.responses.length} responses`);
         // Call the callback with new responses
@@ -279,8 +293,8 @@ export const pollForResponses = async (
         // Reset empty response counter since we got responses
         emptyResponseCount = 0;
         
-        // Continue polling for more responses
-        setTimeout(poll, interval);
+        // The server holds the next request open, so poll again right away
+        setTimeout(poll, wait > 0 ? 0 : interval);
       } else {
         attempts++;
         emptyResponseCount++;
@@ -307,10 +321,62 @@ export const pollForResponses = async (
   poll();
 };
 
+/**
+ * Stream responses for a conversation over Server-Sent Events
+ * @param {string} conversationId - The ID of the conversation
+ * @param {function} onNewResponses - Callback with completed replies ([{agent, content}])
+ * @param {Object} handlers - Optional { onAgentStart, onToken, onTurnDone, onError } callbacks
+ * @returns {function} - Call to close the stream
+ */
+export const streamResponses = (conversationId, onNewResponses, handlers = {}) => {
+  const url = `${API_BASE_URL}/stream/${conversationId}?follow=1`;
+  console.log(`Opening response stream: ${url}`);
+
+  // EventSource reconnects on its own and resumes with Last-Event-ID
+  const source = new EventSource(url);
+
+  const parse = (event) => {
+    try {
+      return JSON.parse(event.data);
+    } catch (e) {
+      console.error("Failed to parse stream event:", e);
+      return null;
+    }
+  };
+
+  source.addEventListener('agent_start', (event) => {
+    const data = parse(event);
+    if (data && handlers.onAgentStart) handlers.onAgentStart(data.agent);
+  });
+
+  source.addEventListener('token', (event) => {
+    const data = parse(event);
+    if (data && handlers.onToken) handlers.onToken(data.agent, data.text);
+  });
+
+  source.addEventListener('agent_done', (event) => {
+    const data = parse(event);
+    if (data) onNewResponses([{ agent: data.agent, content: data.content }]);
+  });
+
+  source.addEventListener('turn_done', (event) => {
+    const data = parse(event);
+    if (data && handlers.onTurnDone) handlers.onTurnDone(data.turn);
+  });
+
+  source.onerror = (error) => {
+    console.error('Response stream error:', error);
+    if (handlers.onError) handlers.onError(error);
+  };
+
+  return () => source.close();
+};
+
 export default {
   startConversation,
   continueConversation,
   getResponses,
   sendAgentMessage,
-  pollForResponses
+  pollForResponses,
+  streamResponses
 }; 
\ No newline at end of file